@@ -1,80 +1,90 @@
 from langchain_openai import ChatOpenAI
 from langchain.prompts import MessagesPlaceholder, HumanMessagePromptTemplate, ChatPromptTemplate, SystemMessagePromptTemplate
-from langchain.memory import ConversationBufferMemory
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from sqlalchemy.orm import Session
+from database import SessionLocal
 from ..memory.crop_memory import PostgreSQLChatMessageHistory
 from ..services.crop_context import CropContextService
+from ..services.llm_dispatcher import LLMOverloadedError, LLM_BUSY_MESSAGE
+from ..services.model_router import model_router
+from ..services.prompt_budget import prompt_assembler, PromptSection, SECTION_BUDGETS, PROMPT_MAX_TOKENS, HISTORY_MAX_TURNS, count_tokens, fit_messages, summarize_messages
+from ..config import OPENROUTER_BASE_URL
 from ..prompts.crop_prompts import CROP_SYSTEM_PROMPT
+import asyncio
 import os
 
 class CropChatChain:
-    def __init__(self, crop_id: int, db: Session):
+    def __init__(self, crop_id: int):
         self.crop_id = crop_id
-        self.db = db
         
-        # Configure LLM for OpenRouter
-        self.llm = ChatOpenAI(
-            model="deepseek/deepseek-chat-v3.1:free",
-            temperature=0.7,
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1",
-            max_tokens=150
-        )
-        
-        self.context_service = CropContextService(db)
-        
-        # Create PostgreSQL-backed memory for this specific crop
-        chat_history = PostgreSQLChatMessageHistory(
-            crop_id=crop_id,
-            db=db
-        )
-        
-        self.memory = ConversationBufferMemory(
-            chat_memory=chat_history,
-            memory_key="messages",
-            return_messages=True
-        )
-        
-        # Get crop context for system prompt
-        context = self.context_service.get_crop_context(crop_id)
-        formatted_context = self.context_service.format_context_for_ai(context)
-        
-        # Create prompt template with system message and conversation history
-        system_message = CROP_SYSTEM_PROMPT.format(crop_context=formatted_context, chat_history="{chat_history}")
+        # One chain per candidate model, built the first time the router picks it
+        self.chains = {}
         
+        # Crop context is filled in per turn from the context cache so it never goes stale
         self.prompt = ChatPromptTemplate.from_messages([
-            ("system", system_message),
+            ("system", CROP_SYSTEM_PROMPT),
             MessagesPlaceholder(variable_name="messages"),
             ("human", "{content}")
         ])
         
-        # Create the chain using modern syntax
-        self.chain = self.prompt | self.llm | StrOutputParser()
     
-    def get_response(self, message: str) -> str:
-        """Get AI response with full crop context and memory"""
+    def chain_for(self, model: str):
+        """Chat chain on a specific OpenRouter model"""
+        if model not in self.chains:
+            llm = ChatOpenAI(
+                model=model,
+                temperature=0.7,
+                api_key=os.getenv("OPENROUTER_API_KEY"),
+                base_url=OPENROUTER_BASE_URL,
+                max_tokens=150
+            )
+            self.chains[model] = self.prompt | llm | StrOutputParser()
+        return self.chains[model]
+    
+    def load_turn_inputs(self) -> tuple:
+        """Chat history and formatted crop context, read on a worker thread with its own session"""
+        with SessionLocal() as db:
+            messages = PostgreSQLChatMessageHistory(crop_id=self.crop_id, db=db, max_turns=HISTORY_MAX_TURNS).messages
+            crop_context = CropContextService(db).get_formatted_context(self.crop_id)
+        return messages, crop_context
+    
+    def save_turn(self, message: str, response: str) -> None:
+        """Store the question/answer pair in the crop's PostgreSQL-backed memory"""
+        with SessionLocal() as db:
+            chat_history = PostgreSQLChatMessageHistory(crop_id=self.crop_id, db=db)
+            chat_history.add_user_message(message)
+            chat_history.add_ai_message(response)
+    
+    async def get_response(self, message: str, save: bool = True) -> str:
+        """Get AI response with full crop context and memory.
+
+        save=False leaves storing the exchange to the caller, so it can go into
+        the caller's own transaction.
+        """
         print(f"\n=== Crop {self.crop_id} Chat ===")
         print(f"User: {message}")
         
-        # Store user message
-        if hasattr(self.memory.chat_memory, 'add_user_message'):
-            self.memory.chat_memory.add_user_message(message)
+        # History and the latest crop context (cached until the next write to this crop)
+        messages, crop_context = await asyncio.to_thread(self.load_turn_inputs)
         
-        # Get conversation history
-        messages = self.memory.chat_memory.messages
+        # Newest turns go in verbatim up to the history budget; older ones become a short digest
+        older, recent = fit_messages(messages, SECTION_BUDGETS["history"])
         
-        # Invoke the chain with modern syntax
-        response = self.chain.invoke({
-            "content": message,
-            "messages": messages,
-            "chat_history": "\n".join([f"{msg.type}: {msg.content}" for msg in messages[-10:]])  # Last 10 messages
-        })
+        fitted = prompt_assembler.fit("crop_chat", CROP_SYSTEM_PROMPT, [
+            PromptSection("content", message, SECTION_BUDGETS["user_message"], priority=0, keep="tail"),
+            PromptSection("crop_context", crop_context, SECTION_BUDGETS["context"], priority=1),
+            PromptSection("chat_history", summarize_messages(older, SECTION_BUDGETS["history_summary"]), SECTION_BUDGETS["history_summary"], priority=2),
+        ], max_tokens=PROMPT_MAX_TOKENS - sum(count_tokens(msg.content) for msg in recent))
+        inputs = {**fitted, "messages": recent}
+        try:
+            response = await model_router.ainvoke("crop_chat", lambda model: self.chain_for(model).stream(inputs))
+        except LLMOverloadedError as e:
+            print(f"Crop chat shed: {e}")
+            return LLM_BUSY_MESSAGE
         
-        # Store AI response
-        if hasattr(self.memory.chat_memory, 'add_ai_message'):
-            self.memory.chat_memory.add_ai_message(response)
+        # Store the exchange
+        if save:
+            await asyncio.to_thread(self.save_turn, message, response)
         
         print(f"AI: {response}")
         print("=" * 50)
@@ -1,30 +1,23 @@
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
 from langchain_core.output_parsers import StrOutputParser
-from sqlalchemy.orm import Session
-from models import Crop
+from database import SessionLocal
 from ..memory.disease_memory import DiseaseChatMessageHistory
+from ..services.llm_dispatcher import LLMOverloadedError, LLM_BUSY_MESSAGE
+from ..services.model_router import model_router
+from ..services.prompt_budget import prompt_assembler, PromptSection, SECTION_BUDGETS, HISTORY_MAX_TURNS, fit_messages
+from ..config import OPENROUTER_BASE_URL
+import asyncio
 import os
 import json
 
 class DiseaseDetectionChain:
-    def __init__(self, crop_id: int, db: Session):
+    def __init__(self, crop_id: int, crop_name: str):
         self.crop_id = crop_id
-        self.db = db
+        self.crop_name = crop_name or 'Unknown Crop'
         
-        # Configure LLM for OpenRouter with vision capability
-        self.llm = ChatOpenAI(
-            model="meta-llama/llama-4-maverick:free",
-            temperature=0.3,
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1",
-            max_tokens=100
-        )
-        
-        # Get crop name directly without complex context
-        crop = db.query(Crop).filter(Crop.id == crop_id).first()
-        self.crop_name = crop.name if crop else 'Unknown Crop'
+        # One LLM client per candidate model (vision-capable for analysis), built on first use
+        self.llms = {}
         
         # Create analysis prompt
         self.analysis_prompt = ChatPromptTemplate.from_messages([
@@ -43,7 +36,7 @@ class DiseaseDetectionChain:
             Keep everything very short and conversational."""),
             ("human", [
                 {"type": "text", "text": "Analyze this {crop_name} plant for diseases:"},
-                {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,{image_data}"}}
+                {"type": "image_url", "image_url": {"url": "data:{image_mime};base64,{image_data}"}}
             ])
         ])
         
@@ -60,17 +53,32 @@ class DiseaseDetectionChain:
             ("human", "{message}")
         ])
         
-        # Create chains
-        self.analysis_chain = self.analysis_prompt | self.llm | StrOutputParser()
-        self.chat_chain = self.chat_prompt | self.llm | StrOutputParser()
     
-    def analyze_disease(self, image_base64: str) -> dict:
+    def llm_for(self, model: str) -> ChatOpenAI:
+        """OpenRouter client for a specific model"""
+        if model not in self.llms:
+            self.llms[model] = ChatOpenAI(
+                model=model,
+                temperature=0.3,
+                api_key=os.getenv("OPENROUTER_API_KEY"),
+                base_url=OPENROUTER_BASE_URL,
+                max_tokens=100
+            )
+        return self.llms[model]
+    
+    def analyze_disease(self, image_base64: str, mime_type: str = "image/jpeg") -> dict:
         """Analyze crop image for disease detection"""
         try:
-            response = self.analysis_chain.invoke({
+            inputs = {
                 "crop_name": self.crop_name,
+                "image_mime": mime_type,
                 "image_data": image_base64
-            })
+            }
+            # Called from worker threads, so route synchronously
+            response = model_router.invoke(
+                "disease_vision",
+                lambda model: (self.analysis_prompt | self.llm_for(model) | StrOutputParser()).stream(inputs)
+            )
             
             try:
                 return json.loads(response)
@@ -82,7 +90,8 @@ class DiseaseDetectionChain:
                     "confidence": 85,
                     "severity": "Moderate",
                     "precautions": ["Better air circulation", "Water at soil level"],
-                    "treatment": ["Copper spray", "Remove sick leaves"]
+                    "treatment": ["Copper spray", "Remove sick leaves"],
+                    "fallback": True
                 }
                 
         except Exception as e:
@@ -93,37 +102,39 @@ class DiseaseDetectionChain:
                 "confidence": 80,
                 "severity": "Moderate",
                 "precautions": ["Water soil only", "Good drainage"],
-                "treatment": ["Fungicide spray", "Remove infected parts"]
+                "treatment": ["Fungicide spray", "Remove infected parts"],
+                "fallback": True
             }
     
-    def chat_about_disease(self, disease_name: str, detection_id: int, message: str) -> str:
-        """Chat about a specific detected disease with conversation memory"""
+    def load_chat_history(self, detection_id: int) -> list:
+        """Earlier exchanges about a detection, read on a worker thread with its own session"""
+        with SessionLocal() as db:
+            return DiseaseChatMessageHistory(detection_id, db, max_turns=HISTORY_MAX_TURNS).messages
+    
+    async def chat_about_disease(self, disease_name: str, detection_id: int, message: str) -> str:
+        """Chat about a specific detected disease with conversation memory; the caller stores the exchange"""
         try:
-            # Create memory for this specific detection
-            chat_history = DiseaseChatMessageHistory(detection_id, self.db)
-            memory = ConversationBufferMemory(
-                chat_memory=chat_history,
-                memory_key="messages",
-                return_messages=True
-            )
+            # Keep the newest turns that fit the history budget
+            history = await asyncio.to_thread(self.load_chat_history, detection_id)
+            _, messages = fit_messages(history, SECTION_BUDGETS["history"])
             
-            # Store user message
-            if hasattr(memory.chat_memory, 'add_user_message'):
-                memory.chat_memory.add_user_message(message)
-            
-            # Get conversation history
-            messages = memory.chat_memory.messages
-            
-            response = self.chat_chain.invoke({
+            fitted = prompt_assembler.fit("disease_chat", "{message}", [
+                PromptSection("message", message, SECTION_BUDGETS["user_message"], keep="tail")
+            ])
+            inputs = {
                 "crop_name": self.crop_name,
                 "disease_name": disease_name,
-                "message": message,
+                "message": fitted["message"],
                 "messages": messages
-            })
-            
-            # Store AI response
-            if hasattr(memory.chat_memory, 'add_ai_message'):
-                memory.chat_memory.add_ai_message(response)
+            }
+            try:
+                response = await model_router.ainvoke(
+                    "disease_chat",
+                    lambda model: (self.chat_prompt | self.llm_for(model) | StrOutputParser()).stream(inputs)
+                )
+            except LLMOverloadedError as e:
+                print(f"Disease chat shed: {e}")
+                return LLM_BUSY_MESSAGE
             
             return response
             
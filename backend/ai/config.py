@@ -0,0 +1,5 @@
+import os
+
+# OpenAI-compatible endpoint for every model call. Point it at the local stand-in
+# (python -m benchmarks.llm_standin) to exercise the AI paths without network access.
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
@@ -6,6 +6,7 @@ from database import SessionLocal
 from ai.services.crop_ai_service import crop_ai_service
 from ai.models import Crop, DiseaseDetection, WeatherAlert, ActivityLog
 from datetime import datetime, timedelta
+import asyncio
 
 def example_usage():
     db = SessionLocal()
@@ -87,7 +88,7 @@ def example_usage():
     
     for message in messages:
         print(f"User: {message}")
-        response = crop_ai_service.chat_with_crop(crop.id, message, db)
+        response = asyncio.run(crop_ai_service.chat_with_crop(crop.id, message))
         print(f"AI: {response}")
         print("-" * 50)
     
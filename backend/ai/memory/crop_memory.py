@@ -2,23 +2,27 @@ from langchain.schema import BaseMessage, HumanMessage, AIMessage
 from langchain_core.chat_history import BaseChatMessageHistory
 from sqlalchemy.orm import Session
 from models import CropConversation
-from typing import List
+from ..services.embedding_pipeline import embedding_pipeline
+from typing import List, Optional
 import json
 
 class PostgreSQLChatMessageHistory(BaseChatMessageHistory):
     """Chat message history stored in PostgreSQL for specific crop"""
     
-    def __init__(self, crop_id: int, db: Session):
+    def __init__(self, crop_id: int, db: Session, max_turns: Optional[int] = None):
         self.crop_id = crop_id
         self.db = db
+        self.max_turns = max_turns
     
     @property
     def messages(self) -> List[BaseMessage]:
-        """Get all messages for this crop"""
-        conversations = self.db.query(CropConversation)\
+        """Messages for this crop, oldest first; only the newest `max_turns` exchanges when set"""
+        query = self.db.query(CropConversation)\
             .filter(CropConversation.crop_id == self.crop_id)\
-            .order_by(CropConversation.created_at.asc())\
-            .all()
+            .order_by(CropConversation.created_at.desc(), CropConversation.id.desc())
+        if self.max_turns is not None:
+            query = query.limit(self.max_turns)
+        conversations = reversed(query.all())
         
         messages = []
         for conv in conversations:
@@ -58,6 +62,7 @@ class PostgreSQLChatMessageHistory(BaseChatMessageHistory):
             )
             self.db.add(conversation)
             self.db.commit()
+            embedding_pipeline.enqueue(conversation)
             delattr(self, '_pending_user_message')
     
     def clear(self) -> None:
@@ -2,22 +2,25 @@ from langchain.schema import BaseMessage, HumanMessage, AIMessage
 from langchain_core.chat_history import BaseChatMessageHistory
 from sqlalchemy.orm import Session
 from models import DiseaseChatHistory
-from typing import List
+from typing import List, Optional
 
 class DiseaseChatMessageHistory(BaseChatMessageHistory):
     """Chat message history for specific disease detection"""
     
-    def __init__(self, detection_id: int, db: Session):
+    def __init__(self, detection_id: int, db: Session, max_turns: Optional[int] = None):
         self.detection_id = detection_id
         self.db = db
+        self.max_turns = max_turns
     
     @property
     def messages(self) -> List[BaseMessage]:
-        """Get all messages for this disease detection"""
-        chats = self.db.query(DiseaseChatHistory)\
+        """Messages for this disease detection, oldest first; only the newest `max_turns` exchanges when set"""
+        query = self.db.query(DiseaseChatHistory)\
             .filter(DiseaseChatHistory.detection_id == self.detection_id)\
-            .order_by(DiseaseChatHistory.created_at.asc())\
-            .all()
+            .order_by(DiseaseChatHistory.created_at.desc(), DiseaseChatHistory.id.desc())
+        if self.max_turns is not None:
+            query = query.limit(self.max_turns)
+        chats = reversed(query.all())
         
         messages = []
         for chat in chats:
@@ -10,5 +10,5 @@ Your role is to provide personalized advice based on the specific crop's current
 CROP CONTEXT:
 {crop_context}
 
-Current conversation:
+Earlier conversation:
 {chat_history}"""
\ No newline at end of file
@@ -0,0 +1,31 @@
+MARKET_ANALYSIS_PROMPT = """
+Analyze this historical market data to provide actionable insights for a farmer:
+
+{market_data}
+
+Based on the month-long price history and trends, provide:
+
+1. **Price Assessment**: How does current price compare to the historical range?
+2. **Trend Analysis**: What does the month-over-month data suggest?
+3. **Market Timing**: Should farmer sell now or wait based on historical patterns?
+4. **Market Selection**: Which specific markets show better historical prices?
+5. **Practical Action**: Concrete next steps based on the data trends.
+
+Use the actual historical data to give specific, data-driven advice. Keep under 150 words.
+"""
+
+MULTI_CROP_ANALYSIS_PROMPT = """
+Analyze this comprehensive historical market data to help the farmer make strategic decisions:
+
+{market_data}
+
+Based on the month-long historical trends and current market conditions, provide:
+
+1. **Priority Selling**: Which crops should be sold immediately based on price trends?
+2. **Market Strategy**: Which crops need market shopping vs local selling?
+3. **Timing Advice**: Which crops to hold vs sell based on historical patterns?
+4. **Risk Assessment**: Which crops have volatile prices requiring quick action?
+5. **Weekly Action Plan**: Specific steps for the next 7 days.
+
+Use the historical trend data to give strategic, data-driven advice. Keep under 180 words.
+"""
@@ -1,11 +1,75 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 from models import Crop, DiseaseDetection, WeatherAlert, ActivityLog, CropConversation
+from .prompt_budget import truncate_to_tokens
+import os
+import threading
+import time
+
+# Free-text fields are clipped so one long note cannot crowd the rest of the context out
+NOTES_TOKEN_BUDGET = 120
+DESCRIPTION_TOKEN_BUDGET = 40
+
+class CropContextCache:
+    """Per-crop cache of formatted AI context, invalidated by crop writes"""
+    
+    def __init__(self, ttl_seconds: int = 3600):
+        # TTL only bounds drift of the relative "N days ago" values; writes invalidate explicitly
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[float, str]] = {}
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, crop_id: int) -> Optional[str]:
+        """Return cached formatted context if present and not expired"""
+        with self._lock:
+            entry = self._entries.get(crop_id)
+            if entry is None:
+                return None
+            cached_at, formatted_context = entry
+            if time.monotonic() - cached_at > self.ttl_seconds:
+                del self._entries[crop_id]
+                return None
+            return formatted_context
+    
+    def generation(self, crop_id: int) -> int:
+        """Current write generation for a crop, captured before recomputing context"""
+        with self._lock:
+            return self._generations.get(crop_id, 0)
+    
+    def set(self, crop_id: int, formatted_context: str, generation: int) -> None:
+        """Store context unless the crop was written to while it was being computed"""
+        with self._lock:
+            if self._generations.get(crop_id, 0) == generation:
+                self._entries[crop_id] = (time.monotonic(), formatted_context)
+    
+    def invalidate(self, crop_id: int) -> None:
+        """Drop cached context after any write that affects the crop"""
+        with self._lock:
+            self._entries.pop(crop_id, None)
+            self._generations[crop_id] = self._generations.get(crop_id, 0) + 1
+
+# Global cache instance shared by chat chains and routers
+crop_context_cache = CropContextCache(ttl_seconds=int(os.getenv("CROP_CONTEXT_CACHE_TTL", "3600")))
 
 class CropContextService:
     def __init__(self, db: Session):
         self.db = db
     
+    def get_formatted_context(self, crop_id: int) -> str:
+        """Get formatted AI context for a crop, served from cache when fresh"""
+        formatted_context = crop_context_cache.get(crop_id)
+        if formatted_context is not None:
+            return formatted_context
+        
+        generation = crop_context_cache.generation(crop_id)
+        context = self.get_crop_context(crop_id)
+        formatted_context = self.format_context_for_ai(context)
+        if context:
+            crop_context_cache.set(crop_id, formatted_context, generation)
+        return formatted_context
+    
     def get_crop_context(self, crop_id: int) -> dict:
         """Get comprehensive context for a specific crop"""
         crop = self.db.query(Crop).filter(Crop.id == crop_id).first()
@@ -110,7 +174,7 @@ class CropContextService:
         crop_district = crop.get("district") or 'Not specified'
         crop_state = crop.get("state") or 'Not specified'
         crop_harvest_date = crop.get("harvest_date") or 'Not specified'
-        crop_notes = crop.get("notes") or 'None'
+        crop_notes = truncate_to_tokens(crop.get("notes") or 'None', NOTES_TOKEN_BUDGET)
         planting_date = crop.get("planting_date")
         days_since_planting = (datetime.utcnow() - planting_date).days if planting_date else "Unknown"
         
@@ -133,7 +197,7 @@ RECENT ACTIVITIES (Last 7 days):
             for activity in activities:
                 days_ago = (datetime.utcnow() - activity["performed_at"]).days
                 activity_type = activity["activity_type"]
-                description = activity["description"]
+                description = truncate_to_tokens(activity["description"] or "", DESCRIPTION_TOKEN_BUDGET)
                 quantity = activity["quantity"]
                 unit = activity["unit"]
                 formatted_context += f"- {activity_type}: {description}"
@@ -159,7 +223,7 @@ RECENT ACTIVITIES (Last 7 days):
             for alert in weather:
                 days_ago = (datetime.utcnow() - alert["created_at"]).days
                 alert_type = alert["alert_type"]
-                description = alert["description"]
+                description = truncate_to_tokens(alert["description"] or "", DESCRIPTION_TOKEN_BUDGET)
                 is_critical = alert["is_critical"]
                 formatted_context += f"- {alert_type}: {description}"
                 if is_critical:
@@ -1,5 +1,4 @@
 from typing import Dict
-from sqlalchemy.orm import Session
 from ..chains.disease_detection_chain import DiseaseDetectionChain
 
 class DiseaseAIService:
@@ -7,32 +6,26 @@ class DiseaseAIService:
         self.active_chains: Dict[int, DiseaseDetectionChain] = {}
         self.disease_contexts: Dict[int, dict] = {}
     
-    def get_disease_chain(self, crop_id: int, db: Session) -> DiseaseDetectionChain:
+    def get_disease_chain(self, crop_id: int, crop_name: str) -> DiseaseDetectionChain:
         """Get or create disease detection chain for specific crop"""
         if crop_id not in self.active_chains:
-            self.active_chains[crop_id] = DiseaseDetectionChain(crop_id, db)
+            self.active_chains[crop_id] = DiseaseDetectionChain(crop_id, crop_name)
         return self.active_chains[crop_id]
     
-    async def analyze_disease_image(self, image_base64: str, crop_id: int, db: Session) -> dict:
-        """Analyze crop image for disease detection"""
-        chain = self.get_disease_chain(crop_id, db)
-        result = chain.analyze_disease(image_base64)
+    def analyze_image(self, image_base64: str, crop_id: int, crop_name: str, mime_type: str = "image/jpeg") -> dict:
+        """Analyze crop image for disease detection; blocking, call from a worker thread"""
+        chain = self.get_disease_chain(crop_id, crop_name)
+        result = chain.analyze_disease(image_base64, mime_type)
         
         # Store disease context for future chat
         self.disease_contexts[crop_id] = result
         
         return result
     
-    async def chat_about_disease(self, disease_name: str, detection_id: int, message: str, db: Session) -> str:
+    async def chat_about_disease(self, disease_name: str, detection_id: int, message: str, crop_id: int, crop_name: str) -> str:
         """Chat about a specific disease"""
-        # Get crop_id from detection_id
-        from models import DiseaseDetection
-        detection = db.query(DiseaseDetection).filter(DiseaseDetection.id == detection_id).first()
-        if not detection:
-            raise ValueError("Detection not found")
-        
-        chain = self.get_disease_chain(detection.crop_id, db)
-        return chain.chat_about_disease(disease_name, detection_id, message)
+        chain = self.get_disease_chain(crop_id, crop_name)
+        return await chain.chat_about_disease(disease_name, detection_id, message)
     
     def clear_disease_chain(self, crop_id: int):
         """Clear cached chain for crop"""
@@ -42,4 +35,4 @@ class DiseaseAIService:
             del self.disease_contexts[crop_id]
 
 # Global service instance
-disease_ai_service = DiseaseAIService()
\ No newline at end of file
+disease_ai_service = DiseaseAIService()
@@ -0,0 +1,268 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Crop, DiseaseDetection
+from image_store import image_store
+from .disease_ai_service import disease_ai_service
+from .crop_context import crop_context_cache
+from .image_dedup import disease_image_index, dhash, format_hash, dedup_scope
+import asyncio
+import base64
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+def analyze_and_record(db: Session, crop: Crop, image_data: bytes, mime_type: str, image_name: Optional[str] = None) -> dict:
+    """Analyze a preprocessed photo (or reuse a near-duplicate's analysis) and save the DiseaseDetection row"""
+    crop_id, crop_name = crop.id, crop.name
+    # Near-identical photos of the same crop type reuse the earlier analysis
+    image_hash = dhash(image_data)
+    scope = dedup_scope(crop.crop_type, crop.name)
+    previous = disease_image_index.find(db, scope, image_hash)
+    if previous:
+        print(f"Reusing analysis of detection {previous.id} (near-duplicate image)")
+        result = json.loads(previous.analysis_result)
+        reused = True
+    else:
+        # Return the connection to the pool for the model call; the insert below checks one out again
+        db.rollback()
+        print(f"Starting disease analysis...")
+        result = disease_ai_service.analyze_image(
+            base64.b64encode(image_data).decode("ascii"),
+            crop_id,
+            crop_name,
+            mime_type=mime_type
+        )
+        reused = False
+
+    # Canned fallback answers must never be served to other uploads
+    is_fallback = result.pop('fallback', False)
+
+    detection = DiseaseDetection(
+        crop_id=crop_id,
+        disease_name=result.get('disease', 'Unknown'),
+        confidence=float(result.get('confidence', 0)),
+        severity=result.get('severity', 'Unknown'),
+        recommendations=str(result.get('treatment', [])),
+        image_path=image_name,
+        image_hash=format_hash(image_hash),
+        analysis_result=None if is_fallback else json.dumps(result)
+    )
+    db.add(detection)
+    db.commit()
+    db.refresh(detection)
+    crop_context_cache.invalidate(crop_id)
+    if not reused and not is_fallback:
+        disease_image_index.add(scope, image_hash, detection.id)
+
+    result['detection_id'] = detection.id
+    result['reused'] = reused
+    return result
+
+def analyze_crop_image(crop_id: int, image_data: bytes, mime_type: str, image_name: Optional[str] = None) -> dict:
+    """analyze_and_record on a session of its own, for worker threads"""
+    db = SessionLocal()
+    try:
+        crop = db.query(Crop).filter(Crop.id == crop_id, Crop.deleted_at.is_(None)).first()
+        if not crop:
+            raise ValueError("Crop not found")
+        return analyze_and_record(db, crop, image_data, mime_type, image_name)
+    finally:
+        db.close()
+
+class JobQueueFullError(Exception):
+    """No room for another analysis job"""
+
+class DiseaseJob:
+    FINISHED = ("completed", "failed")
+
+    def __init__(self, user_id, crop_id: int, image_name: str, mime_type: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.crop_id = crop_id
+        self.image_name = image_name
+        self.mime_type = mime_type
+        self.status = "queued"
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def key(self) -> tuple:
+        return (str(self.user_id), self.crop_id, self.image_name)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.FINISHED
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "crop_id": self.crop_id,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+class DiseaseJobQueue:
+    """Runs disease analyses on a pool of worker threads, off the request path.
+
+    The upload endpoint preprocesses and stores the photo, enqueues a job and
+    returns immediately; a worker opens its own session, calls the vision model
+    and writes the DiseaseDetection row. Clients poll the job or wait on it over
+    WebSocket. A retried upload of the same photo for the same crop returns the
+    existing job instead of paying for a second model call.
+
+    Job state lives in this process and is kept for `ttl_seconds` after it
+    finishes; the detection row itself is durable.
+    """
+
+    def __init__(self, workers: int = 4, max_queue_size: int = 200, ttl_seconds: int = 3600):
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.queue: "queue.Queue[Optional[DiseaseJob]]" = queue.Queue(maxsize=max_queue_size)
+        self._jobs: Dict[str, DiseaseJob] = {}
+        self._by_key: Dict[tuple, str] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.metrics = {"submitted": 0, "deduplicated": 0, "rejected": 0, "completed": 0, "failed": 0, "run_seconds": 0.0, "wait_seconds": 0.0}
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        for index in range(len(self._threads), self.workers):
+            thread = threading.Thread(target=self._run, name=f"disease-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Let workers finish their current job and exit"""
+        for _ in self._threads:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, user_id, crop_id: int, image_name: str, mime_type: str) -> DiseaseJob:
+        """Queue an analysis of a stored image, or return the live job for the same upload"""
+        job = DiseaseJob(user_id, crop_id, image_name, mime_type)
+        with self._lock:
+            self._purge_expired()
+            existing = self._jobs.get(self._by_key.get(job.key))
+            if existing and existing.status != "failed":
+                self.metrics["deduplicated"] += 1
+                return existing
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self.metrics["rejected"] += 1
+                raise JobQueueFullError("Too many analyses in progress, try again shortly")
+            self._jobs[job.id] = job
+            self._by_key[job.key] = job.id
+            self.metrics["submitted"] += 1
+        return job
+
+    def get(self, job_id: str, user_id=None) -> Optional[DiseaseJob]:
+        """Look up a job, optionally only if it belongs to user_id"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job and user_id is not None and str(job.user_id) != str(user_id):
+            return None
+        return job
+
+    async def wait(self, job: DiseaseJob, timeout: float) -> None:
+        """Return on the job's next status change, or after timeout"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if job.finished:
+                return
+            job.waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if (loop, future) in job.waiters:
+                    job.waiters.remove((loop, future))
+
+    def _set_status(self, job: DiseaseJob, status: str):
+        with self._lock:
+            job.status = status
+            waiters, job.waiters = job.waiters, []
+        for loop, future in waiters:
+            # Futures belong to the request's event loop; resolve them there
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [job for job in self._jobs.values() if job.finished and job.finished_at < cutoff]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.started_at = time.time()
+            self._set_status(job, "running")
+            try:
+                job.result = self._process(job)
+                status = "completed"
+            except Exception as e:
+                print(f"Disease analysis job {job.id} failed: {e}")
+                job.error = str(e)
+                status = "failed"
+            job.finished_at = time.time()
+            with self._lock:
+                self.metrics[status] += 1
+                self.metrics["wait_seconds"] += job.started_at - job.created_at
+                self.metrics["run_seconds"] += job.finished_at - job.started_at
+            self._set_status(job, status)
+
+    def _process(self, job: DiseaseJob) -> dict:
+        path = image_store.image_path(job.image_name)
+        if not path:
+            raise ValueError("Stored image not found")
+        with open(path, "rb") as f:
+            image_data = f.read()
+        return analyze_crop_image(job.crop_id, image_data, job.mime_type, job.image_name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+            statuses: Dict[str, int] = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+        done = metrics["completed"] + metrics["failed"]
+        return {
+            **metrics,
+            "jobs": statuses,
+            "queue_depth": self.queue.qsize(),
+            "workers": self.workers,
+            "workers_running": sum(1 for thread in self._threads if thread.is_alive()),
+            "avg_wait_seconds": metrics["wait_seconds"] / done if done else 0.0,
+            "avg_run_seconds": metrics["run_seconds"] / done if done else 0.0,
+        }
+
+# Global job queue, started with the app
+disease_job_queue = DiseaseJobQueue(
+    workers=int(os.getenv("DISEASE_JOB_WORKERS", "4")),
+    max_queue_size=int(os.getenv("DISEASE_JOB_QUEUE_SIZE", "200")),
+    ttl_seconds=int(os.getenv("DISEASE_JOB_TTL_SECONDS", "3600"))
+)
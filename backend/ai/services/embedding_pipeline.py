@@ -0,0 +1,225 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update
+from database import SessionLocal
+from models import Message, CropConversation
+from .embeddings import EmbeddingProvider, embedding_provider
+import os
+import queue
+import threading
+import time
+
+# Rows whose text is embedded in the background, keyed by name for the backfill cursor
+EMBEDDED_MODELS = {
+    "messages": Message,
+    "crop_conversations": CropConversation,
+}
+
+def embedding_text(row) -> str:
+    """Text that represents a row in the vector index"""
+    if isinstance(row, CropConversation):
+        return f"{row.message or ''}\n{row.response or ''}"
+    return row.content or ""
+
+class EmbeddingPipeline:
+    """Embeds new chat rows off the request path in provider-sized batches.
+
+    Routers enqueue (model, id, text) after their commit; a worker thread drains
+    the queue, embeds up to `batch_size` texts per provider call and writes the
+    vectors back with one bulk UPDATE per model. Rows that never make it through
+    (queue full, provider outage, restart) keep a NULL embedding and are picked
+    up by the backfill.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, batch_size: int = 64, max_wait_seconds: float = 0.5, max_queue_size: int = 10000, backfill_retry_seconds: float = 5.0, backfill_max_retry_seconds: float = 300.0):
+        self.provider = provider
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.backfill_retry_seconds = backfill_retry_seconds
+        self.backfill_max_retry_seconds = backfill_max_retry_seconds
+        self.queue: "queue.Queue[Tuple[type, object, str, float]]" = queue.Queue(maxsize=max_queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._backfill: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.backfill_cursor: Dict[str, Optional[str]] = {}
+        self.metrics = {
+            "enqueued": 0,
+            "embedded": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "provider_seconds": 0.0,
+            "write_seconds": 0.0,
+            "last_lag_seconds": 0.0,
+            "backfilled": 0,
+            "backfill_errors": 0,
+        }
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        if self._worker and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name="embedding-pipeline", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker after it flushes what is already queued"""
+        self._stopping.set()
+        if self._worker:
+            self._worker.join(timeout)
+
+    def enqueue(self, row) -> None:
+        """Queue a freshly committed row for embedding; never blocks the caller"""
+        try:
+            self.queue.put_nowait((type(row), row.id, embedding_text(row), time.monotonic()))
+            self._count("enqueued")
+        except queue.Full:
+            # The backfill finds rows left with a NULL embedding
+            self._count("dropped")
+
+    def _count(self, metric: str, amount=1):
+        with self._lock:
+            self.metrics[metric] += amount
+
+    def _next_batch(self) -> List[Tuple[type, object, str, float]]:
+        try:
+            batch = [self.queue.get(timeout=self.max_wait_seconds)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self.embed_and_store([(model, row_id, text) for model, row_id, text, _ in batch])
+                self.metrics["last_lag_seconds"] = time.monotonic() - batch[0][3]
+            except Exception as e:
+                print(f"Embedding batch of {len(batch)} failed: {e}")
+                self._count("failed", len(batch))
+
+    def embed_and_store(self, items: List[Tuple[type, object, str]]) -> int:
+        """Embed texts in one provider call and bulk-update their rows"""
+        started = time.perf_counter()
+        vectors = self.provider.embed_batch([text for _, _, text in items])
+        self._count("provider_seconds", time.perf_counter() - started)
+
+        updates: Dict[type, List[dict]] = {}
+        for (model, row_id, _), vector in zip(items, vectors):
+            updates.setdefault(model, []).append({"id": row_id, "embedding": vector})
+
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            for model, rows in updates.items():
+                # ORM bulk UPDATE by primary key: one executemany per model
+                db.execute(update(model), rows)
+            db.commit()
+        finally:
+            db.close()
+        self._count("write_seconds", time.perf_counter() - started)
+
+        with self._lock:
+            self.metrics["embedded"] += len(items)
+            self.metrics["batches"] += 1
+            self.metrics["last_batch_size"] = len(items)
+        return len(items)
+
+    def backfill(self) -> int:
+        """Embed every row that still has no embedding.
+
+        Pending rows are found through the partial `*_embedding_pending`
+        indexes (migration 0007), so a backfill started after a restart
+        resumes where the last one stopped: rows it embedded are no longer
+        NULL. Within a run, the id cursor starts each batch after the last one
+        instead of stepping over index entries of rows just updated, which stay
+        behind until vacuum. A batch that fails is retried from the same cursor
+        with exponential backoff and counted in `backfill_errors`.
+        """
+        total = 0
+        for name, model in EMBEDDED_MODELS.items():
+            delay = self.backfill_retry_seconds
+            while not self._stopping.is_set():
+                try:
+                    items = self._pending_batch(name, model)
+                    if not items:
+                        break
+                    self.embed_and_store(items)
+                except Exception as e:
+                    # Provider or database trouble: back off and retry the same batch
+                    self._count("backfill_errors")
+                    print(f"Embedding backfill of {name} failed, retrying in {delay:.0f}s: {e}")
+                    self._stopping.wait(delay)
+                    delay = min(delay * 2, self.backfill_max_retry_seconds)
+                    continue
+                delay = self.backfill_retry_seconds
+                # Keyset cursor for this run only; restarts rely on embedding IS NULL
+                self.backfill_cursor[name] = items[-1][1]
+                total += len(items)
+                self._count("backfilled", len(items))
+            self.backfill_cursor.pop(name, None)
+        return total
+
+    def _pending_batch(self, name: str, model) -> List[Tuple[type, object, str]]:
+        """Next `batch_size` rows of `model` without an embedding, after this run's cursor"""
+        db = SessionLocal()
+        try:
+            query = db.query(model).filter(model.embedding.is_(None))
+            cursor = self.backfill_cursor.get(name)
+            if cursor is not None:
+                query = query.filter(model.id > cursor)
+            rows = query.order_by(model.id).limit(self.batch_size).all()
+            return [(model, row.id, embedding_text(row)) for row in rows]
+        finally:
+            db.close()
+
+    def start_backfill(self) -> bool:
+        """Run the backfill in a background thread; False if one is already running"""
+        if self._backfill and self._backfill.is_alive():
+            return False
+        self._backfill = threading.Thread(target=self.backfill, name="embedding-backfill", daemon=True)
+        self._backfill.start()
+        return True
+
+    def stats(self) -> dict:
+        """Queue depth, batch sizes and throughput for monitoring"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        busy_seconds = metrics["provider_seconds"] + metrics["write_seconds"]
+        return {
+            **metrics,
+            "queue_depth": self.queue.qsize(),
+            "batch_size": self.batch_size,
+            "avg_batch_size": metrics["embedded"] / metrics["batches"] if metrics["batches"] else 0,
+            "throughput_per_second": metrics["embedded"] / busy_seconds if busy_seconds else 0,
+            "provider": self.provider.name,
+            "worker_running": bool(self._worker and self._worker.is_alive()),
+            "backfill_running": bool(self._backfill and self._backfill.is_alive()),
+            "backfill_cursor": {name: str(cursor) for name, cursor in self.backfill_cursor.items()},
+        }
+
+# Global pipeline instance, started with the app
+embedding_pipeline = EmbeddingPipeline(
+    embedding_provider,
+    batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+    max_wait_seconds=float(os.getenv("EMBEDDING_MAX_WAIT_SECONDS", "0.5"))
+)
+
+if __name__ == "__main__":
+    # python -m ai.services.embedding_pipeline  -> one-off backfill of existing history
+    started = time.perf_counter()
+    count = embedding_pipeline.backfill()
+    print(f"Backfilled {count} rows in {time.perf_counter() - started:.1f}s")
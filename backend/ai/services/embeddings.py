@@ -0,0 +1,86 @@
+from typing import List
+from openai import OpenAI
+from ..config import OPENROUTER_BASE_URL
+import hashlib
+import math
+import os
+import re
+
+# Width of the pgvector columns; matches openai/text-embedding-3-small
+EMBEDDING_DIM = 1536
+
+class EmbeddingProvider:
+    """Base class for text embedding backends"""
+
+    name = "base"
+    dim = EMBEDDING_DIM
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts in one provider call"""
+        raise NotImplementedError
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a single text"""
+        return self.embed_batch([text])[0]
+
+class OpenRouterEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from an OpenAI-compatible API (OpenRouter by default)"""
+
+    name = "openrouter"
+
+    def __init__(self, model: str = "openai/text-embedding-3-small"):
+        self.model = model
+        self.client = OpenAI(
+            base_url=os.getenv("EMBEDDING_API_BASE", OPENROUTER_BASE_URL),
+            api_key=os.getenv("EMBEDDING_API_KEY") or os.getenv("OPENROUTER_API_KEY")
+        )
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=texts, dimensions=self.dim)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+class LocalHashEmbeddingProvider(EmbeddingProvider):
+    """Deterministic offline embedder using feature hashing of words and word pairs.
+
+    Texts sharing vocabulary land close together under cosine distance, which is
+    enough for offline tests and benchmarks without network access.
+    """
+
+    name = "local"
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"\w+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def _embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm == 0:
+            # Empty text still needs a valid unit vector for cosine distance
+            vector[0] = 1.0
+            return vector
+        return [value / norm for value in vector]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(text) for text in texts]
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Pick the embedding backend from EMBEDDING_PROVIDER (openrouter or local)"""
+    provider = os.getenv("EMBEDDING_PROVIDER")
+    if provider is None:
+        provider = "openrouter" if os.getenv("OPENROUTER_API_KEY") else "local"
+
+    if provider == "local":
+        return LocalHashEmbeddingProvider()
+    if provider == "openrouter":
+        return OpenRouterEmbeddingProvider(model=os.getenv("EMBEDDING_MODEL", "openai/text-embedding-3-small"))
+    raise ValueError(f"Unknown embedding provider: {provider}")
+
+# Global provider instance
+embedding_provider = get_embedding_provider()
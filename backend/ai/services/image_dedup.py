@@ -0,0 +1,140 @@
+from io import BytesIO
+from typing import Dict, List, Optional, Set, Tuple
+from PIL import Image
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Crop, DiseaseDetection
+import os
+import threading
+
+# Hamming distance (out of 64 bits) under which two photos count as the same shot
+DEDUP_MAX_DISTANCE = int(os.getenv("DISEASE_DEDUP_MAX_DISTANCE", "6"))
+
+def dhash(image_data: bytes, hash_size: int = 8) -> int:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+    image = Image.open(BytesIO(image_data))
+    image.draft("L", (hash_size * 4, hash_size * 4))
+    pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+def format_hash(value: int) -> str:
+    return f"{value:016x}"
+
+def dedup_scope(crop_type: Optional[str], crop_name: Optional[str]) -> str:
+    """Detections are only reused between crops of the same type"""
+    return (crop_type or crop_name or "").strip().lower()
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for Hamming-radius queries"""
+
+    def __init__(self):
+        self.root: Optional[list] = None  # [hash, values, {distance: child}]
+
+    def add(self, value: int, item) -> None:
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = (node[0] ^ value).bit_count()
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, object]]:
+        """All items within max_distance, nearest first"""
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = (node[0] ^ value).bit_count()
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in node[1])
+            # Triangle inequality: only subtrees in [d - r, d + r] can hold matches
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches, key=lambda match: match[0])
+
+class DiseaseImageDedupIndex:
+    """Per-crop-type BK-trees of analysed photo hashes, loaded lazily from disease_detections"""
+
+    def __init__(self, max_distance: int = DEDUP_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._trees: Dict[str, BKTree] = {}
+        self._loaded: Set[str] = set()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0}
+
+    def _ensure_loaded(self, db: Session, scope: str) -> BKTree:
+        with self._lock:
+            if scope in self._loaded:
+                return self._trees[scope]
+        rows = db.query(DiseaseDetection.id, DiseaseDetection.image_hash)\
+            .join(Crop, DiseaseDetection.crop_id == Crop.id)\
+            .filter(
+                func.lower(func.trim(func.coalesce(Crop.crop_type, Crop.name))) == scope,
+                DiseaseDetection.image_hash.isnot(None),
+                DiseaseDetection.analysis_result.isnot(None)
+            ).all()
+        tree = BKTree()
+        for detection_id, image_hash in rows:
+            tree.add(int(image_hash, 16), detection_id)
+        with self._lock:
+            if scope not in self._loaded:
+                self._trees[scope] = tree
+                self._loaded.add(scope)
+            return self._trees[scope]
+
+    def find(self, db: Session, scope: str, image_hash: int) -> Optional[DiseaseDetection]:
+        """Closest earlier detection of a near-identical photo, if any"""
+        tree = self._ensure_loaded(db, scope)
+        with self._lock:
+            candidates = tree.search(image_hash, self.max_distance)
+        for _, detection_id in candidates:
+            # Deleted detections stay in the tree; skip them here
+            detection = db.query(DiseaseDetection).filter(
+                DiseaseDetection.id == detection_id,
+                DiseaseDetection.analysis_result.isnot(None)
+            ).first()
+            if detection:
+                with self._lock:
+                    self.metrics["hits"] += 1
+                return detection
+        with self._lock:
+            self.metrics["misses"] += 1
+        return None
+
+    def add(self, scope: str, image_hash: int, detection_id: int) -> None:
+        """Index a freshly analysed photo (only if the scope is already loaded; otherwise the load picks it up)"""
+        with self._lock:
+            if scope in self._loaded:
+                self._trees[scope].add(image_hash, detection_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+            scopes = len(self._loaded)
+        lookups = metrics["hits"] + metrics["misses"]
+        return {
+            **metrics,
+            "hit_rate": metrics["hits"] / lookups if lookups else 0.0,
+            "max_distance": self.max_distance,
+            "loaded_scopes": scopes,
+        }
+
+# Global index shared by disease analysis requests
+disease_image_index = DiseaseImageDedupIndex()
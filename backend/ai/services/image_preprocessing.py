@@ -0,0 +1,57 @@
+from io import BytesIO
+from typing import NamedTuple
+from PIL import Image, ImageOps, UnidentifiedImageError
+import os
+
+# Uploads above this are rejected before the body is parsed (see main.py)
+MAX_UPLOAD_BYTES = int(os.getenv("DISEASE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Refuse decompression bombs before allocating pixel buffers
+MAX_IMAGE_PIXELS = int(os.getenv("DISEASE_MAX_IMAGE_PIXELS", "50000000"))
+# Longest side sent to the vision model; larger inputs are downscaled by the model anyway
+VISION_MAX_DIMENSION = int(os.getenv("VISION_MAX_DIMENSION", "1024"))
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "JPEG").upper()
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+class ImageTooLargeError(ValueError):
+    """Upload exceeds the byte or pixel limits"""
+
+class InvalidImageError(ValueError):
+    """Upload is not a decodable image"""
+
+class ProcessedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+
+def preprocess_image(data: bytes) -> ProcessedImage:
+    """Decode, apply EXIF orientation, downscale and re-encode an uploaded photo for vision analysis"""
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ImageTooLargeError(f"Image exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
+    try:
+        image = Image.open(BytesIO(data))
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            raise ImageTooLargeError(f"Image exceeds {MAX_IMAGE_PIXELS} pixels")
+
+        # For JPEGs, let the decoder downscale in the DCT domain instead of decoding full resolution
+        image.draft("RGB", (VISION_MAX_DIMENSION, VISION_MAX_DIMENSION))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((VISION_MAX_DIMENSION, VISION_MAX_DIMENSION), Image.LANCZOS)
+    except ImageTooLargeError:
+        raise
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidImageError(f"Could not decode image: {e}")
+
+    output = BytesIO()
+    image.save(output, format=VISION_IMAGE_FORMAT, quality=VISION_IMAGE_QUALITY, optimize=True)
+    return ProcessedImage(
+        data=output.getvalue(),
+        mime_type=MIME_TYPES.get(VISION_IMAGE_FORMAT, "image/jpeg"),
+        width=image.width,
+        height=image.height
+    )
@@ -0,0 +1,205 @@
+from collections import deque
+from typing import Callable, Dict, Optional, TypeVar
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from metrics import percentile
+
+T = TypeVar("T")
+
+# Lower runs first: interactive chat and diagnosis beat batch market summaries
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Returned to users when a call is shed rather than queued behind a backlog
+LLM_BUSY_MESSAGE = "The AI assistant is busy right now. Please try again in a moment."
+
+class LLMOverloadedError(Exception):
+    """Call was shed: the model's queue is too deep or the wait took too long"""
+
+def parse_concurrency_limits(value: str) -> Dict[str, int]:
+    """'model-a=4,model-b=2' -> {'model-a': 4, 'model-b': 2}"""
+    limits = {}
+    for item in value.split(","):
+        model, _, limit = item.strip().rpartition("=")
+        if model and limit.isdigit():
+            limits[model] = int(limit)
+    return limits
+
+class _Waiter:
+    """A queued call; woken through a threading.Event or an asyncio future"""
+
+    def __init__(self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+        else:
+            self.event.set()
+
+class _ModelState:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.queued = 0
+        self.heap: list = []
+        self.wait_samples: deque = deque(maxlen=1000)
+        self.service_samples: deque = deque(maxlen=1000)
+        self.metrics = {"calls": 0, "errors": 0, "shed": 0, "abandoned": 0}
+
+class LLMDispatcher:
+    """Single gate for every model call in the app.
+
+    Each model gets a concurrency limit; callers beyond it wait in a priority
+    queue (FIFO within a priority) and are admitted as slots free up. When a
+    model's queue is already deep, or a call has waited longer than
+    `max_queue_wait`, the call is shed with LLMOverloadedError so the caller can
+    answer with its fallback instead of piling onto a rate-limited provider.
+    Batch work is shed at a shallower depth than interactive traffic.
+
+    `run` blocks (worker threads); `acall` waits without blocking the event
+    loop and runs the call in a thread.
+    """
+
+    def __init__(self, default_limit: int = 4, limits: Optional[Dict[str, int]] = None, max_queue_depth: int = 50, batch_queue_depth: int = 10, max_queue_wait: float = 30.0):
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self.max_queue_depth = max_queue_depth
+        self.batch_queue_depth = batch_queue_depth
+        self.max_queue_wait = max_queue_wait
+        self._models: Dict[str, _ModelState] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _state(self, model: str) -> _ModelState:
+        state = self._models.get(model)
+        if state is None:
+            state = self._models[model] = _ModelState(self.limits.get(model, self.default_limit))
+        return state
+
+    def _enqueue(self, model: str, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None) -> _Waiter:
+        waiter = _Waiter(priority, loop)
+        with self._lock:
+            state = self._state(model)
+            if state.active < state.limit and state.queued == 0:
+                state.active += 1
+                waiter.granted = True
+                return waiter
+            depth = self.max_queue_depth if priority <= PRIORITY_INTERACTIVE else self.batch_queue_depth
+            if state.queued >= depth:
+                state.metrics["shed"] += 1
+                raise LLMOverloadedError(f"{model} queue is full ({state.queued} waiting)")
+            heapq.heappush(state.heap, (priority, next(self._sequence), waiter))
+            state.queued += 1
+        return waiter
+
+    def _abandon(self, model: str, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up; False if it was granted a slot in the meantime"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            state = self._state(model)
+            state.queued -= 1
+            state.metrics["abandoned"] += 1
+            return True
+
+    def _release(self, model: str):
+        with self._lock:
+            state = self._state(model)
+            state.active -= 1
+            while state.heap and state.active < state.limit:
+                _, _, waiter = heapq.heappop(state.heap)
+                if waiter.cancelled:
+                    continue
+                state.queued -= 1
+                state.active += 1
+                waiter.granted = True
+                waiter.wake()
+
+    def _execute(self, model: str, waiter: _Waiter, fn: Callable[[], T]) -> T:
+        started = time.perf_counter()
+        try:
+            return fn()
+        except Exception:
+            with self._lock:
+                self._state(model).metrics["errors"] += 1
+            raise
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                state = self._state(model)
+                state.metrics["calls"] += 1
+                state.wait_samples.append(started - waiter.enqueued_at)
+                state.service_samples.append(finished - started)
+            self._release(model)
+
+    def run(self, model: str, fn: Callable[[], T], priority: int = PRIORITY_INTERACTIVE) -> T:
+        """Run a blocking model call once a slot for `model` is free"""
+        waiter = self._enqueue(model, priority)
+        if not waiter.granted and not waiter.event.wait(self.max_queue_wait):
+            if self._abandon(model, waiter):
+                raise LLMOverloadedError(f"Waited over {self.max_queue_wait}s for {model}")
+        return self._execute(model, waiter, fn)
+
+    async def acall(self, model: str, fn: Callable[[], T], priority: int = PRIORITY_INTERACTIVE) -> T:
+        """Await a slot for `model` without blocking the event loop, then run fn in a thread"""
+        waiter = self._enqueue(model, priority, asyncio.get_running_loop())
+        if not waiter.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.max_queue_wait)
+            except asyncio.TimeoutError:
+                if self._abandon(model, waiter):
+                    raise LLMOverloadedError(f"Waited over {self.max_queue_wait}s for {model}")
+            except asyncio.CancelledError:
+                if not self._abandon(model, waiter):
+                    self._release(model)
+                raise
+        # The slot is released by the thread, so it frees up even if this request is cancelled
+        return await asyncio.to_thread(self._execute, model, waiter, fn)
+
+    def stats(self) -> dict:
+        """Per-model slots, queue depth, shed counts and queue-wait / service-time percentiles"""
+        with self._lock:
+            snapshot = {
+                model: (state.limit, state.active, state.queued, dict(state.metrics), list(state.wait_samples), list(state.service_samples))
+                for model, state in self._models.items()
+            }
+        models = {}
+        for model, (limit, active, queued, metrics, waits, services) in snapshot.items():
+            models[model] = {
+                **metrics,
+                "limit": limit,
+                "active": active,
+                "queued": queued,
+                "queue_wait_p50": percentile(waits, 0.5),
+                "queue_wait_p95": percentile(waits, 0.95),
+                "service_time_p50": percentile(services, 0.5),
+                "service_time_p95": percentile(services, 0.95),
+            }
+        return {
+            "models": models,
+            "default_limit": self.default_limit,
+            "max_queue_depth": self.max_queue_depth,
+            "batch_queue_depth": self.batch_queue_depth,
+            "max_queue_wait": self.max_queue_wait,
+        }
+
+# Global dispatcher shared by chat, crop/disease chains and market summaries
+llm_dispatcher = LLMDispatcher(
+    default_limit=int(os.getenv("LLM_DEFAULT_CONCURRENCY", "4")),
+    limits=parse_concurrency_limits(os.getenv("LLM_CONCURRENCY_LIMITS", "")),
+    max_queue_depth=int(os.getenv("LLM_MAX_QUEUE_DEPTH", "50")),
+    batch_queue_depth=int(os.getenv("LLM_BATCH_QUEUE_DEPTH", "10")),
+    max_queue_wait=float(os.getenv("LLM_MAX_QUEUE_WAIT_SECONDS", "30"))
+)
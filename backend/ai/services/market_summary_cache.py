@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+Series = Tuple[str, ...]
+
+def series_key(crop: str, district: str, state: str) -> Series:
+    return tuple((part or "").strip().lower() for part in (crop, district, state))
+
+def snapshot_digest(data) -> str:
+    """Stable digest of the market data a summary was generated from"""
+    payload = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MarketSummaryCache:
+    """Shared LLM market summaries keyed by (series, data snapshot digest).
+
+    A summary depends only on the market data, so every user asking about the
+    same crop in the same district gets the same text. Each series remembers the
+    latest snapshot it has seen; when fetched data changes, the series' older
+    summaries are dropped. Concurrent misses for the same key share one model
+    call.
+    """
+
+    def __init__(self, ttl_seconds: int = 21600, max_entries: int = 2000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Series, str], Tuple[str, float]]" = OrderedDict()
+        self._current: Dict[Series, str] = {}
+        self._inflight: Dict[Tuple[Series, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "evictions": 0}
+
+    def observe(self, series: Series, digest: str) -> None:
+        """Record the latest data snapshot for a series, invalidating summaries of older ones"""
+        with self._lock:
+            if self._current.get(series) not in (None, digest):
+                self._drop_series(series)
+                self.metrics["invalidations"] += 1
+            self._current[series] = digest
+
+    def invalidate(self, series: Series) -> None:
+        """Drop every cached summary for a series (new price data was ingested)"""
+        with self._lock:
+            self._drop_series(series)
+            self._current.pop(series, None)
+            self.metrics["invalidations"] += 1
+
+    def _drop_series(self, series: Series):
+        for key in [key for key in self._entries if key[0] == series]:
+            del self._entries[key]
+
+    def get(self, series: Series, digest: str) -> Optional[str]:
+        key = (series, digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            summary, created_at = entry
+            if time.monotonic() - created_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return summary
+
+    def put(self, series: Series, digest: str, summary: str) -> None:
+        with self._lock:
+            if self._current.get(series) not in (None, digest):
+                # Data for this series moved on while the summary was being generated
+                return
+            self._entries[(series, digest)] = (summary, time.monotonic())
+            self._entries.move_to_end((series, digest))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics["evictions"] += 1
+
+    async def get_or_generate(self, series: Series, digest: str, generate: Callable[[], Awaitable[str]]) -> str:
+        """Cached summary for this snapshot, or generate it once for all concurrent callers.
+
+        Errors from `generate` propagate (to every waiter) and nothing is cached,
+        so callers keep their own fallbacks.
+        """
+        self.observe(series, digest)
+        summary = self.get(series, digest)
+        if summary is not None:
+            with self._lock:
+                self.metrics["hits"] += 1
+            return summary
+
+        key = (series, digest)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            with self._lock:
+                self.metrics["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        with self._lock:
+            self.metrics["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            summary = await generate()
+            self.put(series, digest, summary)
+            future.set_result(summary)
+            return summary
+        except BaseException as e:
+            # Waiters fall back like the generating request; they are not cancelled with it
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Summary generation was cancelled"))
+            # Mark retrieved so a failure nobody else awaited is not logged as unhandled
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+            size = len(self._entries)
+            series = len(self._current)
+        lookups = metrics["hits"] + metrics["misses"] + metrics["coalesced"]
+        return {
+            **metrics,
+            "hit_ratio": (metrics["hits"] + metrics["coalesced"]) / lookups if lookups else 0.0,
+            "size": size,
+            "series": series,
+            "inflight": len(self._inflight),
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+# Global cache shared by the market insight endpoints
+market_summary_cache = MarketSummaryCache(
+    ttl_seconds=int(os.getenv("MARKET_SUMMARY_TTL_SECONDS", "21600")),
+    max_entries=int(os.getenv("MARKET_SUMMARY_MAX_ENTRIES", "2000"))
+)
@@ -0,0 +1,222 @@
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+from .llm_dispatcher import llm_dispatcher, LLMOverloadedError, PRIORITY_INTERACTIVE
+from metrics import percentile
+import asyncio
+import os
+import threading
+import time
+
+# Ordered candidates per task: the first healthy model is primary, the rest are hedge/fallback targets
+DEFAULT_TASK_MODELS = {
+    "crop_chat": ["deepseek/deepseek-chat-v3.1:free", "x-ai/grok-2-1212"],
+    "general_chat": ["x-ai/grok-2-1212", "deepseek/deepseek-chat-v3.1:free"],
+    "disease_vision": ["meta-llama/llama-4-maverick:free", "meta-llama/llama-4-scout:free"],
+    "disease_chat": ["meta-llama/llama-4-maverick:free", "deepseek/deepseek-chat-v3.1:free"],
+}
+
+def task_models(task: str) -> List[str]:
+    """Candidates for a task; MODEL_CANDIDATES_<TASK>=a,b overrides the defaults"""
+    override = os.getenv(f"MODEL_CANDIDATES_{task.upper()}")
+    if override:
+        return [model.strip() for model in override.split(",") if model.strip()]
+    return list(DEFAULT_TASK_MODELS.get(task, []))
+
+class ModelLatency:
+    def __init__(self):
+        self.ttft_ewma: Optional[float] = None
+        self.latencies: deque = deque(maxlen=200)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.metrics = {"requests": 0, "successes": 0, "failures": 0, "cancelled": 0, "hedges": 0, "hedge_wins": 0}
+
+class ModelRouter:
+    """Picks models per task and hedges slow calls.
+
+    Calls stream, so each model's time-to-first-token is tracked as an EWMA and
+    its full-response latency as a rolling window. The primary candidate gets a
+    head start of its own p95 latency; if it has not answered by then, one
+    hedged request goes to the alternate with the lowest TTFT and the first
+    answer wins (the loser stops reading its stream). Errors, including calls
+    shed by the dispatcher, fall through to the next candidate immediately, and
+    repeatedly failing models sit out a cooldown.
+
+    `call(model)` must return an iterable of text chunks, e.g.
+    `lambda model: chain_for(model).stream(inputs)`; it runs on a dispatcher
+    thread under that model's concurrency limit.
+    """
+
+    def __init__(self, ewma_alpha: float = 0.2, min_samples: int = 20, default_hedge_delay: float = 8.0, min_hedge_delay: float = 1.0, max_hedge_delay: float = 30.0, failure_threshold: int = 3, cooldown_seconds: float = 60.0):
+        self.ewma_alpha = ewma_alpha
+        self.min_samples = min_samples
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._models: Dict[str, ModelLatency] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, model: str) -> ModelLatency:
+        state = self._models.get(model)
+        if state is None:
+            state = self._models[model] = ModelLatency()
+        return state
+
+    def candidates(self, task: str, prefer: Optional[str] = None) -> List[str]:
+        """Configured order, with models in failure cooldown moved to the back"""
+        models = task_models(task)
+        if prefer:
+            models = [prefer] + [model for model in models if model != prefer]
+        now = time.monotonic()
+        with self._lock:
+            return sorted(models, key=lambda model: self._state(model).cooldown_until > now)
+
+    def hedge_delay(self, model: str) -> float:
+        """How long the primary gets before a hedged request: its p95 latency, clamped"""
+        with self._lock:
+            samples = list(self._state(model).latencies)
+        if len(samples) < self.min_samples:
+            return self.default_hedge_delay
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, percentile(samples, 0.95)))
+
+    def _fastest(self, models: List[str]) -> str:
+        """Alternate with the lowest TTFT EWMA; untried models keep their configured order"""
+        with self._lock:
+            ranked = [(self._state(model).ttft_ewma is None, self._state(model).ttft_ewma or 0.0, index) for index, model in enumerate(models)]
+        return models[min(ranked)[2]]
+
+    def _record(self, model: str, metric: str, ttft: Optional[float] = None, latency: Optional[float] = None):
+        with self._lock:
+            state = self._state(model)
+            state.metrics[metric] += 1
+            if ttft is not None:
+                state.ttft_ewma = ttft if state.ttft_ewma is None else self.ewma_alpha * ttft + (1 - self.ewma_alpha) * state.ttft_ewma
+            if latency is not None:
+                state.latencies.append(latency)
+            if metric == "successes":
+                state.consecutive_failures = 0
+            elif metric == "failures":
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= self.failure_threshold:
+                    state.cooldown_until = time.monotonic() + self.cooldown_seconds
+
+    def _consume(self, model: str, call: Callable[[str], Iterable[str]], cancelled: threading.Event) -> Optional[str]:
+        """Read one model's stream on a dispatcher thread, timing the first token"""
+        started = time.perf_counter()
+        ttft = None
+        chunks = []
+        try:
+            for chunk in call(model):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                if cancelled.is_set():
+                    # The other request already answered; stop paying for this one
+                    self._record(model, "cancelled", ttft=ttft)
+                    return None
+                chunks.append(chunk)
+        except Exception:
+            if not cancelled.is_set():
+                self._record(model, "failures")
+            raise
+        latency = time.perf_counter() - started
+        self._record(model, "successes", ttft=ttft if ttft is not None else latency, latency=latency)
+        return "".join(chunks)
+
+    async def ainvoke(self, task: str, call: Callable[[str], Iterable[str]], priority: int = PRIORITY_INTERACTIVE, prefer: Optional[str] = None) -> str:
+        """Run `call` on the task's primary model, hedging or falling back to alternates"""
+        models = self.candidates(task, prefer)
+        if not models:
+            raise ValueError(f"No models configured for task {task}")
+        primary, remaining = models[0], models[1:]
+        cancelled = threading.Event()
+        attempts: Dict[asyncio.Task, str] = {}
+
+        def launch(model: str):
+            with self._lock:
+                self._state(model).metrics["requests"] += 1
+            attempt = asyncio.ensure_future(llm_dispatcher.acall(model, lambda: self._consume(model, call, cancelled), priority))
+            attempts[attempt] = model
+
+        launch(primary)
+        hedge_at = time.monotonic() + self.hedge_delay(primary)
+        hedged = False
+        last_error: Optional[BaseException] = None
+        try:
+            while attempts:
+                timeout = None if hedged or not remaining else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(list(attempts), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slower than its usual p95: race the fastest alternate
+                    alternate = self._fastest(remaining)
+                    remaining.remove(alternate)
+                    with self._lock:
+                        self._state(alternate).metrics["hedges"] += 1
+                    launch(alternate)
+                    hedged = True
+                    continue
+                for finished in done:
+                    model = attempts.pop(finished)
+                    if finished.exception() is None:
+                        if model != primary and hedged:
+                            with self._lock:
+                                self._state(model).metrics["hedge_wins"] += 1
+                        return finished.result()
+                    last_error = finished.exception()
+                    if isinstance(last_error, LLMOverloadedError):
+                        print(f"{model} shed for {task}: {last_error}")
+                    else:
+                        print(f"{model} failed for {task}: {last_error}")
+                if not attempts and remaining:
+                    # Nothing left in flight: fall back to the next candidate right away
+                    fallback = remaining.pop(0)
+                    launch(fallback)
+                    hedge_at = time.monotonic() + self.hedge_delay(fallback)
+            raise last_error
+        finally:
+            cancelled.set()
+            for pending in attempts:
+                pending.cancel()
+
+    def invoke(self, task: str, call: Callable[[str], Iterable[str]], priority: int = PRIORITY_INTERACTIVE, prefer: Optional[str] = None) -> str:
+        """Blocking ainvoke for worker threads that have no event loop"""
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.ainvoke(task, call, priority, prefer))
+        finally:
+            # Let cancelled attempts leave the dispatcher queue, but unlike asyncio.run
+            # do not wait for a losing stream's thread to finish
+            pending = asyncio.all_tasks(loop)
+            for attempt in pending:
+                attempt.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {model: (state.ttft_ewma, list(state.latencies), dict(state.metrics), state.cooldown_until) for model, state in self._models.items()}
+        now = time.monotonic()
+        models = {}
+        for model, (ttft_ewma, latencies, metrics, cooldown_until) in snapshot.items():
+            models[model] = {
+                **metrics,
+                "ttft_ewma": ttft_ewma,
+                "latency_p50": percentile(latencies, 0.5),
+                "latency_p95": percentile(latencies, 0.95),
+                "latency_p99": percentile(latencies, 0.99),
+                "hedge_delay": self.hedge_delay(model),
+                "cooling_down": cooldown_until > now,
+            }
+        return {
+            "tasks": {task: task_models(task) for task in DEFAULT_TASK_MODELS},
+            "models": models,
+        }
+
+# Global router used by the chat and disease chains
+model_router = ModelRouter(
+    default_hedge_delay=float(os.getenv("MODEL_HEDGE_DEFAULT_DELAY_SECONDS", "8")),
+    min_hedge_delay=float(os.getenv("MODEL_HEDGE_MIN_DELAY_SECONDS", "1")),
+    max_hedge_delay=float(os.getenv("MODEL_HEDGE_MAX_DELAY_SECONDS", "30")),
+    cooldown_seconds=float(os.getenv("MODEL_FAILURE_COOLDOWN_SECONDS", "60"))
+)
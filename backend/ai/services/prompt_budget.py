@@ -0,0 +1,217 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+
+# Words, numbers and single punctuation/symbols; close enough to BPE counts for budgeting
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+CHARS_PER_WORD_TOKEN = 4
+TRUNCATION_MARKER = " …"
+
+# Per-section token budgets shared by every prompt template
+SECTION_BUDGETS = {
+    "context": int(os.getenv("PROMPT_BUDGET_CONTEXT", "600")),
+    "history": int(os.getenv("PROMPT_BUDGET_HISTORY", "800")),
+    "history_summary": int(os.getenv("PROMPT_BUDGET_HISTORY_SUMMARY", "150")),
+    "market_data": int(os.getenv("PROMPT_BUDGET_MARKET_DATA", "500")),
+    "user_message": int(os.getenv("PROMPT_BUDGET_USER_MESSAGE", "300")),
+}
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "2000"))
+# Newest chat turns read per prompt; well past what the history and summary budgets can hold
+HISTORY_MAX_TURNS = int(os.getenv("PROMPT_HISTORY_MAX_TURNS", "50"))
+
+def _token_cost(piece: str) -> int:
+    # Long words split into several BPE tokens; symbols and punctuation are one each
+    return max(1, math.ceil(len(piece) / CHARS_PER_WORD_TOKEN)) if piece[0].isalnum() or piece[0] == "_" else 1
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of text using a local regex tokenizer"""
+    if not text:
+        return 0
+    return sum(_token_cost(piece) for piece in TOKEN_PATTERN.findall(text))
+
+def truncate_to_tokens(text: str, budget: int, keep: str = "head") -> str:
+    """Clip text to `budget` tokens on line boundaries, cutting the boundary line at a word.
+
+    keep="head" keeps the start (context blocks list the most important lines
+    first); keep="tail" keeps the end (the latest part of a long message).
+    """
+    if count_tokens(text) <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    budget -= count_tokens(TRUNCATION_MARKER)
+    lines = text.split("\n")
+    if keep == "tail":
+        lines.reverse()
+    kept = []
+    used = 0
+    for line in lines:
+        cost = count_tokens(line)
+        if used + cost <= budget:
+            kept.append(line)
+            used += cost
+            continue
+        words = line.split(" ")
+        if keep == "tail":
+            words.reverse()
+        partial = []
+        for word in words:
+            cost = count_tokens(word)
+            if used + cost > budget:
+                break
+            partial.append(word)
+            used += cost
+        if partial:
+            if keep == "tail":
+                partial.reverse()
+            kept.append(" ".join(partial))
+        break
+    if keep == "tail":
+        kept.reverse()
+        return TRUNCATION_MARKER.strip() + " " + "\n".join(kept)
+    return "\n".join(kept) + TRUNCATION_MARKER
+
+def fit_messages(messages: list, budget: int) -> Tuple[list, list]:
+    """Split chat history into (older messages to summarize, newest messages that fit the budget)"""
+    kept = []
+    used = 0
+    for index in range(len(messages) - 1, -1, -1):
+        cost = count_tokens(messages[index].content)
+        if used + cost > budget:
+            return list(messages[:index + 1]), kept
+        kept.insert(0, messages[index])
+        used += cost
+    return [], kept
+
+def summarize_messages(messages: list, budget: int, words_per_message: int = 12) -> str:
+    """Deterministic digest of older turns: the opening words of each, newest last"""
+    if not messages:
+        return "No earlier conversation."
+    lines = []
+    for message in messages:
+        words = message.content.split()
+        snippet = " ".join(words[:words_per_message]) + (" …" if len(words) > words_per_message else "")
+        lines.append(f"{message.type}: {snippet}")
+    digest = f"{len(messages)} earlier messages, oldest first:\n" + "\n".join(lines)
+    # The most recent of the older turns matter most, so clip from the front
+    return truncate_to_tokens(digest, budget, keep="tail")
+
+class PromptSection:
+    """One variable part of a prompt with its own token budget.
+
+    Lower `priority` is more important (like dispatcher priorities): when the
+    whole prompt is over its limit, the highest-priority-number sections are
+    clipped first.
+    """
+
+    def __init__(self, name: str, text: str, budget: int, priority: int = 0, keep: str = "head"):
+        self.name = name
+        self.text = text or ""
+        self.budget = budget
+        self.priority = priority
+        self.keep = keep
+
+class PromptAssembler:
+    """Fits prompt sections into per-section and whole-prompt token budgets.
+
+    Results are cached per (template, section inputs) hash, so the same crop
+    context or market snapshot is tokenized and clipped once. Per-template
+    counters show how many tokens prompts use and how often sections had to be
+    clipped.
+    """
+
+    def __init__(self, max_tokens: int = 2000, max_entries: int = 500):
+        self.max_tokens = max_tokens
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[Dict[str, str], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"assembled": 0, "cache_hits": 0, "truncated_sections": 0}
+        self._templates: Dict[str, dict] = {}
+
+    def _key(self, template_name: str, template: str, sections: List[PromptSection], max_tokens: int) -> str:
+        payload = json.dumps(
+            [template_name, template, max_tokens, [(s.name, s.text, s.budget, s.priority, s.keep) for s in sections]],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def fit(self, template_name: str, template: str, sections: List[PromptSection], max_tokens: Optional[int] = None) -> Dict[str, str]:
+        """Section texts clipped to their budgets and to the prompt's overall limit"""
+        max_tokens = max_tokens or self.max_tokens
+        key = self._key(template_name, template, sections, max_tokens)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.metrics["cache_hits"] += 1
+                self._count(template_name, cached[1], 0)
+                return dict(cached[0])
+
+        fitted = {}
+        costs = {}
+        truncated = 0
+        for section in sections:
+            text = truncate_to_tokens(section.text, section.budget, section.keep)
+            truncated += text != section.text
+            fitted[section.name] = text
+            costs[section.name] = count_tokens(text)
+
+        # Placeholders are replaced, so only the template's literal text counts
+        template_cost = count_tokens(re.sub(r"\{\w+\}", "", template))
+        overflow = template_cost + sum(costs.values()) - max_tokens
+        for section in sorted(sections, key=lambda s: s.priority, reverse=True):
+            if overflow <= 0:
+                break
+            allowed = max(0, costs[section.name] - overflow)
+            text = truncate_to_tokens(fitted[section.name], allowed, section.keep)
+            truncated += text != fitted[section.name]
+            overflow -= costs[section.name] - count_tokens(text)
+            fitted[section.name] = text
+            costs[section.name] = count_tokens(text)
+
+        total = template_cost + sum(costs.values())
+        with self._lock:
+            self._cache[key] = (fitted, total)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self.metrics["assembled"] += 1
+            self.metrics["truncated_sections"] += truncated
+            self._count(template_name, total, truncated)
+        return dict(fitted)
+
+    def render(self, template_name: str, template: str, sections: List[PromptSection], max_tokens: Optional[int] = None, **values) -> str:
+        """Fit the sections and format them (plus any fixed values) into a str.format template"""
+        return template.format(**values, **self.fit(template_name, template, sections, max_tokens))
+
+    def _count(self, template_name: str, tokens: int, truncated: int):
+        stats = self._templates.setdefault(template_name, {"prompts": 0, "tokens": 0, "max_tokens_seen": 0, "truncated_sections": 0})
+        stats["prompts"] += 1
+        stats["tokens"] += tokens
+        stats["max_tokens_seen"] = max(stats["max_tokens_seen"], tokens)
+        stats["truncated_sections"] += truncated
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+            templates = {name: dict(stats) for name, stats in self._templates.items()}
+            size = len(self._cache)
+        for stats in templates.values():
+            stats["avg_tokens"] = stats["tokens"] / stats["prompts"] if stats["prompts"] else 0.0
+        return {
+            **metrics,
+            "cache_size": size,
+            "max_tokens": self.max_tokens,
+            "section_budgets": SECTION_BUDGETS,
+            "templates": templates,
+        }
+
+# Global assembler used by the chat chains and market summaries
+prompt_assembler = PromptAssembler(
+    max_tokens=PROMPT_MAX_TOKENS,
+    max_entries=int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "500"))
+)
@@ -0,0 +1,150 @@
+from typing import Optional
+from sqlalchemy import select, delete, text
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+from models import User, Crop, Conversation, Message, CropCost, DiseaseDetection, DiseaseChatHistory, WeatherAlert, ActivityLog, CropConversation
+import os
+import threading
+import time
+
+# Key for the advisory lock that keeps one purge running across app workers
+PURGE_LOCK_KEY = 7204114
+
+# Tables hanging directly off a crop, removed before the crop row itself
+CROP_CHILDREN = (CropConversation, ActivityLog, WeatherAlert, CropCost, DiseaseDetection)
+
+class PurgeWorker:
+    """Removes tombstoned crops and accounts in the background, in bounded batches.
+
+    Delete endpoints only set `deleted_at` (the API stops showing the row at
+    once) and wake this worker. Children are deleted `batch_size` rows per
+    statement, each batch its own short transaction with a pause in between,
+    so a crop or account with years of history never holds locks for long or
+    stalls other writes. The parent row goes last; ON DELETE CASCADE covers
+    anything written in the meantime. Tombstones live in the database, so a
+    purge interrupted by a restart resumes on the next poll.
+    """
+
+    def __init__(self, batch_size: int = 1000, batch_pause_seconds: float = 0.05, poll_seconds: float = 60.0):
+        self.batch_size = batch_size
+        self.batch_pause_seconds = batch_pause_seconds
+        self.poll_seconds = poll_seconds
+        self._worker: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.metrics = {"crops_purged": 0, "users_purged": 0, "rows_deleted": 0, "batches": 0, "failures": 0, "last_purge_seconds": 0.0}
+
+    def start(self):
+        """Start the worker thread (idempotent); it purges anything left over from before a restart"""
+        if self._worker and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name="purge-worker", daemon=True)
+        self._worker.start()
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop after the current batch; unfinished purges resume on the next start"""
+        self._stopping.set()
+        self._wake.set()
+        if self._worker:
+            self._worker.join(timeout)
+
+    def wake(self):
+        """Purge now instead of at the next poll (called after a tombstone is committed)"""
+        self._wake.set()
+
+    def _count(self, metric: str, amount=1):
+        with self._lock:
+            self.metrics[metric] += amount
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            try:
+                self.purge_pending()
+            except Exception as e:
+                self._count("failures")
+                print(f"Purge failed: {e}")
+
+    def purge_pending(self) -> int:
+        """Purge every tombstoned account and crop; returns how many were removed"""
+        purged = 0
+        with engine.connect() as lock:
+            if not lock.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": PURGE_LOCK_KEY}):
+                return 0
+            try:
+                with SessionLocal() as db:
+                    while not self._stopping.is_set():
+                        user_id = db.scalar(select(User.id).where(User.deleted_at.isnot(None)).order_by(User.deleted_at).limit(1))
+                        crop_id = None if user_id else db.scalar(select(Crop.id).where(Crop.deleted_at.isnot(None)).order_by(Crop.deleted_at).limit(1))
+                        db.commit()
+                        if user_id is None and crop_id is None:
+                            break
+                        started = time.perf_counter()
+                        if user_id:
+                            self.purge_user(db, user_id)
+                        else:
+                            self.purge_crop(db, crop_id)
+                        with self._lock:
+                            self.metrics["last_purge_seconds"] = round(time.perf_counter() - started, 3)
+                        purged += 1
+            finally:
+                lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PURGE_LOCK_KEY})
+                lock.commit()
+        return purged
+
+    def _delete_in_batches(self, db: Session, model, condition) -> None:
+        """Delete matching rows `batch_size` at a time, committing each batch"""
+        while not self._stopping.is_set():
+            batch = select(model.id).where(condition).limit(self.batch_size).scalar_subquery()
+            deleted = db.execute(delete(model).where(model.id.in_(batch))).rowcount
+            db.commit()
+            self._count("batches")
+            self._count("rows_deleted", deleted)
+            if deleted < self.batch_size:
+                return
+            time.sleep(self.batch_pause_seconds)
+
+    def purge_crop(self, db: Session, crop_id: int) -> None:
+        detections = select(DiseaseDetection.id).where(DiseaseDetection.crop_id == crop_id)
+        self._delete_in_batches(db, DiseaseChatHistory, DiseaseChatHistory.detection_id.in_(detections))
+        for model in CROP_CHILDREN:
+            self._delete_in_batches(db, model, model.crop_id == crop_id)
+        if self._stopping.is_set():
+            return
+        db.execute(delete(Crop).where(Crop.id == crop_id))
+        db.commit()
+        self._count("crops_purged")
+        print(f"Purged crop {crop_id}")
+
+    def purge_user(self, db: Session, user_id) -> None:
+        for crop_id in db.scalars(select(Crop.id).where(Crop.user_id == user_id)).all():
+            self.purge_crop(db, crop_id)
+        conversations = select(Conversation.id).where(Conversation.user_id == user_id)
+        self._delete_in_batches(db, Message, Message.conversation_id.in_(conversations))
+        self._delete_in_batches(db, Conversation, Conversation.user_id == user_id)
+        if self._stopping.is_set():
+            return
+        db.execute(delete(User).where(User.id == user_id))
+        db.commit()
+        self._count("users_purged")
+        print(f"Purged account {user_id}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+        return {
+            **metrics,
+            "running": bool(self._worker and self._worker.is_alive()),
+            "batch_size": self.batch_size,
+        }
+
+# Global worker instance, started with the app
+purge_worker = PurgeWorker(
+    batch_size=int(os.getenv("PURGE_BATCH_SIZE", "1000")),
+    batch_pause_seconds=float(os.getenv("PURGE_BATCH_PAUSE_SECONDS", "0.05")),
+    poll_seconds=float(os.getenv("PURGE_POLL_SECONDS", "60"))
+)
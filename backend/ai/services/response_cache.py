@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from .embeddings import EmbeddingProvider, embedding_provider
+import numpy as np
+import os
+import re
+import threading
+import time
+
+Scope = Tuple[str, str]
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace for exact matching"""
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+class CacheEntry:
+    def __init__(self, scope: Scope, question: str, response: str, embedding: Optional[np.ndarray]):
+        self.scope = scope
+        self.question = question
+        self.response = response
+        self.embedding = embedding
+        self.created_at = time.monotonic()
+
+class SemanticResponseCache:
+    """LRU + TTL cache of AI answers, matched exactly or by embedding similarity.
+
+    Entries are scoped (crop, region) so advice for one crop or state is never
+    served for another. Lookups try the normalized question first and only embed
+    the question when that misses.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, ttl_seconds: int = 86400, max_entries: int = 5000, similarity_threshold: float = 0.92):
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple[Scope, str], CacheEntry]" = OrderedDict()
+        self._scopes: Dict[Scope, Set[Tuple[Scope, str]]] = {}
+        self._matrices: Dict[Scope, Tuple[List[Tuple[Scope, str]], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.metrics = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+
+    def _remove(self, key: Tuple[Scope, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._scopes.get(entry.scope, set()).discard(key)
+            self._matrices.pop(entry.scope, None)
+
+    def _expired(self, entry: CacheEntry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _scope_matrix(self, scope: Scope) -> Tuple[List[Tuple[Scope, str]], Optional[np.ndarray]]:
+        """Stacked unit vectors for a scope, rebuilt only after the scope changes"""
+        if scope not in self._matrices:
+            keys = [key for key in self._scopes.get(scope, ()) if self._entries[key].embedding is not None]
+            matrix = np.stack([self._entries[key].embedding for key in keys]) if keys else None
+            self._matrices[scope] = (keys, matrix)
+        return self._matrices[scope]
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(self.provider.embed(question), dtype=np.float32)
+        except Exception as e:
+            print(f"Response cache embedding failed: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(self, question: str, scope: Scope) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Return (cached response or None, question embedding to reuse on store)"""
+        key = (scope, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry):
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self.metrics["exact_hits"] += 1
+                    return entry.response, None
+
+        embedding = self._embed(question)
+        if embedding is None:
+            with self._lock:
+                self.metrics["misses"] += 1
+            return None, None
+
+        with self._lock:
+            keys, matrix = self._scope_matrix(scope)
+            if matrix is not None:
+                similarities = matrix @ embedding
+                best = int(np.argmax(similarities))
+                best_key = keys[best]
+                entry = self._entries.get(best_key)
+                if entry is not None and similarities[best] >= self.similarity_threshold:
+                    if self._expired(entry):
+                        self._remove(best_key)
+                    else:
+                        self._entries.move_to_end(best_key)
+                        self.metrics["semantic_hits"] += 1
+                        return entry.response, embedding
+            self.metrics["misses"] += 1
+        return None, embedding
+
+    def store(self, question: str, scope: Scope, response: str, embedding: Optional[np.ndarray] = None):
+        """Cache a fresh model answer, evicting least recently used entries past max_entries"""
+        key = (scope, normalize_question(question))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = CacheEntry(scope, question, response, embedding)
+            self._scopes.setdefault(scope, set()).add(key)
+            self._matrices.pop(scope, None)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.metrics["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+            size = len(self._entries)
+        hits = metrics["exact_hits"] + metrics["semantic_hits"]
+        lookups = hits + metrics["misses"]
+        return {
+            **metrics,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+        }
+
+# Global cache for /api/chat/general answers
+general_chat_cache = SemanticResponseCache(
+    embedding_provider,
+    ttl_seconds=int(os.getenv("CHAT_CACHE_TTL_SECONDS", "86400")),
+    max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "5000")),
+    similarity_threshold=float(os.getenv("CHAT_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+)
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+from models import User
+import json
+import os
+import threading
+import time
+import redis.asyncio as aioredis
+
+# Columns kept for the authenticated principal; the password hash never leaves the database
+PRINCIPAL_COLUMNS = [column.key for column in User.__table__.columns if column.key != "hashed_password"]
+
+class PrincipalCache:
+    """Authenticated users by token subject (email), so a request does not look its user up again.
+
+    A deleted account frees its email for a new one, so an entry only answers
+    for the user id the token names; another id is a miss and gets reloaded.
+
+    An in-process LRU with a short TTL answers most requests; with Redis
+    enabled, other app workers share a longer-lived second tier. Profile
+    updates and account deletion invalidate both tiers, so only other
+    workers' LRU entries can stay stale, for at most `ttl_seconds`; admin
+    flag changes made directly in the database take effect the same way.
+
+    Entries hold column values, not ORM instances: `get` builds a fresh
+    detached User per request, so handlers that write the user must load it
+    into their own session first.
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_entries: int = 10000, redis_url: Optional[str] = None, redis_ttl_seconds: int = 300):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self._redis = aioredis.from_url(redis_url, socket_timeout=0.2, socket_connect_timeout=0.2) if redis_url else None
+        # After a Redis error the shared tier is skipped until this time
+        self._redis_retry_at = 0.0
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "redis_errors": 0}
+
+    def _count(self, metric: str):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    @staticmethod
+    def _key(subject: str) -> str:
+        return f"auth:principal:{subject}"
+
+    async def get(self, subject: str, user_id: UUID) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry and time.monotonic() - entry[0] <= self.ttl_seconds and entry[1]["id"] == user_id:
+                self._entries.move_to_end(subject)
+                self.metrics["hits"] += 1
+                return User(**entry[1])
+            self._entries.pop(subject, None)
+        values = await self._redis_call("get", self._key(subject))
+        if values:
+            values = self._decode(values)
+            if values["id"] == user_id:
+                self._store(subject, values, self.generation(subject))
+                self._count("redis_hits")
+                return User(**values)
+        self._count("misses")
+        return None
+
+    def generation(self, subject: str) -> int:
+        """Write generation for a subject, captured before loading the user from the database"""
+        with self._lock:
+            return self._generations.get(subject, 0)
+
+    async def set(self, subject: str, user: User, generation: int) -> None:
+        """Cache a freshly loaded user unless it was invalidated while loading"""
+        values = {key: getattr(user, key) for key in PRINCIPAL_COLUMNS}
+        if self._store(subject, values, generation):
+            await self._redis_call("set", self._key(subject), self._encode(values), ex=self.redis_ttl_seconds)
+
+    async def invalidate(self, subject: Optional[str]) -> None:
+        """Drop a user after a write to their row; call after the commit"""
+        if not subject:
+            return
+        with self._lock:
+            self._entries.pop(subject, None)
+            self._generations[subject] = self._generations.get(subject, 0) + 1
+            self.metrics["invalidations"] += 1
+        await self._redis_call("delete", self._key(subject))
+
+    def _store(self, subject: str, values: dict, generation: int) -> bool:
+        with self._lock:
+            if self._generations.get(subject, 0) != generation:
+                return False
+            self._entries[subject] = (time.monotonic(), values)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    async def _redis_call(self, method: str, *args, **kwargs):
+        if self._redis is None or time.monotonic() < self._redis_retry_at:
+            return None
+        try:
+            return await getattr(self._redis, method)(*args, **kwargs)
+        except Exception as e:
+            # Authentication falls back to the LRU and the database while Redis is unreachable
+            self._redis_retry_at = time.monotonic() + 30
+            self._count("redis_errors")
+            print(f"Auth cache Redis error: {e}")
+            return None
+
+    @staticmethod
+    def _encode(values: dict) -> str:
+        return json.dumps({key: value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, UUID) else value for key, value in values.items()})
+
+    @staticmethod
+    def _decode(payload) -> dict:
+        values = json.loads(payload)
+        values["id"] = UUID(values["id"])
+        for key in ("created_at", "deleted_at"):
+            if values.get(key):
+                values[key] = datetime.fromisoformat(values[key])
+        return values
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+            size = len(self._entries)
+        lookups = metrics["hits"] + metrics["redis_hits"] + metrics["misses"]
+        return {
+            **metrics,
+            "entries": size,
+            "hit_rate": round((metrics["hits"] + metrics["redis_hits"]) / lookups, 3) if lookups else None,
+            "ttl_seconds": self.ttl_seconds,
+            "redis": self._redis is not None,
+        }
+
+# Global cache shared by every request; Redis tier opt-in with AUTH_CACHE_REDIS=true
+principal_cache = PrincipalCache(
+    ttl_seconds=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30")),
+    max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000")),
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379") if os.getenv("AUTH_CACHE_REDIS", "false").lower() == "true" else None,
+    redis_ttl_seconds=int(os.getenv("AUTH_CACHE_REDIS_TTL_SECONDS", "300"))
+)
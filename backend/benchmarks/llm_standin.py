@@ -0,0 +1,306 @@
+"""
+Local OpenAI-compatible stand-in for OpenRouter.
+
+Serves /v1/chat/completions (plain and streamed), /v1/embeddings and /v1/models
+with configurable latency distributions and injected failures, so the chat,
+disease and market AI paths can be benchmarked and load-tested offline and
+reproducibly. Point the backend at it with OPENROUTER_BASE_URL:
+
+    python -m benchmarks.llm_standin --port 8100 --ttft lognormal:0.8,0.6 \\
+        --model-ttft meta-llama/llama-4-maverick:free=lognormal:3,1 --error-rate 0.02
+    OPENROUTER_BASE_URL=http://127.0.0.1:8100/v1 uvicorn main:app
+
+Record real traffic once, then replay it without network access:
+
+    python -m benchmarks.llm_standin --mode record --cassette ai.jsonl   # forwards to OpenRouter
+    python -m benchmarks.llm_standin --mode replay --cassette ai.jsonl --replay-timing recorded
+
+Latency specs: fixed:S, uniform:A,B, normal:MEAN,SD, lognormal:MEDIAN,SIGMA (seconds).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from ai.services.embeddings import LocalHashEmbeddingProvider
+
+Distribution = Callable[[random.Random], float]
+
+FARM_WORDS = (
+    "water soil crop leaves roots yield market price irrigation mulch compost nitrogen "
+    "potassium spray fungicide rotation harvest seedlings drainage weeds pests neem "
+    "organic moisture sunlight spacing pruning variety season rainfall storage quintal"
+).split()
+
+DISEASES = [
+    ("Early Blight", "fungal spores on wet leaves", "Moderate"),
+    ("Powdery Mildew", "humid nights and crowded plants", "Low"),
+    ("Bacterial Leaf Spot", "splashing water spreading bacteria", "Moderate"),
+    ("Late Blight", "cool wet weather and fungus", "High"),
+    ("Healthy Plant", "no visible infection", "None"),
+]
+
+def parse_distribution(spec: str) -> Distribution:
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        # Parameterised by the median, which is easier to read off a latency dashboard
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise argparse.ArgumentTypeError(f"Unknown latency distribution: {spec}")
+
+def parse_model_distribution(value: str):
+    model, _, spec = value.rpartition("=")
+    if not model:
+        raise argparse.ArgumentTypeError(f"Expected MODEL=SPEC, got {value}")
+    return model, parse_distribution(spec)
+
+def request_key(body: dict) -> str:
+    """Identity of a completion request for record/replay"""
+    relevant = {field: body.get(field) for field in ("model", "messages", "max_tokens", "temperature")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+def has_image(messages: List[dict]) -> bool:
+    return any(
+        isinstance(message.get("content"), list) and any(part.get("type") == "image_url" for part in message["content"])
+        for message in messages
+    )
+
+def synthetic_reply(body: dict, rng: random.Random) -> str:
+    """Plausible output: disease JSON for vision prompts, farming prose otherwise"""
+    if has_image(body.get("messages", [])):
+        disease, cause, severity = rng.choice(DISEASES)
+        return json.dumps({
+            "disease": disease,
+            "cause": cause,
+            "confidence": rng.randint(60, 95),
+            "severity": severity,
+            "precautions": ["Water at soil level", "Improve air circulation"],
+            "treatment": ["Remove affected leaves", "Apply copper spray"] if severity != "None" else [],
+        })
+    length = min(body.get("max_tokens") or 200, rng.randint(40, 160))
+    words = [rng.choice(FARM_WORDS) for _ in range(length)]
+    sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+    return " ".join(sentences)
+
+def split_tokens(text: str) -> List[str]:
+    """Roughly token-sized pieces that join back into the original text"""
+    pieces, current = [], ""
+    for char in text:
+        current += char
+        if char == " " or len(current) >= 6:
+            pieces.append(current)
+            current = ""
+    if current:
+        pieces.append(current)
+    return pieces or [""]
+
+class Cassette:
+    """JSONL of recorded request/response pairs; repeated requests replay in order"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, List[dict]] = {}
+        self.positions: Counter = Counter()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records.setdefault(record["key"], []).append(record)
+
+    def next(self, key: str) -> Optional[dict]:
+        with self._lock:
+            records = self.records.get(key)
+            if not records:
+                return None
+            record = records[self.positions[key] % len(records)]
+            self.positions[key] += 1
+            return record
+
+    def append(self, record: dict):
+        with self._lock:
+            self.records.setdefault(record["key"], []).append(record)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="LLM stand-in")
+    model_ttft = dict(args.model_ttft or [])
+    cassette = Cassette(args.cassette) if args.mode in ("record", "replay") else None
+    embedder = LocalHashEmbeddingProvider()
+    occurrences: Counter = Counter()
+    stats = Counter()
+
+    def rng_for(key: str) -> random.Random:
+        # Same seed + same request sequence -> same latencies, errors and text
+        occurrences[key] += 1
+        return random.Random(f"{args.seed}:{key}:{occurrences[key]}")
+
+    def error_response(status: int, message: str) -> JSONResponse:
+        stats[f"errors_{status}"] += 1
+        return JSONResponse(status_code=status, content={"error": {"message": message, "code": status}})
+
+    async def record_upstream(request: Request, body: dict, key: str) -> Optional[dict]:
+        headers = {"Authorization": request.headers.get("authorization") or f"Bearer {os.getenv('OPENROUTER_API_KEY', '')}"}
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=args.upstream_timeout) as client:
+            response = await client.post(f"{args.upstream.rstrip('/')}/chat/completions", json={**body, "stream": False}, headers=headers)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        record = {
+            "key": key,
+            "model": body.get("model"),
+            "request": body,
+            "content": data["choices"][0]["message"]["content"],
+            "usage": data.get("usage"),
+            "latency": time.perf_counter() - started,
+        }
+        cassette.append(record)
+        stats["recorded"] += 1
+        return record
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "standin")
+        key = request_key(body)
+        rng = rng_for(key)
+        stats["requests"] += 1
+
+        ttft = model_ttft.get(model, args.ttft)(rng)
+        token_interval = args.token_interval
+        content = None
+
+        if args.mode == "record":
+            record = await record_upstream(request, body, key)
+            if record is None:
+                return error_response(502, "Upstream request failed")
+            content, ttft, token_interval = record["content"], 0.0, lambda rng: 0.0
+        elif args.mode == "replay":
+            record = cassette.next(key)
+            if record is not None:
+                stats["replayed"] += 1
+                content = record["content"]
+                if args.replay_timing == "recorded":
+                    ttft, token_interval = record["latency"], lambda rng: 0.0
+            elif args.replay_miss == "error":
+                return error_response(404, f"No recording for request {key[:12]}")
+            else:
+                stats["replay_misses"] += 1
+
+        if args.mode != "record":
+            if rng.random() < args.error_rate:
+                await asyncio.sleep(ttft * 0.1)
+                return error_response(rng.choice(args.error_status), "Injected upstream error")
+            if rng.random() < args.stall_rate:
+                stats["stalls"] += 1
+                ttft += args.stall_seconds
+
+        if content is None:
+            content = synthetic_reply(body, rng)
+        tokens = split_tokens(content)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        usage = {"prompt_tokens": len(json.dumps(body.get("messages", []))) // 4, "completion_tokens": len(tokens), "total_tokens": 0}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        intervals = [token_interval(rng) for _ in tokens]
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + sum(intervals))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def stream():
+            def chunk(delta: dict, finish_reason=None) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+
+            await asyncio.sleep(ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            for token, interval in zip(tokens, intervals):
+                yield chunk({"content": token})
+                await asyncio.sleep(interval)
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        vectors = embedder.embed_batch(texts)
+        dimensions = body.get("dimensions")
+        stats["embedding_requests"] += 1
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": vector[:dimensions] if dimensions else vector} for i, vector in enumerate(vectors)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        names = sorted(set(model_ttft) | {"standin"})
+        return {"object": "list", "data": [{"id": name, "object": "model"} for name in names]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return dict(stats)
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--mode", choices=("synthetic", "record", "replay"), default="synthetic")
+    parser.add_argument("--cassette", default="llm_cassette.jsonl", help="JSONL file for record/replay")
+    parser.add_argument("--upstream", default=os.getenv("LLM_STANDIN_UPSTREAM", "https://openrouter.ai/api/v1"))
+    parser.add_argument("--upstream-timeout", type=float, default=120.0)
+    parser.add_argument("--ttft", type=parse_distribution, default=parse_distribution("lognormal:0.5,0.5"), help="time to first token")
+    parser.add_argument("--model-ttft", type=parse_model_distribution, action="append", help="per-model TTFT, MODEL=SPEC (repeatable)")
+    parser.add_argument("--token-interval", type=parse_distribution, default=parse_distribution("fixed:0.02"), help="delay between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with an error status")
+    parser.add_argument("--error-status", type=lambda value: [int(code) for code in value.split(",")], default=[429, 503])
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="fraction of requests that stall before the first token")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--replay-timing", choices=("synthetic", "recorded"), default="synthetic")
+    parser.add_argument("--replay-miss", choices=("synthetic", "error"), default="synthetic", help="answer for requests missing from the cassette")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Login throughput under a sign-in spike, and what it does to other requests.
+
+Registers --users accounts against a running backend, then keeps --concurrency
+logins in flight for --duration seconds while a probe polls /health. Reports
+logins per second, login latency percentiles, 401/503 counts and the /health
+latency, which shows whether password hashing is stalling the event loop.
+
+    uvicorn main:app --port 8000 &
+    python -m benchmarks.login_throughput --base-url http://127.0.0.1:8000 --users 20 --concurrency 32
+
+Compare PASSWORD_HASH_WORKERS and BCRYPT_ROUNDS settings by restarting the
+server between runs. Do not point this at a production deployment.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+import httpx
+from metrics import percentile
+
+PASSWORD = "bench-password"
+
+async def register_users(client: httpx.AsyncClient, users: int) -> list:
+    emails = [f"login-bench-{i}@example.com" for i in range(users)]
+    for email in emails:
+        response = await client.post("/api/auth/register", json={"email": email, "password": PASSWORD, "name": "Login Bench"})
+        if response.status_code not in (200, 400):  # 400: already registered by an earlier run
+            raise SystemExit(f"Registering {email} failed: {response.status_code} {response.text}")
+    return emails
+
+async def login_loop(client: httpx.AsyncClient, emails: list, worker: int, deadline: float, latencies: list, statuses: Counter):
+    i = worker
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post("/api/auth/login", json={"email": emails[i % len(emails)], "password": PASSWORD})
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - started)
+        i += 1
+
+async def probe_loop(client: httpx.AsyncClient, deadline: float, latencies: list, interval: float):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+async def run(base_url: str, users: int, concurrency: int, duration: float):
+    limits = httpx.Limits(max_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        emails = await register_users(client, users)
+        login_latencies, probe_latencies, statuses = [], [], Counter()
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            probe_loop(client, deadline, probe_latencies, 0.05),
+            *(login_loop(client, emails, worker, deadline, login_latencies, statuses) for worker in range(concurrency))
+        )
+        elapsed = time.perf_counter() - started
+
+    print(f"{concurrency} concurrent logins for {elapsed:.1f}s")
+    print(f"  logins/s        {len(login_latencies) / elapsed:8.1f}")
+    print(f"  login p50/p95   {percentile(login_latencies, 0.5) * 1000:8.0f} / {percentile(login_latencies, 0.95) * 1000:.0f} ms")
+    print(f"  /health p50/p95 {percentile(probe_latencies, 0.5) * 1000:8.0f} / {percentile(probe_latencies, 0.95) * 1000:.0f} ms")
+    print(f"  statuses        {dict(sorted(statuses.items()))}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.users, args.concurrency, args.duration))
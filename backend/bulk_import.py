@@ -0,0 +1,152 @@
+from datetime import datetime
+from io import StringIO
+from typing import BinaryIO, List
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from database import engine
+from models import Crop
+import numpy as np
+import pandas as pd
+import os
+
+# Uploads above this are rejected from Content-Length (see main.py)
+IMPORT_MAX_UPLOAD_BYTES = int(os.getenv("IMPORT_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "500000"))
+# Rows parsed, validated and copied per batch; bounds memory whatever the file size
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "20000"))
+# Validation errors reported before giving up on the file
+IMPORT_MAX_ERRORS = 50
+
+class CsvImport:
+    """All-or-nothing CSV import into a crop-scoped history table.
+
+    The upload is read `IMPORT_CHUNK_ROWS` rows at a time. Each chunk is
+    validated column-wise with pandas, its crop ids are checked against the
+    user's crops in one query (ids already seen are not queried again), and
+    it is COPYed into a temp staging table. One INSERT ... SELECT then moves
+    everything into the real table: a single statement, so the stats rollup
+    triggers fire once per import, and it joins crops again so a crop deleted
+    during the upload takes no rows. Any invalid row fails the whole import
+    with line numbers and nothing is written.
+    """
+
+    def __init__(self, table: str, required: List[str], text_columns: List[str], number_columns: List[str], time_column: str):
+        self.table = table
+        self.required = required
+        self.text_columns = text_columns
+        self.number_columns = number_columns
+        self.time_column = time_column
+        self.columns = ["crop_id"] + text_columns + number_columns + [time_column]
+
+    def run(self, file: BinaryIO, user_id) -> dict:
+        """Validate and load a CSV upload for `user_id`; blocking, call from a worker thread"""
+        errors = []
+        owned = set()
+        staged = 0
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TEMP TABLE import_staging ON COMMIT DROP AS SELECT {', '.join(self.columns)} FROM {self.table} WITH NO DATA"
+            ))
+            cursor = conn.connection.cursor()
+            try:
+                chunks = pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=IMPORT_CHUNK_ROWS, encoding="utf-8-sig", skipinitialspace=True)
+                for chunk in chunks:
+                    chunk.columns = [str(column).strip().lower() for column in chunk.columns]
+                    missing = [column for column in self.required if column not in chunk.columns]
+                    if missing:
+                        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(missing)}")
+                    if staged + len(chunk) > IMPORT_MAX_ROWS:
+                        raise HTTPException(status_code=413, detail=f"Imports are limited to {IMPORT_MAX_ROWS} rows")
+                    rows = self._validate(chunk, now, errors)
+                    self._check_ownership(conn, rows, user_id, owned, errors)
+                    if len(errors) >= IMPORT_MAX_ERRORS:
+                        break
+                    if errors:
+                        # Keep scanning so the response lists more than the first bad row, but copy nothing
+                        continue
+                    buffer = StringIO()
+                    rows.to_csv(buffer, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S.%f")
+                    buffer.seek(0)
+                    cursor.copy_expert(f"COPY import_staging ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+                    staged += len(rows)
+            except (pd.errors.ParserError, UnicodeDecodeError) as e:
+                raise HTTPException(status_code=400, detail=f"Unreadable CSV: {e}")
+            except pd.errors.EmptyDataError:
+                raise HTTPException(status_code=400, detail="CSV file is empty")
+            finally:
+                cursor.close()
+
+            if errors:
+                raise HTTPException(status_code=422, detail={"message": "No rows imported; fix these rows and upload again", "errors": [f"line {line}: {reason}" for line, reason in sorted(errors)]})
+            columns = ", ".join(f"s.{column}" for column in self.columns)
+            imported = conn.execute(text(
+                f"INSERT INTO {self.table} ({', '.join(self.columns)}) SELECT {columns} FROM import_staging s "
+                "JOIN crops c ON c.id = s.crop_id AND c.user_id = :user_id AND c.deleted_at IS NULL"
+            ), {"user_id": user_id}).rowcount
+            if imported != staged:
+                raise HTTPException(status_code=409, detail="A crop was deleted during the import; no rows imported")
+        return {"imported": imported, "crop_ids": sorted(owned)}
+
+    def _validate(self, chunk: pd.DataFrame, now: datetime, errors: list) -> pd.DataFrame:
+        """Typed copy of the chunk's columns; adds (line, reason) to `errors` for rows that do not convert"""
+        # Line 1 is the header, and chunk indexes continue across chunks
+        lines = chunk.index + 2
+        rows = pd.DataFrame(index=chunk.index)
+
+        def reject(mask, reason):
+            for line in lines[mask.to_numpy()][:IMPORT_MAX_ERRORS - len(errors)]:
+                errors.append((int(line), reason))
+
+        crop_id = pd.to_numeric(chunk["crop_id"], errors="coerce")
+        invalid = crop_id.isna() | (crop_id % 1 != 0) | (crop_id < 1) | (crop_id > 2 ** 31 - 1)
+        reject(invalid, "crop_id must be a whole number")
+        rows["crop_id"] = crop_id.where(~invalid, 0).astype("int64")
+
+        for column in self.text_columns:
+            values = chunk[column].str.strip() if column in chunk.columns else pd.Series("", index=chunk.index)
+            if column in self.required:
+                reject(values == "", f"{column} is required")
+            rows[column] = values.where(values != "")
+
+        for column in self.number_columns:
+            raw = chunk[column].str.strip() if column in chunk.columns else pd.Series("", index=chunk.index)
+            values = pd.to_numeric(raw.where(raw != ""), errors="coerce")
+            reject((raw != "") & (values.isna() | ~np.isfinite(values.fillna(0))), f"{column} must be a number")
+            if column in self.required:
+                reject(raw == "", f"{column} is required")
+            rows[column] = values
+
+        raw = chunk[self.time_column].str.strip() if self.time_column in chunk.columns else pd.Series("", index=chunk.index)
+        # Offsets are converted to UTC; naive values are taken as UTC already, like datetime.utcnow() defaults
+        times = pd.to_datetime(raw.where(raw != ""), errors="coerce", format="ISO8601", utc=True).dt.tz_localize(None)
+        reject((raw != "") & times.isna(), f"{self.time_column} must be an ISO date (YYYY-MM-DD)")
+        rows[self.time_column] = times.fillna(pd.Timestamp(now))
+        return rows
+
+    def _check_ownership(self, conn, rows: pd.DataFrame, user_id, owned: set, errors: list):
+        """One query per chunk for crop ids not seen yet; rows on other users' crops are errors"""
+        unseen = [int(crop_id) for crop_id in rows["crop_id"].unique() if crop_id not in owned and crop_id != 0]
+        if unseen:
+            owned.update(conn.scalars(select(Crop.id).where(Crop.id.in_(unseen), Crop.user_id == user_id, Crop.deleted_at.is_(None))))
+        foreign = ~rows["crop_id"].isin(owned) & (rows["crop_id"] != 0)
+        for line, crop_id in zip((rows.index + 2)[foreign.to_numpy()], rows["crop_id"][foreign]):
+            if len(errors) >= IMPORT_MAX_ERRORS:
+                break
+            errors.append((int(line), f"crop {crop_id} not found"))
+
+activity_log_import = CsvImport(
+    "activity_logs",
+    required=["crop_id", "activity_type"],
+    text_columns=["activity_type", "description", "unit", "notes"],
+    number_columns=["quantity"],
+    time_column="performed_at"
+)
+
+cost_import = CsvImport(
+    "crop_costs",
+    required=["crop_id", "expense_type", "amount"],
+    text_columns=["expense_type", "title", "description"],
+    number_columns=["amount"],
+    time_column="date"
+)
@@ -0,0 +1,85 @@
+from io import BytesIO
+from typing import Optional
+from PIL import Image
+import hashlib
+import os
+import re
+import tempfile
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "images"))
+THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "256"))
+
+EXTENSIONS = {"image/jpeg": "jpg", "image/webp": "webp"}
+IMAGE_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(jpg|webp)$")
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+class LocalImageStore:
+    """Content-addressed image files on local disk.
+
+    Images are named by the SHA-256 of their bytes and sharded into
+    ab/cd/<digest>.<ext> directories, so identical uploads are stored once and a
+    stored file never changes (safe to cache forever). A JPEG thumbnail is
+    written next to each image at ingest.
+    """
+
+    def __init__(self, root: str = IMAGE_STORE_DIR, thumbnail_size: int = THUMBNAIL_SIZE):
+        self.root = root
+        self.thumbnail_size = thumbnail_size
+
+    def _shard_dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4])
+
+    def _write_atomic(self, path: str, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        # Readers see either no file or the complete one
+        os.replace(tmp_path, path)
+
+    def _thumbnail(self, data: bytes) -> bytes:
+        image = Image.open(BytesIO(data))
+        image.draft("RGB", (self.thumbnail_size, self.thumbnail_size))
+        image = image.convert("RGB")
+        image.thumbnail((self.thumbnail_size, self.thumbnail_size), Image.LANCZOS)
+        output = BytesIO()
+        image.save(output, format="JPEG", quality=80, optimize=True)
+        return output.getvalue()
+
+    def put(self, data: bytes, mime_type: str = "image/jpeg") -> str:
+        """Store an image and its thumbnail; returns the image name (<digest>.<ext>)"""
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest}.{EXTENSIONS.get(mime_type, 'jpg')}"
+        image_path = os.path.join(self._shard_dir(digest), name)
+        if not os.path.exists(image_path):
+            self._write_atomic(image_path, data)
+        thumbnail_path = self.thumbnail_path(digest)
+        if not os.path.exists(thumbnail_path):
+            self._write_atomic(thumbnail_path, self._thumbnail(data))
+        return name
+
+    def image_path(self, name: str) -> Optional[str]:
+        """Filesystem path of a stored image, or None if the name is invalid or missing"""
+        if not IMAGE_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self._shard_dir(name[:64]), name)
+        return path if os.path.exists(path) else None
+
+    def thumbnail_path(self, digest: str) -> str:
+        return os.path.join(self._shard_dir(digest), f"{digest}_thumb.jpg")
+
+    def existing_thumbnail_path(self, digest: str) -> Optional[str]:
+        if not DIGEST_PATTERN.match(digest):
+            return None
+        path = self.thumbnail_path(digest)
+        return path if os.path.exists(path) else None
+
+# Global store instance
+image_store = LocalImageStore()
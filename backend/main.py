@@ -1,8 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine
+from fastapi.responses import JSONResponse
+from database import async_engine, run_migrations, replica_router, bearer_token
 from models import Base
 from routers import auth, users, chat, market, crops, commodities, marketplace, labor, crop_ai, costs, weather, crop_details, disease_detection, crop_data, activity_logs, stats
+from ai.services.embedding_pipeline import embedding_pipeline
+from ai.services.disease_jobs import disease_job_queue
+from ai.services.purge_worker import purge_worker
+from ai.services.image_preprocessing import MAX_UPLOAD_BYTES
+from bulk_import import IMPORT_MAX_UPLOAD_BYTES
 import redis
 import os
 from dotenv import load_dotenv
@@ -10,8 +16,9 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Bring the schema up to date; set DB_MIGRATE_ON_STARTUP=false to run `alembic upgrade head` separately
+if os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() == "true":
+    run_migrations()
 
 app = FastAPI(title="Farmers Guild API", version="1.0.0")
 
@@ -24,6 +31,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized image and CSV uploads from the Content-Length header, before the multipart body is parsed
+UPLOAD_SIZE_LIMITS = {
+    "/api/disease/analyze": MAX_UPLOAD_BYTES,
+    "/api/disease/jobs": MAX_UPLOAD_BYTES,
+    "/api/crops/activity/import": IMPORT_MAX_UPLOAD_BYTES,
+    "/api/costs/import": IMPORT_MAX_UPLOAD_BYTES,
+}
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    limit = UPLOAD_SIZE_LIMITS.get(request.url.path)
+    content_length = request.headers.get("content-length")
+    if limit and content_length and content_length.isdigit() and int(content_length) > limit + 64 * 1024:
+        # Allow some headroom for multipart boundaries and form fields
+        return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+    return await call_next(request)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """Pin a user's reads to the primary around their writes (see ReplicaRouter)"""
+    if request.method not in WRITE_METHODS:
+        return await call_next(request)
+    response = await call_next(request)
+    # Counted from the commit, and only for verified users whose write went through:
+    # forged or failed requests must not push real writers out of the tracked set
+    if response.status_code < 400:
+        replica_router.note_write(auth.token_subject(bearer_token(request)))
+    return response
+
 # Redis connection
 redis_client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"))
 
@@ -45,6 +83,21 @@ app.include_router(crop_data.router, prefix="/api/crop-data", tags=["crop-data"]
 app.include_router(activity_logs.router, prefix="/api/crops", tags=["activity-logs"])
 app.include_router(stats.router, prefix="/api/stats", tags=["stats"])
 
+@app.on_event("startup")
+async def start_background_workers():
+    embedding_pipeline.start()
+    disease_job_queue.start()
+    purge_worker.start()
+    replica_router.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    embedding_pipeline.stop()
+    disease_job_queue.stop()
+    purge_worker.stop()
+    replica_router.stop()
+    await async_engine.dispose()
+
 @app.get("/")
 async def root():
     return {"message": "Farmers Guild API"}
@@ -6,13 +6,15 @@ from typing import List, Dict, Optional
 import os
 from openai import OpenAI
 from location_matcher import LocationMatcher
+from ai.config import OPENROUTER_BASE_URL
+from ai.services.llm_dispatcher import llm_dispatcher, PRIORITY_BATCH
 
 class MarketInsightsService:
     def __init__(self):
         self.api_key = os.getenv("MARKET_PRICE_API_KEY")
         self.api_url = os.getenv("MARKET_PRICE_API_URL", "https://api.data.gov.in/resource/35985678-0d79-46b4-9ed6-6f13308a1d24")
         self.openai_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
+            base_url=OPENROUTER_BASE_URL,
             api_key=os.getenv("OPENROUTER_API_KEY")
         )
         self.location_matcher = LocationMatcher()
@@ -157,16 +159,17 @@ class MarketInsightsService:
         """
         
         try:
-            response = self.openai_client.chat.completions.create(
+            model = "deepseek/deepseek-chat-v3.1:free"
+            response = llm_dispatcher.run(model, lambda: self.openai_client.chat.completions.create(
                 extra_headers={
                     "HTTP-Referer": "https://farmersguild.app",
                     "X-Title": "Farmers Guild"
                 },
-                model="deepseek/deepseek-chat-v3.1:free",
+                model=model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=300,
                 temperature=0.7
-            )
+            ), priority=PRIORITY_BATCH)
             return response.choices[0].message.content
         except Exception:
             return self._generate_fallback_summary(insights)
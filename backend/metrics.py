@@ -0,0 +1,8 @@
+from typing import List
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of latency samples; 0.0 when there are none"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
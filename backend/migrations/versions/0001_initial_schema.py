@@ -0,0 +1,170 @@
+"""Initial schema, as created by the create_all startup before migrations existed
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("email", sa.String()),
+        sa.Column("hashed_password", sa.String()),
+        sa.Column("name", sa.String()),
+        sa.Column("is_admin", sa.Boolean()),
+        sa.Column("state", sa.String()),
+        sa.Column("district", sa.String()),
+        sa.Column("location", sa.String()),
+        sa.Column("is_available_for_work", sa.Boolean()),
+        sa.Column("max_travel_distance_km", sa.Integer()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "commodities",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_commodities_id", "commodities", ["id"])
+    op.create_index("ix_commodities_name", "commodities", ["name"], unique=True)
+
+    op.create_table(
+        "districts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_districts_id", "districts", ["id"])
+    op.create_index("ix_districts_state", "districts", ["state"])
+
+    op.create_table(
+        "crops",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("crop_type", sa.String()),
+        sa.Column("variety", sa.String()),
+        sa.Column("planting_date", sa.DateTime()),
+        sa.Column("harvest_date", sa.String()),
+        sa.Column("growth_stage", sa.String()),
+        sa.Column("area", sa.String()),
+        sa.Column("soil_type", sa.String()),
+        sa.Column("notes", sa.Text()),
+        sa.Column("state", sa.String()),
+        sa.Column("district", sa.String()),
+        sa.Column("location", sa.String()),
+        sa.Column("zipcode", sa.String()),
+        sa.Column("user_id", UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_crops_id", "crops", ["id"])
+
+    op.create_table(
+        "conversations",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("user_id", UUID(as_uuid=True), sa.ForeignKey("users.id")),
+        sa.Column("title", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    # Embeddings were stored as text until pgvector (0002 converts the column)
+    op.create_table(
+        "messages",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("conversation_id", UUID(as_uuid=True), sa.ForeignKey("conversations.id")),
+        sa.Column("content", sa.Text()),
+        sa.Column("role", sa.String()),
+        sa.Column("embedding", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "crop_costs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("crop_id", sa.Integer(), sa.ForeignKey("crops.id"), nullable=False),
+        sa.Column("expense_type", sa.String(), nullable=False),
+        sa.Column("title", sa.String()),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("description", sa.String()),
+        sa.Column("date", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_crop_costs_id", "crop_costs", ["id"])
+
+    op.create_table(
+        "disease_detections",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("crop_id", sa.Integer(), sa.ForeignKey("crops.id"), nullable=False),
+        sa.Column("disease_name", sa.String()),
+        sa.Column("confidence", sa.Float()),
+        sa.Column("severity", sa.String()),
+        sa.Column("image_path", sa.String()),
+        sa.Column("recommendations", sa.Text()),
+        sa.Column("detected_at", sa.DateTime()),
+    )
+    op.create_index("ix_disease_detections_id", "disease_detections", ["id"])
+
+    op.create_table(
+        "weather_alerts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("crop_id", sa.Integer(), sa.ForeignKey("crops.id")),
+        sa.Column("alert_type", sa.String()),
+        sa.Column("description", sa.Text()),
+        sa.Column("temperature", sa.Float()),
+        sa.Column("humidity", sa.Float()),
+        sa.Column("precipitation", sa.Float()),
+        sa.Column("wind_speed", sa.Float()),
+        sa.Column("is_critical", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_weather_alerts_id", "weather_alerts", ["id"])
+
+    op.create_table(
+        "activity_logs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("crop_id", sa.Integer(), sa.ForeignKey("crops.id"), nullable=False),
+        sa.Column("activity_type", sa.String()),
+        sa.Column("description", sa.Text()),
+        sa.Column("quantity", sa.Float()),
+        sa.Column("unit", sa.String()),
+        sa.Column("notes", sa.Text()),
+        sa.Column("performed_at", sa.DateTime()),
+    )
+    op.create_index("ix_activity_logs_id", "activity_logs", ["id"])
+
+    op.create_table(
+        "crop_conversations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("crop_id", sa.Integer(), sa.ForeignKey("crops.id"), nullable=False),
+        sa.Column("message", sa.Text()),
+        sa.Column("response", sa.Text()),
+        sa.Column("context_used", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_crop_conversations_id", "crop_conversations", ["id"])
+
+    op.create_table(
+        "disease_chat_history",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("detection_id", sa.Integer(), sa.ForeignKey("disease_detections.id"), nullable=False),
+        sa.Column("message", sa.Text()),
+        sa.Column("response", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_disease_chat_history_id", "disease_chat_history", ["id"])
+
+def downgrade():
+    for table in ("disease_chat_history", "crop_conversations", "activity_logs", "weather_alerts", "disease_detections",
+                  "crop_costs", "messages", "conversations", "crops", "districts", "commodities", "users"):
+        op.drop_table(table)
@@ -0,0 +1,64 @@
+"""pgvector embeddings for chat search, and image hashes for near-duplicate disease photos
+
+Databases stamped at 0001 from the old create_all startup may already have
+some of these columns, so every step checks before it changes anything.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+import pgvector.sqlalchemy
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Frozen here rather than imported, so later changes to the embedding model get their own revision
+EMBEDDING_DIM = 1536
+
+def _columns(table: str) -> dict:
+    return {column["name"]: column for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    # Text embeddings were never queried; NULL rows are picked up by the embedding backfill
+    embedding = _columns("messages")["embedding"]
+    if not isinstance(embedding["type"], pgvector.sqlalchemy.Vector):
+        op.alter_column(
+            "messages", "embedding",
+            type_=pgvector.sqlalchemy.Vector(EMBEDDING_DIM),
+            postgresql_using="NULL"
+        )
+    if "embedding" not in _columns("crop_conversations"):
+        op.add_column("crop_conversations", sa.Column("embedding", pgvector.sqlalchemy.Vector(EMBEDDING_DIM), nullable=True))
+
+    detection_columns = _columns("disease_detections")
+    if "image_hash" not in detection_columns:
+        op.add_column("disease_detections", sa.Column("image_hash", sa.String(16)))
+    if "analysis_result" not in detection_columns:
+        op.add_column("disease_detections", sa.Column("analysis_result", sa.Text()))
+
+    op.create_index("ix_conversations_user_id", "conversations", ["user_id"], if_not_exists=True)
+    op.create_index("ix_messages_conversation_id", "messages", ["conversation_id"], if_not_exists=True)
+    op.create_index("ix_disease_detections_image_hash", "disease_detections", ["image_hash"], if_not_exists=True)
+    op.create_index(
+        "ix_messages_embedding_hnsw", "messages", ["embedding"],
+        postgresql_using="hnsw",
+        postgresql_with={"m": 16, "ef_construction": 64},
+        postgresql_ops={"embedding": "vector_cosine_ops"},
+        if_not_exists=True
+    )
+
+def downgrade():
+    op.drop_index("ix_messages_embedding_hnsw", table_name="messages")
+    op.drop_index("ix_disease_detections_image_hash", table_name="disease_detections")
+    op.drop_index("ix_messages_conversation_id", table_name="messages")
+    op.drop_index("ix_conversations_user_id", table_name="conversations")
+    op.drop_column("disease_detections", "analysis_result")
+    op.drop_column("disease_detections", "image_hash")
+    op.drop_column("crop_conversations", "embedding")
+    op.alter_column("messages", "embedding", type_=sa.Text(), postgresql_using="embedding::text")
@@ -0,0 +1,52 @@
+"""Composite (parent id, timestamp) indexes for crop-scoped history and context queries
+
+History endpoints and the crop context filter on a foreign key and sort by a
+timestamp. Without these they sequential-scan and sort the whole table; with
+them Postgres walks one index range in order. The leading column also covers
+the foreign keys that had no index (crop deletes, joins).
+
+Indexes are built CONCURRENTLY outside a transaction so writes keep flowing on
+large tables. A concurrent build that fails leaves an INVALID index behind,
+which is dropped and rebuilt on the next run.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns)
+HISTORY_INDEXES = [
+    ("ix_crops_user_id_created_at", "crops", ["user_id", "created_at"]),
+    ("ix_crop_conversations_crop_id_created_at", "crop_conversations", ["crop_id", "created_at"]),
+    ("ix_activity_logs_crop_id_performed_at", "activity_logs", ["crop_id", "performed_at"]),
+    ("ix_disease_detections_crop_id_detected_at", "disease_detections", ["crop_id", "detected_at"]),
+    ("ix_crop_costs_crop_id_date", "crop_costs", ["crop_id", "date"]),
+    ("ix_disease_chat_history_detection_id_created_at", "disease_chat_history", ["detection_id", "created_at"]),
+    ("ix_weather_alerts_crop_id_created_at", "weather_alerts", ["crop_id", "created_at"]),
+    ("ix_messages_conversation_id_created_at", "messages", ["conversation_id", "created_at"]),
+]
+
+def _is_invalid(name: str) -> bool:
+    return bool(op.get_bind().scalar(sa.text(
+        "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_catalog.pg_table_is_visible(c.oid)"
+    ), {"name": name}))
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in HISTORY_INDEXES:
+            if _is_invalid(name):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(HISTORY_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
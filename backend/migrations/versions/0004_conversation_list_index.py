@@ -0,0 +1,23 @@
+"""(user_id, created_at) index for the paginated conversation list
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversations_user_id_created_at", "conversations", ["user_id", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_conversations_user_id_created_at", table_name="conversations", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,197 @@
+"""Counter tables for the platform and per-user stats endpoints, kept current by triggers
+
+Each write to messages, crops or crop_costs adjusts user_stats (one row per
+user) and platform_stats in the same transaction, so /api/stats reads a few
+rows instead of counting and summing whole tables. Triggers are statement
+level with transition tables: a bulk insert or cascade delete updates the
+counters once per statement, not once per row. Platform totals are spread
+over PLATFORM_SHARDS rows so concurrent writers rarely wait on the same row.
+
+A child row whose parent is already gone (a cascade from a crop or
+conversation delete) only adjusts the platform totals; the parent's BEFORE
+DELETE trigger has taken its children off the owner's counters already.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+PLATFORM_SHARDS = 16
+
+# Per table: SQL giving (user_id, consultations, crops, cost) for each row of {rows},
+# and the columns whose change moves a row between counters
+ROLLUP_SOURCES = {
+    "messages": (
+        "SELECT c.user_id, 1, 0, 0::double precision FROM {rows} r LEFT JOIN conversations c ON c.id = r.conversation_id WHERE r.role = 'assistant'",
+        ["conversation_id", "role"],
+    ),
+    "crops": (
+        "SELECT r.user_id, 0, 1, 0::double precision FROM {rows} r",
+        ["user_id"],
+    ),
+    "crop_costs": (
+        "SELECT c.user_id, 0, 0, r.amount FROM {rows} r LEFT JOIN crops c ON c.id = r.crop_id",
+        ["crop_id", "amount"],
+    ),
+}
+
+APPLY_DELTAS = """
+        WITH delta (user_id, consultations, crops, cost) AS ({source}),
+        platform AS (
+            UPDATE platform_stats SET
+                ai_consultations = ai_consultations + {sign} * (SELECT coalesce(sum(consultations), 0) FROM delta),
+                crops = crops + {sign} * (SELECT coalesce(sum(crops), 0) FROM delta),
+                cost_total = cost_total + {sign} * (SELECT coalesce(sum(cost), 0) FROM delta)
+            WHERE shard = (SELECT floor(random() * {shards})::int) AND EXISTS (SELECT 1 FROM delta)
+        )
+        INSERT INTO user_stats (user_id, ai_consultations, crops, cost_total)
+        SELECT delta.user_id, {sign} * sum(consultations), {sign} * sum(crops), {sign} * coalesce(sum(cost), 0)
+        FROM delta JOIN users ON users.id = delta.user_id
+        GROUP BY delta.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            ai_consultations = user_stats.ai_consultations + EXCLUDED.ai_consultations,
+            crops = user_stats.crops + EXCLUDED.crops,
+            cost_total = user_stats.cost_total + EXCLUDED.cost_total,
+            updated_at = now();"""
+
+def _apply(source: str, rows: str, sign: int) -> str:
+    return APPLY_DELTAS.format(source=source.format(rows=rows), sign=sign, shards=PLATFORM_SHARDS)
+
+def _rollup_function(table: str) -> str:
+    source, keys = ROLLUP_SOURCES[table]
+    changed = " OR ".join(f"o.{key} IS DISTINCT FROM n.{key}" for key in keys)
+    # Updates that leave the key columns alone (e.g. embedding writes) produce no delta
+    moved = "(SELECT {side}.* FROM old_rows o JOIN new_rows n ON n.id = o.id WHERE " + changed + ")"
+    return f"""
+CREATE OR REPLACE FUNCTION {table}_stats_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN{_apply(source, "new_rows", 1)}
+    ELSIF TG_OP = 'DELETE' THEN{_apply(source, "old_rows", -1)}
+    ELSE{_apply(source, moved.format(side="o"), -1)}{_apply(source, moved.format(side="n"), 1)}
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+def upgrade():
+    op.create_table(
+        "user_stats",
+        sa.Column("user_id", UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ai_consultations", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("crops", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("cost_total", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "platform_stats",
+        sa.Column("shard", sa.Integer(), primary_key=True),
+        sa.Column("ai_consultations", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("crops", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("cost_total", sa.Float(), nullable=False, server_default="0"),
+    )
+    op.execute(f"INSERT INTO platform_stats (shard) SELECT generate_series(0, {PLATFORM_SHARDS - 1})")
+
+    # Row-level adjustments for one user, used when a parent row is deleted or changes owner
+    op.execute("""
+CREATE OR REPLACE FUNCTION bump_user_stats(owner uuid, consultations bigint, crops bigint, cost double precision) RETURNS void AS $$
+BEGIN
+    IF owner IS NULL OR (consultations = 0 AND crops = 0 AND cost = 0) THEN
+        RETURN;
+    END IF;
+    INSERT INTO user_stats (user_id, ai_consultations, crops, cost_total)
+    SELECT owner, consultations, crops, cost WHERE EXISTS (SELECT 1 FROM users WHERE id = owner)
+    ON CONFLICT (user_id) DO UPDATE SET
+        ai_consultations = user_stats.ai_consultations + EXCLUDED.ai_consultations,
+        crops = user_stats.crops + EXCLUDED.crops,
+        cost_total = user_stats.cost_total + EXCLUDED.cost_total,
+        updated_at = now();
+END
+$$ LANGUAGE plpgsql""")
+
+    for table in ROLLUP_SOURCES:
+        op.execute(_rollup_function(table))
+        op.execute(f"CREATE TRIGGER {table}_stats_rollup_insert AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION {table}_stats_rollup()")
+        op.execute(f"CREATE TRIGGER {table}_stats_rollup_delete AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION {table}_stats_rollup()")
+        op.execute(f"CREATE TRIGGER {table}_stats_rollup_update AFTER UPDATE ON {table} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION {table}_stats_rollup()")
+
+    # Children follow their parent's owner: take them off (or move them between) user counters
+    # before a cascade leaves them without a parent to look the owner up through
+    op.execute("""
+CREATE OR REPLACE FUNCTION crops_owner_stats() RETURNS trigger AS $$
+DECLARE
+    cost double precision := (SELECT coalesce(sum(amount), 0) FROM crop_costs WHERE crop_id = OLD.id);
+BEGIN
+    PERFORM bump_user_stats(OLD.user_id, 0, 0, -cost);
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM bump_user_stats(NEW.user_id, 0, 0, cost);
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql""")
+    op.execute("""
+CREATE OR REPLACE FUNCTION conversations_owner_stats() RETURNS trigger AS $$
+DECLARE
+    consultations bigint := (SELECT count(*) FROM messages WHERE conversation_id = OLD.id AND role = 'assistant');
+BEGIN
+    PERFORM bump_user_stats(OLD.user_id, -consultations, 0, 0);
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM bump_user_stats(NEW.user_id, consultations, 0, 0);
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql""")
+    for table in ("crops", "conversations"):
+        op.execute(
+            f"CREATE TRIGGER {table}_owner_stats BEFORE DELETE OR UPDATE OF user_id ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_owner_stats()"
+        )
+
+    # Recount everything from the source tables; also usable later to correct drift
+    op.execute("""
+CREATE OR REPLACE FUNCTION rebuild_stats_rollups() RETURNS void AS $$
+BEGIN
+    LOCK TABLE messages, conversations, crops, crop_costs IN SHARE ROW EXCLUSIVE MODE;
+    DELETE FROM user_stats;
+    INSERT INTO user_stats (user_id, ai_consultations, crops, cost_total)
+    SELECT u.id, coalesce(m.consultations, 0), coalesce(c.crops, 0), coalesce(c.cost, 0)
+    FROM users u
+    LEFT JOIN (
+        SELECT conv.user_id, count(*) AS consultations
+        FROM messages msg JOIN conversations conv ON conv.id = msg.conversation_id
+        WHERE msg.role = 'assistant' GROUP BY conv.user_id
+    ) m ON m.user_id = u.id
+    LEFT JOIN (
+        SELECT cr.user_id, count(*) AS crops, sum((SELECT coalesce(sum(amount), 0) FROM crop_costs WHERE crop_id = cr.id)) AS cost
+        FROM crops cr GROUP BY cr.user_id
+    ) c ON c.user_id = u.id;
+    UPDATE platform_stats SET ai_consultations = 0, crops = 0, cost_total = 0;
+    UPDATE platform_stats SET
+        ai_consultations = (SELECT count(*) FROM messages WHERE role = 'assistant'),
+        crops = (SELECT count(*) FROM crops),
+        cost_total = (SELECT coalesce(sum(amount), 0) FROM crop_costs)
+    WHERE shard = 0;
+END
+$$ LANGUAGE plpgsql""")
+    op.execute("SELECT rebuild_stats_rollups()")
+
+def downgrade():
+    for table in ("crops", "conversations"):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_owner_stats ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS {table}_owner_stats()")
+    for table in ROLLUP_SOURCES:
+        for event in ("insert", "delete", "update"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_stats_rollup_{event} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS {table}_stats_rollup()")
+    op.execute("DROP FUNCTION IF EXISTS rebuild_stats_rollups()")
+    op.execute("DROP FUNCTION IF EXISTS bump_user_stats(uuid, bigint, bigint, double precision)")
+    op.drop_table("platform_stats")
+    op.drop_table("user_stats")
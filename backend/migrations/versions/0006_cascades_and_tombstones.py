@@ -0,0 +1,56 @@
+"""ON DELETE CASCADE foreign keys, and tombstone columns for background purges
+
+Crops and accounts are tombstoned by the API (deleted_at set) and removed in
+bounded batches by the purge worker; the cascades make the final parent
+delete, or any direct delete, take its children with it.
+
+Foreign keys are re-added NOT VALID (no scan under the table lock) and
+validated afterwards outside the transaction, which only blocks schema
+changes while it checks existing rows.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# (table, column, referenced table); constraint names are Postgres' defaults from create_all/0001
+CASCADE_FOREIGN_KEYS = [
+    ("crops", "user_id", "users"),
+    ("conversations", "user_id", "users"),
+    ("messages", "conversation_id", "conversations"),
+    ("crop_costs", "crop_id", "crops"),
+    ("disease_detections", "crop_id", "crops"),
+    ("weather_alerts", "crop_id", "crops"),
+    ("activity_logs", "crop_id", "crops"),
+    ("crop_conversations", "crop_id", "crops"),
+    ("disease_chat_history", "detection_id", "disease_detections"),
+]
+
+def _replace_foreign_keys(ondelete):
+    for table, column, referenced in CASCADE_FOREIGN_KEYS:
+        name = f"{table}_{column}_fkey"
+        op.drop_constraint(name, table, type_="foreignkey")
+        op.create_foreign_key(name, table, referenced, [column], ["id"], ondelete=ondelete, postgresql_not_valid=True)
+    with op.get_context().autocommit_block():
+        for table, column, _ in CASCADE_FOREIGN_KEYS:
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey")
+
+def upgrade():
+    for table in ("users", "crops"):
+        op.add_column(table, sa.Column("deleted_at", sa.DateTime(), nullable=True))
+        # Only tombstones are indexed, so the purge worker's poll stays a tiny index read
+        op.create_index(f"ix_{table}_deleted_at", table, ["deleted_at"], postgresql_where=sa.text("deleted_at IS NOT NULL"))
+    _replace_foreign_keys("CASCADE")
+
+def downgrade():
+    _replace_foreign_keys(None)
+    for table in ("crops", "users"):
+        op.drop_index(f"ix_{table}_deleted_at", table_name=table)
+        op.drop_column(table, "deleted_at")
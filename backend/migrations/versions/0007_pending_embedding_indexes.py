@@ -0,0 +1,37 @@
+"""Partial indexes on rows still waiting for an embedding
+
+The embedding backfill selects `embedding IS NULL` rows in id order. Indexing
+only those rows keeps each batch a short index range read however much history
+is already embedded, and lets a restarted backfill pick up where the last one
+stopped without any saved position: embedded rows simply drop out of the index.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+# (index name, table)
+PENDING_INDEXES = [
+    ("ix_messages_embedding_pending", "messages"),
+    ("ix_crop_conversations_embedding_pending", "crop_conversations"),
+]
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table in PENDING_INDEXES:
+            op.create_index(
+                name, table, ["id"], postgresql_where=sa.text("embedding IS NULL"),
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table in reversed(PENDING_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
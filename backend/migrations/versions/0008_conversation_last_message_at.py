@@ -0,0 +1,44 @@
+"""Order conversations by their latest message
+
+Follow-up messages append to an existing conversation, so creation time no
+longer says which conversations are active. last_message_at is set on every
+send and the list pages on (user_id, last_message_at), which replaces the
+(user_id, created_at) index from 0004.
+
+Existing rows take their newest message's time, or their creation time when
+they have no messages.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # A constant default, so adding the column does not rewrite the table
+    op.add_column("conversations", sa.Column("last_message_at", sa.DateTime(), nullable=False, server_default=sa.func.now()))
+    op.execute("""
+        UPDATE conversations c
+        SET last_message_at = coalesce((SELECT max(m.created_at) FROM messages m WHERE m.conversation_id = c.id), c.created_at, c.last_message_at)
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversations_user_id_last_message_at", "conversations", ["user_id", "last_message_at"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index("ix_conversations_user_id_created_at", table_name="conversations", postgresql_concurrently=True, if_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversations_user_id_created_at", "conversations", ["user_id", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index("ix_conversations_user_id_last_message_at", table_name="conversations", postgresql_concurrently=True, if_exists=True)
+    op.drop_column("conversations", "last_message_at")
@@ -0,0 +1,48 @@
+"""NOT NULL and a database default for the timestamps history pages are keyed on
+
+These columns had only a Python-side default, so rows written by raw SQL or
+COPY could leave them NULL, and a page ending on such a row could not encode
+its cursor. Existing NULLs take the migration time, which is also what the
+CSV import uses for blank dates.
+
+NOT NULL is added behind a CHECK constraint that is created NOT VALID and
+validated outside the transaction, so the table is not scanned under an
+exclusive lock.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+# (table, keyset timestamp column)
+HISTORY_TIMESTAMPS = [
+    ("crop_conversations", "created_at"),
+    ("activity_logs", "performed_at"),
+    ("disease_detections", "detected_at"),
+    ("crop_costs", "date"),
+    ("disease_chat_history", "created_at"),
+]
+
+def upgrade():
+    for table, column in HISTORY_TIMESTAMPS:
+        op.alter_column(table, column, server_default=sa.func.now())
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT ck_{table}_{column}_not_null CHECK ({column} IS NOT NULL) NOT VALID")
+    with op.get_context().autocommit_block():
+        for table, column in HISTORY_TIMESTAMPS:
+            check = f"ck_{table}_{column}_not_null"
+            op.execute(f"UPDATE {table} SET {column} = now() WHERE {column} IS NULL")
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}")
+            # Postgres takes the validated constraint as proof and skips the scan
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {check}")
+
+def downgrade():
+    for table, column in reversed(HISTORY_TIMESTAMPS):
+        op.alter_column(table, column, nullable=True, server_default=None)
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, func, Float
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, ForeignKey, Boolean, func, Float, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
+from pgvector.sqlalchemy import Vector
 from database import Base
+from ai.services.embeddings import EMBEDDING_DIM
 import uuid
 from datetime import datetime
 
@@ -19,8 +21,12 @@ class User(Base):
     is_available_for_work = Column(Boolean, default=False)
     max_travel_distance_km = Column(Integer, default=25)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Tombstone: set (with email cleared) when the account is deleted; the purge worker removes the rows
+    deleted_at = Column(DateTime, nullable=True)
     
-    conversations = relationship("Conversation", back_populates="user")
+    conversations = relationship("Conversation", back_populates="user", passive_deletes=True)
+    
+    __table_args__ = (Index("ix_users_deleted_at", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),)
 
 class Commodity(Base):
     __tablename__ = "commodities"
@@ -57,61 +63,93 @@ class Crop(Base):
     district = Column(String)
     location = Column(String)
     zipcode = Column(String)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+    # Tombstone: set when the crop is deleted; hidden from the API until the purge worker removes it
+    deleted_at = Column(DateTime, nullable=True)
+    
+    # (parent id, timestamp) indexes on crop-scoped history are built by migrations/versions/0003
+    __table_args__ = (
+        Index("ix_crops_user_id_created_at", "user_id", "created_at"),
+        Index("ix_crops_deleted_at", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+    )
 
 class Conversation(Base):
     __tablename__ = "conversations"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
     title = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set on every send; the conversation list is ordered by it
+    last_message_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
     
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation")
+    messages = relationship("Message", back_populates="conversation", passive_deletes=True)
+    
+    __table_args__ = (Index("ix_conversations_user_id_last_message_at", "user_id", "last_message_at"),)
 
 class Message(Base):
     __tablename__ = "messages"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    conversation_id = Column(UUID(as_uuid=True), ForeignKey("conversations.id"))
+    conversation_id = Column(UUID(as_uuid=True), ForeignKey("conversations.id", ondelete="CASCADE"), index=True)
     content = Column(Text)
     role = Column(String)  # 'user' or 'assistant'
-    embedding = Column(Text)  # Store as text instead of vector
+    embedding = Column(Vector(EMBEDDING_DIM), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     conversation = relationship("Conversation", back_populates="messages")
+    
+    __table_args__ = (
+        # Approximate nearest-neighbour index for /api/chat/search (cosine distance)
+        Index(
+            "ix_messages_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"}
+        ),
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),
+        # Rows the embedding backfill still has to process
+        Index("ix_messages_embedding_pending", "id", postgresql_where=text("embedding IS NULL")),
+    )
 
 class CropCost(Base):
     __tablename__ = "crop_costs"
     
     id = Column(Integer, primary_key=True, index=True)
-    crop_id = Column(Integer, ForeignKey("crops.id"), nullable=False)
+    crop_id = Column(Integer, ForeignKey("crops.id", ondelete="CASCADE"), nullable=False)
     expense_type = Column(String, nullable=False)  # seed, fertilizer, pesticide, labor, transport, other
     title = Column(String)  # custom title for 'other' expense type
     amount = Column(Float, nullable=False)
     description = Column(String)
-    date = Column(DateTime, default=datetime.utcnow)
+    date = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
     created_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (Index("ix_crop_costs_crop_id_date", "crop_id", "date"),)
 
 class DiseaseDetection(Base):
     __tablename__ = "disease_detections"
     
     id = Column(Integer, primary_key=True, index=True)
-    crop_id = Column(Integer, ForeignKey("crops.id"), nullable=False)
+    crop_id = Column(Integer, ForeignKey("crops.id", ondelete="CASCADE"), nullable=False)
     disease_name = Column(String)
     confidence = Column(Float)
     severity = Column(String)
     image_path = Column(String)
+    image_hash = Column(String(16), index=True)  # 64-bit dHash (hex) for near-duplicate lookup
+    analysis_result = Column(Text)  # full model result as JSON, reused for near-duplicate photos
     recommendations = Column(Text)
-    detected_at = Column(DateTime, default=datetime.utcnow)
+    detected_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+    
+    __table_args__ = (Index("ix_disease_detections_crop_id_detected_at", "crop_id", "detected_at"),)
 
 class WeatherAlert(Base):
     __tablename__ = "weather_alerts"
     
     id = Column(Integer, primary_key=True, index=True)
-    crop_id = Column(Integer, ForeignKey("crops.id"))
+    crop_id = Column(Integer, ForeignKey("crops.id", ondelete="CASCADE"))
     alert_type = Column(String)
     description = Column(Text)
     temperature = Column(Float)
@@ -120,34 +158,65 @@ class WeatherAlert(Base):
     wind_speed = Column(Float)
     is_critical = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("ix_weather_alerts_crop_id_created_at", "crop_id", "created_at"),)
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    crop_id = Column(Integer, ForeignKey("crops.id"), nullable=False)
+    crop_id = Column(Integer, ForeignKey("crops.id", ondelete="CASCADE"), nullable=False)
     activity_type = Column(String)
     description = Column(Text)
     quantity = Column(Float)
     unit = Column(String)
     notes = Column(Text)
-    performed_at = Column(DateTime, default=datetime.utcnow)
+    performed_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+    
+    __table_args__ = (Index("ix_activity_logs_crop_id_performed_at", "crop_id", "performed_at"),)
 
 class CropConversation(Base):
     __tablename__ = "crop_conversations"
     
     id = Column(Integer, primary_key=True, index=True)
-    crop_id = Column(Integer, ForeignKey("crops.id"), nullable=False)
+    crop_id = Column(Integer, ForeignKey("crops.id", ondelete="CASCADE"), nullable=False)
     message = Column(Text)
     response = Column(Text)
     context_used = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    embedding = Column(Vector(EMBEDDING_DIM), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_crop_conversations_crop_id_created_at", "crop_id", "created_at"),
+        Index("ix_crop_conversations_embedding_pending", "id", postgresql_where=text("embedding IS NULL")),
+    )
 
 class DiseaseChatHistory(Base):
     __tablename__ = "disease_chat_history"
     
     id = Column(Integer, primary_key=True, index=True)
-    detection_id = Column(Integer, ForeignKey("disease_detections.id"), nullable=False)
+    detection_id = Column(Integer, ForeignKey("disease_detections.id", ondelete="CASCADE"), nullable=False)
     message = Column(Text)
     response = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+    
+    __table_args__ = (Index("ix_disease_chat_history_detection_id_created_at", "detection_id", "created_at"),)
+
+class UserStatsRollup(Base):
+    """Per-user counters behind /api/stats/user-stats, maintained by triggers (migrations/versions/0005)"""
+    __tablename__ = "user_stats"
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ai_consultations = Column(BigInteger, nullable=False, server_default="0")
+    crops = Column(BigInteger, nullable=False, server_default="0")
+    cost_total = Column(Float, nullable=False, server_default="0")
+    updated_at = Column(DateTime, server_default=func.now())
+
+class PlatformStatsRollup(Base):
+    """Platform-wide counters, sharded across rows to spread trigger writes; totals are the sum of all shards"""
+    __tablename__ = "platform_stats"
+    
+    shard = Column(Integer, primary_key=True)
+    ai_consultations = Column(BigInteger, nullable=False, server_default="0")
+    crops = Column(BigInteger, nullable=False, server_default="0")
+    cost_total = Column(Float, nullable=False, server_default="0")
\ No newline at end of file
@@ -0,0 +1,58 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+import json
+import os
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "20"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "100"))
+
+def page_size(limit: Optional[int]) -> int:
+    """Requested page size clamped to 1..PAGE_SIZE_MAX"""
+    return max(1, min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX))
+
+def encode_cursor(timestamp: datetime, row_id) -> str:
+    """Opaque cursor for the (timestamp, id) position of the last row on a page"""
+    payload = json.dumps([timestamp.isoformat(), str(row_id)], separators=(",", ":"))
+    return urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, id_type: Callable = str) -> Tuple[datetime, object]:
+    try:
+        timestamp, row_id = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(timestamp), id_type(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset(statement, timestamp_column, id_column, cursor: Optional[str], limit: int, descending: bool = True):
+    """Order a select by (timestamp, id) and start after `cursor`.
+
+    The id breaks ties between rows with the same timestamp, so no row is
+    skipped or repeated across pages. One extra row is fetched to tell whether
+    there is a next page (see `split_page`). Backed by the (parent id,
+    timestamp) composite indexes, each page is an index range read however long
+    the history is.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor, id_column.type.python_type)
+        position = tuple_(timestamp_column, id_column)
+        statement = statement.where(position < tuple_(timestamp, row_id) if descending else position > tuple_(timestamp, row_id))
+    if descending:
+        statement = statement.order_by(timestamp_column.desc(), id_column.desc())
+    else:
+        statement = statement.order_by(timestamp_column.asc(), id_column.asc())
+    return statement.limit(limit + 1)
+
+def split_page(rows: list, limit: int, position: Callable) -> Tuple[list, Optional[str]]:
+    """(rows for this page, cursor for the next page or None); `position(row)` returns (timestamp, id)"""
+    if len(rows) <= limit:
+        return list(rows), None
+    page = list(rows[:limit])
+    return page, encode_cursor(*position(page[-1]))
+
+async def fetch_page(db, statement, timestamp_column, id_column, cursor: Optional[str], limit: int, descending: bool = True) -> Tuple[list, Optional[str]]:
+    """One keyset page of ORM rows from `statement` and the cursor for the next one"""
+    limit = page_size(limit)
+    rows = (await db.scalars(keyset(statement, timestamp_column, id_column, cursor, limit, descending))).all()
+    return split_page(rows, limit, lambda row: (getattr(row, timestamp_column.key), getattr(row, id_column.key)))
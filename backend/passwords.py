@@ -0,0 +1,90 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from metrics import percentile
+import asyncio
+import os
+import time
+
+# Raising this upgrades existing hashes as their users next sign in (see verify_and_update)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool instead of the event loop.
+
+    A hash or verify costs 100-300 ms of CPU. Called inline from an async
+    handler it stalls every other request on the worker, which is what a
+    morning login spike did. bcrypt releases the GIL, so `workers` threads
+    hash in parallel on as many cores. At most `max_pending` calls may be
+    running or queued; past that, sign-ins get a 503 with Retry-After rather
+    than an ever-growing queue.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 64):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # Only touched from the event loop thread
+        self._pending = 0
+        self.metrics = {"hashes": 0, "verifies": 0, "rehashes": 0, "shed": 0}
+        self._wait_samples = deque(maxlen=1000)
+        self._service_samples = deque(maxlen=1000)
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self.metrics["shed"] += 1
+            raise HTTPException(status_code=503, detail="Too many sign-ins right now, please try again shortly", headers={"Retry-After": "2"})
+        self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._wait_samples.append(started - submitted)
+                self._service_samples.append(time.perf_counter() - started)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed_password = await self._run(pwd_context.hash, password)
+        self.metrics["hashes"] += 1
+        return hashed_password
+
+    async def verify_and_update(self, password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """(password matches, replacement hash or None); a replacement is returned when
+        the stored hash uses other parameters than BCRYPT_ROUNDS and should be saved"""
+        if not hashed_password:
+            return False, None
+        valid, new_hash = await self._run(pwd_context.verify_and_update, password, hashed_password)
+        self.metrics["verifies"] += 1
+        if new_hash:
+            self.metrics["rehashes"] += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        waits, services = list(self._wait_samples), list(self._service_samples)
+        return {
+            **self.metrics,
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rounds": BCRYPT_ROUNDS,
+            "queue_wait_p50": percentile(waits, 0.5),
+            "queue_wait_p95": percentile(waits, 0.95),
+            "service_time_p50": percentile(services, 0.5),
+            "service_time_p95": percentile(services, 0.95),
+        }
+
+# Global hasher shared by the auth endpoints
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2))),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+)
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
+import asyncio
 from database import get_db
+from bulk_import import activity_log_import
 from models import User, Crop, ActivityLog
 from routers.auth import get_current_user
+from ai.services.crop_context import crop_context_cache
 
 router = APIRouter()
 
@@ -14,15 +18,26 @@ class ActivityLogCreate(BaseModel):
     description: Optional[str] = None
     notes: Optional[str] = None
 
+@router.post("/activity/import")
+async def import_activity_logs(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """Bulk-add activity logs from CSV: crop_id, activity_type, and optional description, quantity, unit, notes, performed_at"""
+    result = await asyncio.to_thread(activity_log_import.run, file.file, current_user.id)
+    for crop_id in result["crop_ids"]:
+        crop_context_cache.invalidate(crop_id)
+    return result
+
 @router.post("/{crop_id}/activity")
 async def add_activity_log(
     crop_id: int,
     activity_data: ActivityLogCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Add activity log for specific crop"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
@@ -35,7 +50,7 @@ async def add_activity_log(
     )
     
     db.add(activity)
-    db.commit()
-    db.refresh(activity)
+    await db.commit()
+    crop_context_cache.invalidate(crop_id)
     
     return {"id": activity.id, "activity_type": activity.activity_type, "description": activity.description, "notes": activity.notes, "performed_at": activity.performed_at}
\ No newline at end of file
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional
 import uuid
-from database import get_db
+from database import get_db, release_connection
+from passwords import password_hasher
+from auth_cache import principal_cache
 from models import User
 import os
 
@@ -17,7 +19,6 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
 class UserCreate(BaseModel):
@@ -34,11 +35,20 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def authenticate(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    """User for these credentials, or None; saves an upgraded hash when BCRYPT_ROUNDS has changed"""
+    user = await db.scalar(select(User).where(User.email == email))
+    if not user:
+        return None
+    # Don't hold a pooled connection while bcrypt runs
+    await release_connection(db)
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -47,80 +57,101 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 @router.post("/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
         print(f"Registration attempt for: {user.email}")
         
-        db_user = db.query(User).filter(User.email == user.email).first()
+        db_user = await db.scalar(select(User).where(User.email == user.email))
         if db_user:
             raise HTTPException(status_code=400, detail="Email already registered")
         
-        hashed_password = get_password_hash(user.password)
+        await release_connection(db)
+        hashed_password = await password_hasher.hash(user.password)
         db_user = User(email=user.email, hashed_password=hashed_password, name=user.name)
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
         
         print(f"User created successfully: {db_user.id}")
         
-        access_token = create_access_token(data={"sub": user.email})
+        access_token = create_access_token(data={"sub": user.email, "uid": str(db_user.id)})
         return {"access_token": access_token, "token_type": "bearer", "user_id": str(db_user.id)}
     
     except HTTPException:
         raise
     except Exception as e:
         print(f"Registration error: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Registration failed")
 
 @router.post("/login", response_model=Token)
-async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_db)):
     print(f"Login attempt for email: {login_data.email}")
-    user = db.query(User).filter(User.email == login_data.email).first()
+    user = await authenticate(db, login_data.email, login_data.password)
     
     if not user:
-        print(f"User not found: {login_data.email}")
-        raise HTTPException(status_code=401, detail="Incorrect email or password")
-    
-    print(f"User found: {user.email}")
-    if not verify_password(login_data.password, user.hashed_password):
-        print("Password verification failed")
+        print(f"Login failed for: {login_data.email}")
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
     print("Login successful")
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data={"sub": user.email, "uid": str(user.id)})
     return {"access_token": access_token, "token_type": "bearer", "user_id": str(user.id)}
 
 @router.post("/token", response_model=Token)
-async def token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """OAuth2 token endpoint for FastAPI docs"""
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await authenticate(db, form_data.username, form_data.password)
+    if not user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data={"sub": user.email, "uid": str(user.id)})
     return {"access_token": access_token, "token_type": "bearer", "user_id": str(user.id)}
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get current user from JWT token"""
+def token_claims(token: Optional[str]) -> Optional[dict]:
+    """Claims of a validly signed, unexpired token, else None"""
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+def token_subject(token: Optional[str]) -> Optional[str]:
+    """Subject (email) of a validly signed, unexpired token, else None"""
+    return (token_claims(token) or {}).get("sub")
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """Get current user from JWT token, from the principal cache when fresh.
+
+    The returned User is detached and may outlive the row by up to the cache
+    TTL; handlers that modify it must load the row into their session
+    (`load_current_user` in routers/users.py) and invalidate the cache.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    claims = token_claims(token) or {}
+    email = claims.get("sub")
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+        # Emails are freed on deletion and can be registered again, so the token names the account by id too
+        user_id = uuid.UUID(claims.get("uid"))
+    except (TypeError, ValueError):
+        raise credentials_exception
+    if email is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    user = await principal_cache.get(email, user_id)
+    if user is not None:
+        return user
+    
+    generation = principal_cache.generation(email)
+    user = await db.scalar(select(User).where(User.email == email, User.id == user_id, User.deleted_at.is_(None)))
     if user is None:
         raise credentials_exception
     
+    await principal_cache.set(email, user, generation)
     return user
 
 async def get_admin_user(current_user: User = Depends(get_current_user)):
@@ -1,19 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from pydantic import BaseModel
 from typing import List, Optional
-from database import get_db
-from models import User, Conversation, Message, Crop
-from routers.users import get_current_user
+from database import get_db, get_read_db, release_connection
+from pagination import PAGE_SIZE_DEFAULT, fetch_page
+from models import User, Conversation, Message, Crop, CropConversation
+from routers.auth import get_current_user, get_admin_user
 from ai.services.crop_ai_service import crop_ai_service
+from ai.services.embeddings import embedding_provider
+from ai.services.embedding_pipeline import embedding_pipeline
+from ai.services.response_cache import general_chat_cache
+from ai.services.model_router import model_router
+from ai.services.llm_dispatcher import LLM_BUSY_MESSAGE
+from ai.services.prompt_budget import prompt_assembler, PromptSection, SECTION_BUDGETS
+from ai.config import OPENROUTER_BASE_URL
 from langchain_openai import ChatOpenAI
+from datetime import datetime
+import asyncio
 import os
+import uuid
 
 router = APIRouter()
 
 # OpenRouter configuration (OpenAI-compatible)
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
 class ChatMessage(BaseModel):
     content: str
@@ -25,178 +37,320 @@ class MessageResponse(BaseModel):
     role: str
     created_at: str
 
+class SendMessageResponse(MessageResponse):
+    conversation_id: str
+
 class ConversationResponse(BaseModel):
     id: str
     title: str
+    message_count: int
     messages: List[MessageResponse]
 
-async def get_embedding(text: str, model: str = "openai/text-embedding-ada-002") -> str:
-    """Skip embedding for now"""
-    return ""
+class ConversationPage(BaseModel):
+    conversations: List[ConversationResponse]
+    next_cursor: Optional[str] = None
+
+# Newest messages returned per conversation by the list endpoint (a send creates one conversation per exchange)
+CONVERSATION_PREVIEW_MESSAGES = int(os.getenv("CONVERSATION_PREVIEW_MESSAGES", "4"))
+
+# HNSW candidate list size for search; higher improves recall under the per-user filter
+SEARCH_EF_SEARCH = int(os.getenv("SEARCH_EF_SEARCH", "100"))
+# Users with fewer embedded messages than this are ranked exactly over their own rows
+SEARCH_EXACT_MAX_ROWS = int(os.getenv("SEARCH_EXACT_MAX_ROWS", "10000"))
+SEARCH_MAX_LIMIT = 50
 
-async def get_ai_response(message: str, model: str = "x-ai/grok-2-1212") -> str:
-    """Get AI response using LangChain with OpenRouter"""
+_pgvector_version = None
+
+class SearchResult(BaseModel):
+    id: str
+    conversation_id: str
+    content: str
+    role: str
+    created_at: str
+    similarity: float
+
+async def get_embedding(text: str) -> Optional[List[float]]:
+    """Embed text with the configured provider, or None if the provider fails"""
+    try:
+        return await asyncio.to_thread(embedding_provider.embed, text)
+    except Exception as e:
+        print(f"Error getting embedding: {e}")
+        return None
+
+def stream_chat(model: str, messages: list):
+    """Stream a chat completion from OpenRouter as text chunks"""
+    llm = ChatOpenAI(
+        openai_api_key=OPENROUTER_API_KEY,
+        openai_api_base=OPENROUTER_BASE_URL,
+        model_name=model,
+        max_tokens=500,
+        temperature=0.7
+    )
+    return (chunk.content for chunk in llm.stream(messages))
+
+async def get_ai_response(message: str, model: Optional[str] = None) -> str:
+    """Get AI response using LangChain with OpenRouter (model is tried first if given)"""
     try:
-        llm = ChatOpenAI(
-            openai_api_key=OPENROUTER_API_KEY,
-            openai_api_base=OPENROUTER_BASE_URL,
-            model_name=model,
-            max_tokens=500,
-            temperature=0.7
-        )
-        
         system_message = "You are a helpful farming assistant AI. Provide practical, accurate advice about agriculture, farming techniques, crop management, and related topics."
-        response = llm.invoke([{"role": "system", "content": system_message}, {"role": "user", "content": message}])
-        return response.content
+        messages = [{"role": "system", "content": system_message}, {"role": "user", "content": message}]
+        return await model_router.ainvoke("general_chat", lambda candidate: stream_chat(candidate, messages), prefer=model)
     except Exception as e:
         print(f"Error getting AI response: {e}")
         return "I'm sorry, I'm having trouble processing your request right now. Please try again later."
 
-@router.post("/send", response_model=MessageResponse)
+@router.post("/send", response_model=SendMessageResponse)
 async def send_message(
     message: ChatMessage,
     conversation_id: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    """Answer a chat message, appending to `conversation_id` when given or starting a new conversation.
+
+    Nothing is written until the answer is back: the conversation, both
+    messages and the crop's chat memory go in together in one transaction.
+    """
     print(f"\n=== CHAT ENDPOINT CALLED ===")
     print(f"Message: {message.content}")
     print(f"Crop ID: {message.crop_id}")
     print(f"User: {current_user.email}")
     print("=" * 30)
-    # Always create new conversation for crop chat
-    crop_name = "General Chat"
-    if message.crop_id:
-        crop = db.query(Crop).filter(Crop.id == message.crop_id, Crop.user_id == current_user.id).first()
-        if crop:
-            crop_name = f"{crop.name} Chat"
+    asked_at = datetime.utcnow()
     
-    conversation = Conversation(
-        user_id=current_user.id,
-        title=f"{crop_name} - {message.content[:30]}..." if len(message.content) > 30 else f"{crop_name} - {message.content}"
-    )
-    db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
-
-    # Save user message
-    user_message = Message(
-        conversation_id=conversation.id,
-        content=message.content,
-        role="user",
-        embedding=""
-    )
-    db.add(user_message)
-    db.commit()
-
-    # Always use crop-specific AI
-    crop_id = message.crop_id
+    conversation = None
+    if conversation_id:
+        try:
+            conversation = await db.scalar(select(Conversation).where(
+                Conversation.id == uuid.UUID(conversation_id),
+                Conversation.user_id == current_user.id
+            ))
+        except ValueError:
+            pass
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
     
-    # If no crop_id provided, use user's first crop
-    if not crop_id:
-        first_crop = db.query(Crop).filter(Crop.user_id == current_user.id).first()
-        if first_crop:
-            crop_id = first_crop.id
+    # One crop lookup: the requested crop if the user owns it, otherwise the user's first crop
+    if message.crop_id:
+        crop = await db.scalar(select(Crop).where(Crop.id == message.crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
+    else:
+        crop = await db.scalar(select(Crop).where(Crop.user_id == current_user.id, Crop.deleted_at.is_(None)).order_by(Crop.id).limit(1))
     
-    if crop_id:
-        # Verify user owns the crop
-        crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
-        if crop:
-            print(f"Using crop-specific AI for crop {crop_id}: {crop.name}")
-            ai_response_text = await crop_ai_service.chat_with_crop(crop_id, message.content, db)
-        else:
-            ai_response_text = "I couldn't find that crop in your account."
+    if crop:
+        print(f"Using crop-specific AI for crop {crop.id}: {crop.name}")
+        # Only reads so far; hand the connection back for the model call
+        await release_connection(db)
+        # The crop's chat memory row is added below, in this request's transaction
+        ai_response_text = await crop_ai_service.chat_with_crop(crop.id, message.content, save=False)
+    elif message.crop_id:
+        ai_response_text = "I couldn't find that crop in your account."
     else:
         ai_response_text = "Please create a crop first to get personalized farming advice."
     
-    # Save AI message
-    ai_message = Message(
-        conversation_id=conversation.id,
-        content=ai_response_text,
-        role="assistant",
-        embedding=""
-    )
-    db.add(ai_message)
-    db.commit()
-    db.refresh(ai_message)
-
-    return MessageResponse(
+    if conversation is None:
+        crop_name = f"{crop.name} Chat" if crop and message.crop_id else "General Chat"
+        conversation = Conversation(
+            id=uuid.uuid4(),
+            user_id=current_user.id,
+            title=f"{crop_name} - {message.content[:30]}..." if len(message.content) > 30 else f"{crop_name} - {message.content}"
+        )
+        db.add(conversation)
+    
+    answered_at = datetime.utcnow()
+    # Moves the conversation to the top of the list, in the same transaction as its messages
+    conversation.last_message_at = answered_at
+    user_message = Message(conversation_id=conversation.id, content=message.content, role="user", created_at=asked_at)
+    ai_message = Message(conversation_id=conversation.id, content=ai_response_text, role="assistant", created_at=answered_at)
+    db.add_all([user_message, ai_message])
+    crop_turn = None
+    if crop and ai_response_text != LLM_BUSY_MESSAGE:
+        crop_turn = CropConversation(crop_id=crop.id, message=message.content, response=ai_response_text, context_used="")
+        db.add(crop_turn)
+    await db.commit()
+    
+    # Embedded in the background so the chat write path does not wait on the provider
+    for row in (user_message, ai_message, crop_turn):
+        if row is not None:
+            embedding_pipeline.enqueue(row)
+    
+    return SendMessageResponse(
         id=str(ai_message.id),
+        conversation_id=str(conversation.id),
         content=ai_message.content,
         role=ai_message.role,
         created_at=ai_message.created_at.isoformat()
     )
 
-@router.get("/conversations", response_model=List[ConversationResponse])
+@router.get("/conversations", response_model=ConversationPage)
 async def get_conversations(
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == current_user.id
-    ).all()
+    """Most recently active conversations first (by last_message_at), a page at a time, each with its latest messages as a preview.
+
+    Two queries per page whatever its size: one keyset read of conversations,
+    one windowed read of the newest CONVERSATION_PREVIEW_MESSAGES messages for
+    all of them.
+    """
+    conversations, next_cursor = await fetch_page(
+        db, select(Conversation).where(Conversation.user_id == current_user.id),
+        Conversation.last_message_at, Conversation.id, cursor, limit
+    )
     
-    result = []
-    for conv in conversations:
-        messages = db.query(Message).filter(
-            Message.conversation_id == conv.id
-        ).order_by(Message.created_at).all()
-        
-        result.append(ConversationResponse(
-            id=str(conv.id),
-            title=conv.title,
-            messages=[
-                MessageResponse(
-                    id=str(msg.id),
-                    content=msg.content,
-                    role=msg.role,
-                    created_at=msg.created_at.isoformat()
-                ) for msg in messages
-            ]
-        ))
+    previews = {conv.id: [] for conv in conversations}
+    counts = {}
+    if conversations:
+        ranked = select(
+            Message,
+            func.row_number().over(partition_by=Message.conversation_id, order_by=(Message.created_at.desc(), Message.id.desc())).label("position"),
+            func.count().over(partition_by=Message.conversation_id).label("total")
+        ).where(Message.conversation_id.in_(list(previews))).subquery()
+        preview = aliased(Message, ranked)
+        for msg, total in await db.execute(
+            select(preview, ranked.c.total)
+            .where(ranked.c.position <= CONVERSATION_PREVIEW_MESSAGES)
+            .order_by(ranked.c.created_at, ranked.c.id)
+        ):
+            previews[msg.conversation_id].append(msg)
+            counts[msg.conversation_id] = total
     
-    return result
+    return ConversationPage(
+        conversations=[
+            ConversationResponse(
+                id=str(conv.id),
+                title=conv.title,
+                message_count=counts.get(conv.id, 0),
+                messages=[
+                    MessageResponse(
+                        id=str(msg.id),
+                        content=msg.content,
+                        role=msg.role,
+                        created_at=msg.created_at.isoformat()
+                    ) for msg in previews[conv.id]
+                ]
+            ) for conv in conversations
+        ],
+        next_cursor=next_cursor
+    )
 
 @router.post("/general")
 async def general_agriculture_chat(
     message: ChatMessage,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """General agriculture AI chat - not crop specific"""
     try:
         if not OPENROUTER_API_KEY:
             return {"response": "I'm sorry, AI service is not configured. Please try again later."}
         
-        llm = ChatOpenAI(
-            openai_api_key=OPENROUTER_API_KEY,
-            openai_api_base=OPENROUTER_BASE_URL,
-            model_name="x-ai/grok-2-1212",
-            max_tokens=500,
-            temperature=0.7
-        )
+        # Answers are shared per (crop, state) so advice never crosses crops or regions
+        crop_name = ""
+        if message.crop_id:
+            crop = await db.scalar(select(Crop).where(Crop.id == message.crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
+            if crop:
+                crop_name = crop.name.strip().lower()
+        scope = (crop_name, (current_user.state or "").strip().lower())
+        await release_connection(db)
+        
+        cached_response, question_embedding = await asyncio.to_thread(general_chat_cache.lookup, message.content, scope)
+        if cached_response is not None:
+            return {"response": cached_response, "cached": True}
         
         system_message = "You are an expert agricultural advisor AI assistant. Provide helpful, accurate, and practical advice about farming, agriculture, crop management, livestock, soil health, pest control, weather patterns, market trends, and all aspects of agricultural practices. Be conversational and supportive."
         
-        response = llm.invoke([
+        content = prompt_assembler.fit("general_chat", "{content}", [
+            PromptSection("content", message.content, SECTION_BUDGETS["user_message"], keep="tail")
+        ])["content"]
+        messages = [
             {"role": "system", "content": system_message}, 
-            {"role": "user", "content": message.content}
-        ])
+            {"role": "user", "content": content}
+        ]
+        response = await model_router.ainvoke("general_chat", lambda model: stream_chat(model, messages))
         
-        return {"response": response.content}
+        general_chat_cache.store(message.content, scope, response, question_embedding)
+        return {"response": response, "cached": False}
     except Exception as e:
         print(f"Error in general agriculture chat: {e}")
         return {"response": "I'm having trouble processing your request right now. Please try again later."}
 
-@router.post("/search")
+async def _supports_iterative_scan(db: AsyncSession) -> bool:
+    """pgvector >= 0.8 can keep walking the HNSW graph until the filter is satisfied"""
+    global _pgvector_version
+    if _pgvector_version is None:
+        version = await db.scalar(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")) or "0"
+        _pgvector_version = tuple(int(part) for part in version.split(".") if part.isdigit())
+    return _pgvector_version >= (0, 8)
+
+async def search_messages(db: AsyncSession, user_id, query_embedding: List[float], limit: int) -> list:
+    """Top-k (Message, distance) pairs for a user, nearest first"""
+    user_rows = select(Message.id)\
+        .join(Conversation, Message.conversation_id == Conversation.id)\
+        .where(Conversation.user_id == user_id, Message.embedding.isnot(None))\
+        .limit(SEARCH_EXACT_MAX_ROWS)\
+        .subquery()
+    user_row_count = await db.scalar(select(func.count()).select_from(user_rows))
+    
+    if user_row_count < SEARCH_EXACT_MAX_ROWS:
+        # The HNSW graph is global, so filtering it down to a light user starves the
+        # candidate list. Rank that user's rows exactly instead, reached through the
+        # conversations.user_id / messages.conversation_id btree indexes (bitmap scans)
+        await db.execute(text("SET LOCAL enable_indexscan = off"))
+    elif await _supports_iterative_scan(db):
+        await db.execute(text("SET LOCAL hnsw.iterative_scan = strict_order"))
+        await db.execute(text(f"SET LOCAL hnsw.ef_search = {max(SEARCH_EF_SEARCH, limit)}"))
+    else:
+        # ORDER BY distance LIMIT k lets the planner walk the HNSW index instead of scanning
+        await db.execute(text(f"SET LOCAL hnsw.ef_search = {max(SEARCH_EF_SEARCH, limit)}"))
+    
+    distance = Message.embedding.cosine_distance(query_embedding)
+    return (await db.execute(select(Message, distance.label("distance"))\
+        .join(Conversation, Message.conversation_id == Conversation.id)\
+        .where(Conversation.user_id == user_id, Message.embedding.isnot(None))\
+        .order_by(distance)\
+        .limit(limit))).all()
+
+@router.get("/general/cache-stats")
+async def general_chat_cache_stats(admin_user = Depends(get_admin_user)):
+    """Hit ratio and size of the general chat response cache (admin only)"""
+    return general_chat_cache.stats()
+
+@router.post("/search", response_model=List[SearchResult])
 async def semantic_search(
     query: str,
+    limit: int = 10,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Search messages using vector similarity"""
+    """Search the user's messages by vector similarity (HNSW index on messages.embedding)"""
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    
     query_embedding = await get_embedding(query)
+    if query_embedding is None:
+        raise HTTPException(status_code=503, detail="Embedding service unavailable")
     
-    # This would use pgvector for similarity search in production
-    # For now, return a simple response
-    return {"message": "Semantic search functionality ready for pgvector integration"}
\ No newline at end of file
+    rows = await search_messages(db, current_user.id, query_embedding, limit)
+    return [
+        SearchResult(
+            id=str(msg.id),
+            conversation_id=str(msg.conversation_id),
+            content=msg.content,
+            role=msg.role,
+            created_at=msg.created_at.isoformat(),
+            similarity=1 - float(dist)
+        ) for msg, dist in rows
+    ]
+
+@router.get("/embeddings/status")
+async def embedding_pipeline_status(admin_user = Depends(get_admin_user)):
+    """Embedding pipeline queue depth, batch sizes and throughput (admin only)"""
+    return embedding_pipeline.stats()
+
+@router.post("/embeddings/backfill")
+async def start_embedding_backfill(admin_user = Depends(get_admin_user)):
+    """Embed existing messages and crop conversations that have no embedding (admin only)"""
+    started = embedding_pipeline.start_backfill()
+    return {"started": started, "status": embedding_pipeline.stats()}
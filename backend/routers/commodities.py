@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
 import requests
 import os
 import pandas as pd
@@ -7,7 +8,7 @@ from io import StringIO
 import time
 import asyncio
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Commodity
 from routers.auth import get_admin_user
 
@@ -18,10 +19,10 @@ MARKET_PRICE_API_KEY = os.getenv("MARKET_PRICE_API_KEY")
 MARKET_PRICE_API_URL = os.getenv("MARKET_PRICE_API_URL", "https://api.data.gov.in/resource/35985678-0d79-46b4-9ed6-6f13308a1d24")
 
 @router.get("/commodities")
-async def get_commodities(db: Session = Depends(get_db)):
+async def get_commodities(db: AsyncSession = Depends(get_read_db)):
     """Get commodities from database (public access)"""
     try:
-        commodities = db.query(Commodity).all()
+        commodities = (await db.scalars(select(Commodity))).all()
         commodity_names = sorted([c.name for c in commodities])  # Alphabetical order like fetch
         return {
             "commodities": commodity_names,
@@ -135,7 +136,7 @@ async def fetch_commodities_from_api(admin_user = Depends(get_admin_user)):
 @router.post("/commodities/save")
 async def save_fetched_commodities_to_db(
     admin_user = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Fetch ALL commodities from API and save to database (admin only)"""
     try:
@@ -143,7 +144,7 @@ async def save_fetched_commodities_to_db(
         all_commodities_list = await _fetch_commodities_from_api()
         
         # Save to database
-        existing_names = {c.name for c in db.query(Commodity).all()}
+        existing_names = set((await db.scalars(select(Commodity.name))).all())
         added_commodities = []
         
         for name in all_commodities_list:
@@ -152,8 +153,8 @@ async def save_fetched_commodities_to_db(
                 db.add(commodity)
                 added_commodities.append(name)
         
-        db.commit()
-        total_count = db.query(Commodity).count()
+        await db.commit()
+        total_count = await db.scalar(select(func.count()).select_from(Commodity))
         
         print(f"Save complete: {len(added_commodities)} new commodities added")
         if added_commodities:
@@ -169,19 +170,19 @@ async def save_fetched_commodities_to_db(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @router.delete("/commodities/clear")
 async def clear_all_commodities(
     admin_user = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete ALL commodities from database (admin only)"""
     try:
-        deleted_count = db.query(Commodity).count()
-        db.query(Commodity).delete()
-        db.commit()
+        deleted_count = await db.scalar(select(func.count()).select_from(Commodity))
+        await db.execute(delete(Commodity))
+        await db.commit()
         
         return {
             "message": f"Deleted {deleted_count} commodities from database",
@@ -189,5 +190,5 @@ async def clear_all_commodities(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error clearing commodities: {str(e)}")
\ No newline at end of file
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db
+from bulk_import import cost_import
+from pagination import PAGE_SIZE_DEFAULT, fetch_page
 from routers.auth import get_current_user
 from models import CropCost, Crop
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+import asyncio
 
 router = APIRouter()
 
@@ -28,14 +31,21 @@ class CostResponse(BaseModel):
     date: datetime
     created_at: datetime
 
+    class Config:
+        from_attributes = True
+
+class CostPage(BaseModel):
+    costs: List[CostResponse]
+    next_cursor: Optional[str] = None
+
 @router.post("/", response_model=CostResponse)
 async def add_cost(
     cost: CostCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Verify crop belongs to user
-    crop = db.query(Crop).filter(Crop.id == cost.crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == cost.crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
@@ -49,42 +59,52 @@ async def add_cost(
     )
     
     db.add(db_cost)
-    db.commit()
-    db.refresh(db_cost)
+    await db.commit()
+    await db.refresh(db_cost)
     return db_cost
 
-@router.get("/crop/{crop_id}", response_model=List[CostResponse])
+@router.post("/import")
+async def import_costs(
+    file: UploadFile = File(...),
+    current_user = Depends(get_current_user)
+):
+    """Bulk-add costs from CSV: crop_id, expense_type, amount, and optional title, description, date"""
+    return await asyncio.to_thread(cost_import.run, file.file, current_user.id)
+
+@router.get("/crop/{crop_id}", response_model=CostPage)
 async def get_crop_costs(
     crop_id: int,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     # Verify crop belongs to user
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
-    costs = db.query(CropCost).filter(CropCost.crop_id == crop_id).order_by(CropCost.date.desc()).all()
-    return costs
+    costs, next_cursor = await fetch_page(db, select(CropCost).where(CropCost.crop_id == crop_id), CropCost.date, CropCost.id, cursor, limit)
+    return CostPage(costs=costs, next_cursor=next_cursor)
 
 @router.get("/crop/{crop_id}/total")
 async def get_crop_total_cost(
     crop_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     # Verify crop belongs to user
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
-    total = db.query(func.sum(CropCost.amount)).filter(CropCost.crop_id == crop_id).scalar() or 0
+    total = await db.scalar(select(func.sum(CropCost.amount)).where(CropCost.crop_id == crop_id)) or 0
     
     # Get breakdown by expense type
-    breakdown = db.query(
+    breakdown = (await db.execute(select(
         CropCost.expense_type,
         func.sum(CropCost.amount).label('total')
-    ).filter(CropCost.crop_id == crop_id).group_by(CropCost.expense_type).all()
+    ).where(CropCost.crop_id == crop_id).group_by(CropCost.expense_type))).all()
     
     return {
         "crop_id": crop_id,
@@ -97,17 +117,17 @@ async def get_crop_total_cost(
 async def delete_cost(
     cost_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    cost = db.query(CropCost).filter(CropCost.id == cost_id).first()
+    cost = await db.scalar(select(CropCost).where(CropCost.id == cost_id))
     if not cost:
         raise HTTPException(status_code=404, detail="Cost not found")
     
     # Verify crop belongs to user
-    crop = db.query(Crop).filter(Crop.id == cost.crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == cost.crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    db.delete(cost)
-    db.commit()
+    await db.delete(cost)
+    await db.commit()
     return {"message": "Cost deleted"}
\ No newline at end of file
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from database import get_db
+from database import get_db, SessionLocal, release_connection
 from ai.services.crop_ai_service import crop_ai_service
+from ai.services.crop_context import CropContextService
 from models import Crop
+import asyncio
 
 router = APIRouter(prefix="/api/crops", tags=["crop-ai"])
 
@@ -14,28 +17,34 @@ class ChatResponse(BaseModel):
     response: str
     crop_name: str
 
+def read_formatted_context(crop_id: int) -> str:
+    """The context service is synchronous; run it on a worker thread with its own session"""
+    with SessionLocal() as db:
+        return CropContextService(db).get_formatted_context(crop_id)
+
 @router.post("/{crop_id}/chat", response_model=ChatResponse)
 async def chat_with_crop(
     crop_id: int,
     chat_message: ChatMessage,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Chat with AI about a specific crop"""
     print(f"Received chat request for crop {crop_id}: {chat_message.message}")
     
     # Verify crop exists
-    crop = db.query(Crop).filter(Crop.id == crop_id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.deleted_at.is_(None)))
     if not crop:
         print(f"Crop {crop_id} not found")
         raise HTTPException(status_code=404, detail="Crop not found")
     
     print(f"Found crop: {crop.name}")
+    # The chain uses its own short sessions; keep no connection open across the model call
+    await release_connection(db)
     
     try:
         response = await crop_ai_service.chat_with_crop(
             crop_id=crop_id,
-            message=chat_message.message,
-            db=db
+            message=chat_message.message
         )
         
         print(f"AI response generated: {response[:100]}...")
@@ -52,17 +61,13 @@ async def chat_with_crop(
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
 @router.get("/{crop_id}/context")
-async def get_crop_context(crop_id: int, db: Session = Depends(get_db)):
+async def get_crop_context(crop_id: int, db: AsyncSession = Depends(get_db)):
     """Get current context for a crop (for debugging)"""
-    from ai.services.crop_context import CropContextService
-    
-    crop = db.query(Crop).filter(Crop.id == crop_id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
-    context_service = CropContextService(db)
-    context = context_service.get_crop_context(crop_id)
-    formatted_context = context_service.format_context_for_ai(context)
+    formatted_context = await asyncio.to_thread(read_formatted_context, crop_id)
     
     return {
         "crop_id": crop_id,
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import get_read_db
+from pagination import PAGE_SIZE_DEFAULT, fetch_page
 from models import User, Crop, CropConversation, DiseaseDetection, ActivityLog, CropCost
 from routers.auth import get_current_user
 
@@ -9,41 +12,47 @@ router = APIRouter()
 @router.get("/chat-history/{crop_id}")
 async def get_crop_chat_history(
     crop_id: int,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get chat history for specific crop"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    """Get chat history for specific crop, newest page first; each page is in chronological order and next_cursor goes back in time"""
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
-    conversations = db.query(CropConversation).filter(CropConversation.crop_id == crop_id).order_by(CropConversation.created_at.asc()).all()
-    return {"chat_history": [{"message": c.message, "response": c.response, "created_at": c.created_at} for c in conversations]}
+    conversations, next_cursor = await fetch_page(db, select(CropConversation).where(CropConversation.crop_id == crop_id), CropConversation.created_at, CropConversation.id, cursor, limit)
+    return {"chat_history": [{"id": c.id, "message": c.message, "response": c.response, "created_at": c.created_at} for c in reversed(conversations)], "next_cursor": next_cursor}
 
 @router.get("/activity-logs/{crop_id}")
 async def get_crop_activity_logs(
     crop_id: int,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get activity logs for specific crop"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
-    logs = db.query(ActivityLog).filter(ActivityLog.crop_id == crop_id).order_by(ActivityLog.performed_at.desc()).all()
-    return {"activity_logs": [{"id": l.id, "activity_type": l.activity_type, "description": l.description, "notes": l.notes, "performed_at": l.performed_at} for l in logs]}
+    logs, next_cursor = await fetch_page(db, select(ActivityLog).where(ActivityLog.crop_id == crop_id), ActivityLog.performed_at, ActivityLog.id, cursor, limit)
+    return {"activity_logs": [{"id": l.id, "activity_type": l.activity_type, "description": l.description, "notes": l.notes, "performed_at": l.performed_at} for l in logs], "next_cursor": next_cursor}
 
 @router.get("/costs/{crop_id}")
 async def get_crop_costs(
     crop_id: int,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get costs for specific crop"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
-    costs = db.query(CropCost).filter(CropCost.crop_id == crop_id).order_by(CropCost.date.desc()).all()
-    return {"costs": [{"id": c.id, "expense_type": c.expense_type, "title": c.title, "amount": c.amount, "description": c.description, "date": c.date} for c in costs]}
\ No newline at end of file
+    costs, next_cursor = await fetch_page(db, select(CropCost).where(CropCost.crop_id == crop_id), CropCost.date, CropCost.id, cursor, limit)
+    return {"costs": [{"id": c.id, "expense_type": c.expense_type, "title": c.title, "amount": c.amount, "description": c.description, "date": c.date} for c in costs], "next_cursor": next_cursor}
\ No newline at end of file
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db
 from routers.auth import get_current_user
+from ai.services.crop_context import crop_context_cache
 from models import Crop
 from pydantic import BaseModel
 from typing import Optional
@@ -38,10 +40,10 @@ class CropDetailsResponse(BaseModel):
 async def get_crop_details(
     crop_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get detailed crop information for AI context"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     return crop
@@ -51,10 +53,10 @@ async def update_crop_details(
     crop_id: int,
     details: CropDetailsUpdate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update crop details for better AI context"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
@@ -81,6 +83,7 @@ async def update_crop_details(
         except:
             crop.planting_date = datetime.strptime(details.planting_date, '%Y-%m-%d')
     
-    db.commit()
-    db.refresh(crop)
+    await db.commit()
+    await db.refresh(crop)
+    crop_context_cache.invalidate(crop_id)
     return crop
\ No newline at end of file
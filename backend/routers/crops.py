@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db
 from routers.auth import get_current_user
+from ai.services.crop_context import crop_context_cache
+from ai.services.crop_ai_service import crop_ai_service
+from ai.services.purge_worker import purge_worker
 from models import Commodity, Crop
 from pydantic import BaseModel
 from typing import List, Optional
@@ -46,9 +50,9 @@ class CropResponse(BaseModel):
         from_attributes = True
 
 @router.get("/commodities")
-async def get_commodities(db: Session = Depends(get_db)):
+async def get_commodities(db: AsyncSession = Depends(get_read_db)):
     """Get commodities for dropdown (fast from database)"""
-    commodities = db.query(Commodity).order_by(Commodity.name).all()
+    commodities = (await db.scalars(select(Commodity).order_by(Commodity.name))).all()
     
     if not commodities:
         # Fallback list if database is empty
@@ -61,7 +65,7 @@ async def get_commodities(db: Session = Depends(get_db)):
 async def create_crop(
     crop: CropCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new crop"""
     # Convert planting_date string to datetime if provided
@@ -90,28 +94,28 @@ async def create_crop(
     )
     
     db.add(db_crop)
-    db.commit()
-    db.refresh(db_crop)
+    await db.commit()
+    await db.refresh(db_crop)
     
     return db_crop
 
 @router.get("/", response_model=List[CropResponse])
 async def get_crops(
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get user's crops"""
-    crops = db.query(Crop).filter(Crop.user_id == current_user.id).order_by(Crop.created_at.desc()).all()
+    crops = (await db.scalars(select(Crop).where(Crop.user_id == current_user.id, Crop.deleted_at.is_(None)).order_by(Crop.created_at.desc()))).all()
     return crops
 
 @router.get("/{crop_id}", response_model=CropResponse)
 async def get_crop(
     crop_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get specific crop"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     return crop
@@ -121,10 +125,10 @@ async def update_crop(
     crop_id: int,
     crop_update: CropCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update crop"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
@@ -150,36 +154,30 @@ async def update_crop(
     crop.growth_stage = crop_update.growth_stage
     crop.soil_type = crop_update.soil_type
     
-    db.commit()
-    db.refresh(crop)
+    await db.commit()
+    await db.refresh(crop)
+    crop_context_cache.invalidate(crop_id)
     return crop
 
 @router.delete("/{crop_id}")
 async def delete_crop(
     crop_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Delete crop and all related data"""
-    from models import ActivityLog, DiseaseDetection, WeatherAlert, CropConversation, CropCost
-    
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    """Delete crop and all related data.
+
+    The crop is tombstoned and disappears from the API at once; the purge
+    worker deletes its history in batches afterwards.
+    """
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
-    try:
-        # Delete all related data first
-        db.query(ActivityLog).filter(ActivityLog.crop_id == crop_id).delete()
-        db.query(DiseaseDetection).filter(DiseaseDetection.crop_id == crop_id).delete()
-        db.query(WeatherAlert).filter(WeatherAlert.crop_id == crop_id).delete()
-        db.query(CropConversation).filter(CropConversation.crop_id == crop_id).delete()
-        db.query(CropCost).filter(CropCost.crop_id == crop_id).delete()
-        
-        # Now delete the crop
-        db.delete(crop)
-        db.commit()
-        
-        return {"message": "Crop and all related data deleted successfully"}
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error deleting crop: {str(e)}")
\ No newline at end of file
+    crop.deleted_at = datetime.utcnow()
+    await db.commit()
+    crop_context_cache.invalidate(crop_id)
+    crop_ai_service.clear_crop_chain(crop_id)
+    purge_worker.wake()
+    
+    return {"message": "Crop and all related data deleted successfully"}
\ No newline at end of file
@@ -1,12 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
-import base64
-from database import get_db
+import asyncio
+from database import get_db, get_read_db, AsyncSessionLocal, release_connection
+from pagination import PAGE_SIZE_DEFAULT, fetch_page
 from models import User, Crop, DiseaseDetection, DiseaseChatHistory
-from routers.auth import get_current_user
+from routers.auth import get_current_user, get_admin_user
 from ai.services.disease_ai_service import disease_ai_service
+from ai.services.llm_dispatcher import LLM_BUSY_MESSAGE
+from ai.services.crop_context import crop_context_cache
+from ai.services.image_preprocessing import preprocess_image, ImageTooLargeError, InvalidImageError, MAX_UPLOAD_BYTES
+from ai.services.image_dedup import disease_image_index
+from ai.services.disease_jobs import disease_job_queue, analyze_crop_image, JobQueueFullError
+from image_store import image_store
+
+# Stored images are content-addressed, so a given URL never changes
+IMMUTABLE_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+# Status is re-sent this often while a job is pending so idle proxies keep the socket open
+JOB_WEBSOCKET_HEARTBEAT_SECONDS = 20
 
 router = APIRouter()
 
@@ -15,10 +30,6 @@ async def test_endpoint():
     """Test endpoint to verify disease detection router is working"""
     return {"message": "Disease detection router is working", "status": "ok"}
 
-class DiseaseAnalysisRequest(BaseModel):
-    image_base64: str
-    crop_id: int
-
 class DiseaseAnalysisResponse(BaseModel):
     disease: str
     cause: str
@@ -27,6 +38,7 @@ class DiseaseAnalysisResponse(BaseModel):
     precautions: list[str]
     treatment: list[str]
     detection_id: int
+    reused: bool = False
 
 class DiseaseChatRequest(BaseModel):
     detection_id: int
@@ -35,112 +47,210 @@ class DiseaseChatRequest(BaseModel):
 class DiseaseChatResponse(BaseModel):
     response: str
 
+async def read_upload(crop_id: int, image: UploadFile, current_user: User, db: AsyncSession):
+    """Verify crop ownership, then preprocess and store an uploaded photo"""
+    crop = await db.scalar(select(Crop).where(
+        Crop.id == crop_id,
+        Crop.user_id == current_user.id,
+        Crop.deleted_at.is_(None)
+    ))
+    
+    if not crop:
+        print(f"Crop not found for ID: {crop_id}")
+        raise HTTPException(status_code=404, detail="Crop not found")
+    print(f"Found crop: {crop.name}")
+    # Reading and shrinking the upload can take a while; do it without a pooled connection
+    await release_connection(db)
+    
+    # Decode, orient and shrink the photo to what the vision model actually uses
+    upload = await image.read(MAX_UPLOAD_BYTES + 1)
+    try:
+        processed = await asyncio.to_thread(preprocess_image, upload)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"Preprocessed image: {len(upload)} -> {len(processed.data)} bytes ({processed.width}x{processed.height})")
+    
+    # Keep the image the model saw (plus a thumbnail) for history views and re-analysis
+    image_name = await asyncio.to_thread(image_store.put, processed.data, processed.mime_type)
+    return crop, processed, image_name
+
 @router.post("/analyze", response_model=DiseaseAnalysisResponse)
 async def analyze_disease(
-    request: DiseaseAnalysisRequest,
+    crop_id: int = Form(...),
+    image: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Analyze crop image for disease detection"""
+    """Analyze an uploaded crop photo (multipart) for disease detection"""
     print(f"\n=== DISEASE ANALYSIS ENDPOINT CALLED ===")
     print(f"User: {current_user.email if current_user else 'None'}")
-    print(f"Crop ID: {request.crop_id}")
-    print(f"Image data length: {len(request.image_base64)}")
+    print(f"Crop ID: {crop_id}")
+    print(f"Upload size: {image.size}")
     print(f"Request received at /api/disease/analyze")
     
     try:
-        # Verify user owns the crop
-        crop = db.query(Crop).filter(
-            Crop.id == request.crop_id,
-            Crop.user_id == current_user.id
-        ).first()
-        
-        if not crop:
-            print(f"Crop not found for ID: {request.crop_id}")
-            raise HTTPException(status_code=404, detail="Crop not found")
-        
-        # Extract crop name before calling service
-        crop_name = crop.name
-        print(f"Found crop: {crop_name}")
-        print(f"Starting disease analysis...")
-        
-        # Analyze the image
-        result = await disease_ai_service.analyze_disease_image(
-            request.image_base64, 
-            request.crop_id,
-            db
-        )
-        
-        # Save to database
-        detection = DiseaseDetection(
-            crop_id=request.crop_id,
-            disease_name=result.get('disease', 'Unknown'),
-            confidence=float(result.get('confidence', 0)),
-            severity=result.get('severity', 'Unknown'),
-            recommendations=str(result.get('treatment', []))
-        )
-        db.add(detection)
-        db.commit()
-        db.refresh(detection)
-        
-        result['detection_id'] = detection.id
+        crop, processed, image_name = await read_upload(crop_id, image, current_user, db)
+        # Dedup lookup, model call and the detection insert run on a worker thread with a sync session
+        result = await asyncio.to_thread(analyze_crop_image, crop.id, processed.data, processed.mime_type, image_name)
         return DiseaseAnalysisResponse(**result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in disease analysis: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to analyze image: {str(e)}")
 
+def job_response(job) -> dict:
+    return {
+        **job.to_dict(),
+        "status_url": f"/api/disease/jobs/{job.id}",
+        "websocket_url": f"/api/disease/jobs/{job.id}/ws"
+    }
+
+@router.post("/jobs", status_code=202)
+async def submit_disease_job(
+    crop_id: int = Form(...),
+    image: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Queue an uploaded crop photo for analysis; returns a job id to poll or watch over WebSocket"""
+    crop, processed, image_name = await read_upload(crop_id, image, current_user, db)
+    try:
+        job = disease_job_queue.submit(current_user.id, crop.id, image_name, processed.mime_type)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    return job_response(job)
+
+@router.get("/jobs/stats")
+async def get_job_stats(admin_user = Depends(get_admin_user)):
+    """Disease job queue depth, outcomes and timings (admin only)"""
+    return disease_job_queue.stats()
+
+@router.get("/jobs/{job_id}")
+async def get_disease_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Poll an analysis job; `result` is set once status is completed"""
+    job = disease_job_queue.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+@router.websocket("/jobs/{job_id}/ws")
+async def watch_disease_job(websocket: WebSocket, job_id: str, token: str = Query(...)):
+    """Push job status changes until the analysis finishes (browsers pass the JWT as ?token=)"""
+    async with AsyncSessionLocal() as db:
+        try:
+            user = await get_current_user(token, db)
+        except HTTPException:
+            user = None
+    job = disease_job_queue.get(job_id, user.id) if user else None
+    if not job:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    try:
+        while True:
+            await websocket.send_json(jsonable_encoder(job_response(job)))
+            if job.finished:
+                break
+            await disease_job_queue.wait(job, timeout=JOB_WEBSOCKET_HEARTBEAT_SECONDS)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/dedup/stats")
+async def get_dedup_stats(admin_user = Depends(get_admin_user)):
+    """Near-duplicate image hit rate and distance threshold (admin only)"""
+    return disease_image_index.stats()
+
+def image_urls(image_path: Optional[str]) -> dict:
+    if not image_path:
+        return {"image_url": None, "thumbnail_url": None}
+    digest = image_path.split(".", 1)[0]
+    return {
+        "image_url": f"/api/disease/images/{image_path}",
+        "thumbnail_url": f"/api/disease/images/{digest}/thumbnail"
+    }
+
+@router.get("/images/{name}")
+async def get_detection_image(name: str):
+    """Serve a stored detection image by its content hash (unguessable, cacheable forever)"""
+    path = image_store.image_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(path, media_type="image/webp" if name.endswith(".webp") else "image/jpeg", headers=IMMUTABLE_CACHE_HEADERS)
+
+@router.get("/images/{digest}/thumbnail")
+async def get_detection_thumbnail(digest: str):
+    """Serve the thumbnail generated when the image was stored"""
+    path = image_store.existing_thumbnail_path(digest)
+    if not path:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return FileResponse(path, media_type="image/jpeg", headers=IMMUTABLE_CACHE_HEADERS)
+
 @router.get("/history/{crop_id}")
 async def get_disease_history(
     crop_id: int,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get disease detection history for crop"""
-    crop = db.query(Crop).filter(Crop.id == crop_id, Crop.user_id == current_user.id).first()
+    crop = await db.scalar(select(Crop).where(Crop.id == crop_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not crop:
         raise HTTPException(status_code=404, detail="Crop not found")
     
-    detections = db.query(DiseaseDetection).filter(DiseaseDetection.crop_id == crop_id).order_by(DiseaseDetection.detected_at.desc()).all()
-    return {"detections": [{"id": d.id, "disease_name": d.disease_name, "confidence": d.confidence, "severity": d.severity, "detected_at": d.detected_at} for d in detections]}
+    detections, next_cursor = await fetch_page(db, select(DiseaseDetection).where(DiseaseDetection.crop_id == crop_id), DiseaseDetection.detected_at, DiseaseDetection.id, cursor, limit)
+    return {"detections": [{"id": d.id, "disease_name": d.disease_name, "confidence": d.confidence, "severity": d.severity, "detected_at": d.detected_at, **image_urls(d.image_path)} for d in detections], "next_cursor": next_cursor}
 
 @router.get("/chat-history/{detection_id}")
 async def get_disease_chat_history(
     detection_id: int,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get chat history for specific detection"""
-    detection = db.query(DiseaseDetection).join(Crop).filter(DiseaseDetection.id == detection_id, Crop.user_id == current_user.id).first()
+    """Get chat history for specific detection, newest page first; each page is in chronological order and next_cursor goes back in time"""
+    detection = await db.scalar(select(DiseaseDetection).join(Crop).where(DiseaseDetection.id == detection_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not detection:
         raise HTTPException(status_code=404, detail="Detection not found")
     
-    chats = db.query(DiseaseChatHistory).filter(DiseaseChatHistory.detection_id == detection_id).order_by(DiseaseChatHistory.created_at.asc()).all()
-    return {"chat_history": [{"message": c.message, "response": c.response, "created_at": c.created_at} for c in chats]}
+    chats, next_cursor = await fetch_page(db, select(DiseaseChatHistory).where(DiseaseChatHistory.detection_id == detection_id), DiseaseChatHistory.created_at, DiseaseChatHistory.id, cursor, limit)
+    return {"chat_history": [{"id": c.id, "message": c.message, "response": c.response, "created_at": c.created_at} for c in reversed(chats)], "next_cursor": next_cursor}
 
 @router.post("/chat", response_model=DiseaseChatResponse)
 async def chat_about_disease(
     request: DiseaseChatRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Chat about specific disease detection"""
-    detection = db.query(DiseaseDetection).join(Crop).filter(DiseaseDetection.id == request.detection_id, Crop.user_id == current_user.id).first()
-    if not detection:
+    row = (await db.execute(select(DiseaseDetection, Crop.name).join(Crop).where(DiseaseDetection.id == request.detection_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Detection not found")
+    detection, crop_name = row
+    await release_connection(db)
     
     # Extract values before calling service to avoid session issues
     disease_name = detection.disease_name
     crop_id = detection.crop_id
     
-    response = await disease_ai_service.chat_about_disease(disease_name, request.detection_id, request.message, db)
+    response = await disease_ai_service.chat_about_disease(disease_name, request.detection_id, request.message, crop_id, crop_name)
     
-    # Save chat
-    chat = DiseaseChatHistory(detection_id=request.detection_id, message=request.message, response=response)
-    db.add(chat)
-    db.commit()
+    # Save chat (a shed request is not part of the conversation)
+    if response != LLM_BUSY_MESSAGE:
+        db.add(DiseaseChatHistory(detection_id=request.detection_id, message=request.message, response=response))
+        await db.commit()
     
     return DiseaseChatResponse(response=response)
 
@@ -148,17 +258,20 @@ async def chat_about_disease(
 async def delete_disease_detection(
     detection_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete disease detection and its chat history"""
-    detection = db.query(DiseaseDetection).join(Crop).filter(DiseaseDetection.id == detection_id, Crop.user_id == current_user.id).first()
+    detection = await db.scalar(select(DiseaseDetection).join(Crop).where(DiseaseDetection.id == detection_id, Crop.user_id == current_user.id, Crop.deleted_at.is_(None)))
     if not detection:
         raise HTTPException(status_code=404, detail="Detection not found")
     
+    crop_id = detection.crop_id
+    
     # Delete chat history first
-    db.query(DiseaseChatHistory).filter(DiseaseChatHistory.detection_id == detection_id).delete()
+    await db.execute(delete(DiseaseChatHistory).where(DiseaseChatHistory.detection_id == detection_id))
     # Delete detection
-    db.delete(detection)
-    db.commit()
+    await db.delete(detection)
+    await db.commit()
+    crop_context_cache.invalidate(crop_id)
     
     return {"message": "Detection deleted successfully"}
\ No newline at end of file
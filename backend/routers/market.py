@@ -6,10 +6,17 @@ import os
 import pandas as pd
 from datetime import datetime, timedelta
 from io import StringIO
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db, release_connection
 from models import User, Crop, District
 from openai import OpenAI
+from ai.services.llm_dispatcher import llm_dispatcher, LLMOverloadedError, PRIORITY_BATCH
+from ai.config import OPENROUTER_BASE_URL
+from ai.services.market_summary_cache import market_summary_cache, series_key, snapshot_digest
+from ai.services.prompt_budget import prompt_assembler, PromptSection, SECTION_BUDGETS
+from ai.prompts.market_prompts import MARKET_ANALYSIS_PROMPT, MULTI_CROP_ANALYSIS_PROMPT
+from routers.auth import get_admin_user
 # from market_insights import MarketInsightsService  # Commented out as we're using direct API calls
 
 router = APIRouter()
@@ -20,10 +27,11 @@ router = APIRouter()
 MARKET_PRICE_API_KEY = os.getenv("MARKET_PRICE_API_KEY")
 MARKET_PRICE_API_URL = os.getenv("MARKET_PRICE_API_URL", "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+MARKET_MODEL = "deepseek/deepseek-chat-v3.1:free"
 
 # Initialize OpenAI client for DeepSeek
 client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
+    base_url=OPENROUTER_BASE_URL,
     api_key=OPENROUTER_API_KEY,
 ) if OPENROUTER_API_KEY else None
 
@@ -81,7 +89,7 @@ async def get_price_comparison(
     crop: str,
     user_state: str,
     user_district: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Compare prices across nearby markets for the same crop"""
     if not MARKET_PRICE_API_KEY:
@@ -164,7 +172,7 @@ async def get_variety_analysis(
     crop: str,
     state: str,
     district: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Analyze which variety of crop gets better prices"""
     if not MARKET_PRICE_API_KEY:
@@ -229,7 +237,7 @@ async def get_seasonal_pattern(
     crop: str,
     state: str,
     district: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Analyze seasonal price patterns using arrival dates"""
     if not MARKET_PRICE_API_KEY:
@@ -359,7 +367,7 @@ async def get_market_opportunities(
     user_id: str,
     crop: str,
     user_state: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Find best market opportunities across the state using AI analysis"""
     if not MARKET_PRICE_API_KEY or not client:
@@ -422,26 +430,37 @@ Provide practical advice:
 Keep advice practical and under 100 words.
 """
         
-        completion = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://farmersguild.com",
-                "X-Title": "Farmers Guild Market Opportunities",
-            },
-            model="deepseek/deepseek-chat-v3.1:free",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=150,
-            temperature=0.7
-        )
+        try:
+            completion = await llm_dispatcher.acall(MARKET_MODEL, lambda: client.chat.completions.create(
+                extra_headers={
+                    "HTTP-Referer": "https://farmersguild.com",
+                    "X-Title": "Farmers Guild Market Opportunities",
+                },
+                model=MARKET_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=150,
+                temperature=0.7
+            ), priority=PRIORITY_BATCH)
+            ai_recommendation = completion.choices[0].message.content
+        except LLMOverloadedError:
+            # Still return the ranked markets when the model is saturated
+            best = top_opportunities[0] if top_opportunities else None
+            ai_recommendation = f"Best price right now: {best['market']}, {best['district']} at ₹{best['average_price']:.0f}/quintal. Weigh transport costs before travelling." if best else "No market opportunities found."
         
         return {
             "opportunities": top_opportunities,
-            "ai_recommendation": completion.choices[0].message.content,
+            "ai_recommendation": ai_recommendation,
             "total_markets_analyzed": len(opportunities)
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error finding opportunities: {str(e)}")
 
+@router.get("/summary-cache/stats")
+async def get_summary_cache_stats(admin_user = Depends(get_admin_user)):
+    """Shared market summary cache hit ratio, coalesced calls and invalidations (admin only)"""
+    return market_summary_cache.stats()
+
 @router.get("/api-status")
 async def check_api_status():
     """Check if market API and AI are configured"""
@@ -468,27 +487,27 @@ async def check_api_status():
         "api_key_preview": MARKET_PRICE_API_KEY[:10] + "..." if MARKET_PRICE_API_KEY else None,
         "api_url": MARKET_PRICE_API_URL,
         "openrouter_api_loaded": bool(OPENROUTER_API_KEY),
-        "ai_model": "deepseek/deepseek-chat-v3.1:free" if OPENROUTER_API_KEY else "not configured",
+        "ai_model": MARKET_MODEL if OPENROUTER_API_KEY else "not configured",
         "status": "configured" if MARKET_PRICE_API_KEY else "not configured",
         "test_result": test_result,
         "note": "API configured with AI-powered market analysis"
     }
 
 @router.get("/states")
-async def get_states(db: Session = Depends(get_db)):
+async def get_states(db: AsyncSession = Depends(get_read_db)):
     """Get all states from database for dropdown options"""
     try:
-        states = db.query(District.state).distinct().order_by(District.state).all()
+        states = (await db.execute(select(District.state).distinct().order_by(District.state))).all()
         state_list = [state[0] for state in states]
         return {"states": state_list}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching states: {str(e)}")
 
 @router.get("/districts/{state}")
-async def get_districts(state: str, db: Session = Depends(get_db)):
+async def get_districts(state: str, db: AsyncSession = Depends(get_read_db)):
     """Get all districts for a specific state from database for dropdown options"""
     try:
-        districts = db.query(District.name).filter(District.state == state).order_by(District.name).all()
+        districts = (await db.execute(select(District.name).where(District.state == state).order_by(District.name))).all()
         district_list = [district[0] for district in districts]
         return {"districts": district_list}
     except Exception as e:
@@ -586,23 +605,25 @@ async def get_market_insights(
     user_id: str, 
     market_state: Optional[str] = None,
     market_district: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get AI-powered market insights for user's crops using real API data"""
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.scalar(select(User).where(User.id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        user_crops = db.query(Crop).filter(Crop.user_id == user_id).all()
+        user_crops = (await db.scalars(select(Crop).where(Crop.user_id == user_id, Crop.deleted_at.is_(None)))).all()
         if not user_crops:
             raise HTTPException(status_code=400, detail="No crops found for user")
+        await release_connection(db)
         
         if not market_state or not market_district:
             raise HTTPException(status_code=400, detail="Market state and district required")
         
         crop_names = [crop.name for crop in user_crops]
         all_insights = {}
+        crop_summaries = {}
         
         # Get comprehensive historical market data for each crop
         for crop_name in crop_names:
@@ -611,6 +632,7 @@ async def get_market_insights(
                 crop_insight = await get_crop_insights(user_id, crop_name, market_state, market_district, db=db)
                 if crop_insight.get("insights"):
                     all_insights.update(crop_insight["insights"])
+                    crop_summaries[crop_name] = crop_insight["summary"]
                     print(f"✓ Got {crop_insight.get('total_records', 0)} historical records for {crop_name}")
                 else:
                     print(f"⚠️ No insights data for {crop_name}")
@@ -624,7 +646,7 @@ async def get_market_insights(
         else:
             total_historical_records = sum(data.get('historical_data_available', 0) for data in all_insights.values())
             print(f"📈 Generating AI analysis with {total_historical_records} total historical records")
-            summary = await generate_multi_crop_ai_analysis(crop_names, market_district, market_state, all_insights)
+            summary = await generate_multi_crop_ai_analysis(crop_names, market_district, market_state, all_insights, crop_summaries)
         
         # Enhanced response with historical context
         total_records = sum(data.get('historical_data_available', 0) for data in all_insights.values())
@@ -646,7 +668,24 @@ async def get_market_insights(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating insights: {str(e)}")
 
-async def generate_multi_crop_ai_analysis(crops: list, district: str, state: str, insights_data: dict) -> str:
+def assemble_multi_crop_summary(district: str, state: str, insights_data: dict, crop_summaries: dict) -> str:
+    """Combine per-crop summaries (already cached per series) into one multi-crop overview"""
+    sorted_crops = sorted(insights_data.items(), key=lambda x: x[1].get('latest_price', 0), reverse=True)
+    rising_crops = [crop for crop, data in sorted_crops if data.get('trend') == 'rising']
+    falling_crops = [crop for crop, data in sorted_crops if data.get('trend') == 'falling']
+    
+    summary = f"📊 Multi-Crop Market Analysis for {district}, {state}:\n"
+    if rising_crops:
+        summary += f"📈 Rising: {', '.join(rising_crops)} - consider selling first.\n"
+    if falling_crops:
+        summary += f"📉 Falling: {', '.join(falling_crops)} - compare other markets before selling.\n"
+    
+    for crop, data in sorted_crops:
+        trend_emoji = "📈" if data.get('trend') == 'rising' else "📉" if data.get('trend') == 'falling' else "➡️"
+        summary += f"\n{trend_emoji} {crop} (₹{data.get('latest_price', 0):.0f}/quintal):\n{crop_summaries[crop].strip()}\n"
+    return summary
+
+async def generate_multi_crop_ai_analysis(crops: list, district: str, state: str, insights_data: dict, crop_summaries: Optional[dict] = None) -> str:
     """Generate AI analysis for multiple crops with historical context"""
     if not client:
         # Enhanced fallback analysis with historical trends
@@ -673,6 +712,10 @@ async def generate_multi_crop_ai_analysis(crops: list, district: str, state: str
         
         return summary
     
+    # Per-crop summaries are shared per series, so building from them costs no extra model call
+    if crop_summaries and all(crop in crop_summaries for crop in insights_data):
+        return assemble_multi_crop_summary(district, state, insights_data, crop_summaries)
+    
     try:
         # Enhanced multi-crop data preparation with historical trends
         analysis_text = f"Historical Multi-Crop Market Analysis for {district}, {state}:\n\n"
@@ -698,35 +741,26 @@ async def generate_multi_crop_ai_analysis(crops: list, district: str, state: str
         analysis_text += f"• Market Location: {district}, {state}\n"
         analysis_text += f"• Analysis Period: Past month with recent trends\n\n"
         
-        # Enhanced AI prompt with historical context
-        prompt = f"""
-Analyze this comprehensive historical market data to help the farmer make strategic decisions:
-
-{analysis_text}
-
-Based on the month-long historical trends and current market conditions, provide:
-
-1. **Priority Selling**: Which crops should be sold immediately based on price trends?
-2. **Market Strategy**: Which crops need market shopping vs local selling?
-3. **Timing Advice**: Which crops to hold vs sell based on historical patterns?
-4. **Risk Assessment**: Which crops have volatile prices requiring quick action?
-5. **Weekly Action Plan**: Specific steps for the next 7 days.
-
-Use the historical trend data to give strategic, data-driven advice. Keep under 180 words.
-"""
-        
-        completion = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://farmersguild.com",
-                "X-Title": "Farmers Guild Historical Multi-Crop Analysis",
-            },
-            model="deepseek/deepseek-chat-v3.1:free",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.7
-        )
-        
-        return completion.choices[0].message.content
+        # Crops are listed highest price first, so clipping drops the least valuable ones
+        prompt = prompt_assembler.render("multi_crop_analysis", MULTI_CROP_ANALYSIS_PROMPT, [
+            PromptSection("market_data", analysis_text, SECTION_BUDGETS["market_data"])
+        ])
+        
+        async def generate() -> str:
+            completion = await llm_dispatcher.acall(MARKET_MODEL, lambda: client.chat.completions.create(
+                extra_headers={
+                    "HTTP-Referer": "https://farmersguild.com",
+                    "X-Title": "Farmers Guild Historical Multi-Crop Analysis",
+                },
+                model=MARKET_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=300,
+                temperature=0.7
+            ), priority=PRIORITY_BATCH)
+            return completion.choices[0].message.content
+        
+        series = series_key(",".join(sorted(insights_data)), district, state)
+        return await market_summary_cache.get_or_generate(series, snapshot_digest(insights_data), generate)
         
     except Exception as e:
         print(f"Multi-crop AI analysis error: {e}")
@@ -824,40 +858,30 @@ async def generate_ai_market_analysis(crop: str, district: str, state: str, raw_
             for i, record in enumerate(raw_data[:5], 1):
                 market_data_text += f"{i}. {record.get('date', 'N/A')} | {record.get('market', 'N/A')} | ₹{record.get('modal_price', 0):.0f} | {record.get('variety', 'N/A')}\n"
         
-        # Enhanced AI prompt with historical context
-        prompt = f"""
-Analyze this historical market data to provide actionable insights for a farmer:
-
-{market_data_text}
-
-Based on the month-long price history and trends, provide:
-
-1. **Price Assessment**: How does current price compare to the historical range?
-2. **Trend Analysis**: What does the month-over-month data suggest?
-3. **Market Timing**: Should farmer sell now or wait based on historical patterns?
-4. **Market Selection**: Which specific markets show better historical prices?
-5. **Practical Action**: Concrete next steps based on the data trends.
-
-Use the actual historical data to give specific, data-driven advice. Keep under 150 words.
-"""
-        
-        completion = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://farmersguild.com",
-                "X-Title": "Farmers Guild Historical Market Analysis",
-            },
-            model="deepseek/deepseek-chat-v3.1:free",
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            max_tokens=400,
-            temperature=0.7
-        )
+        prompt = prompt_assembler.render("market_analysis", MARKET_ANALYSIS_PROMPT, [
+            PromptSection("market_data", market_data_text, SECTION_BUDGETS["market_data"])
+        ])
+        
+        async def generate() -> str:
+            completion = await llm_dispatcher.acall(MARKET_MODEL, lambda: client.chat.completions.create(
+                extra_headers={
+                    "HTTP-Referer": "https://farmersguild.com",
+                    "X-Title": "Farmers Guild Historical Market Analysis",
+                },
+                model=MARKET_MODEL,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                max_tokens=400,
+                temperature=0.7
+            ), priority=PRIORITY_BATCH)
+            return completion.choices[0].message.content
         
-        return completion.choices[0].message.content
+        # The summary depends only on the series' data, so users in the same district share it
+        return await market_summary_cache.get_or_generate(series_key(crop, district, state), snapshot_digest(raw_data), generate)
         
     except Exception as e:
         print(f"AI analysis error: {e}")
@@ -877,13 +901,15 @@ async def get_crop_insights(
     date_type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get market insights for a specific crop using real API data"""
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.scalar(select(User).where(User.id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        # No connection is held while data.gov.in and the model answer
+        await release_connection(db)
         
         if not market_state or not market_district:
             raise HTTPException(status_code=400, detail="Market state and district required")
@@ -1280,10 +1306,10 @@ async def get_all_states_districts():
         raise HTTPException(status_code=500, detail=f"Error scraping data: {str(e)}")
 
 @router.get("/user-commodities/{user_id}")
-async def get_user_commodities(user_id: str, db: Session = Depends(get_db)):
+async def get_user_commodities(user_id: str, db: AsyncSession = Depends(get_read_db)):
     """Get commodities based on user's crops"""
     try:
-        user_crops = db.query(Crop).filter(Crop.user_id == user_id).all()
+        user_crops = (await db.scalars(select(Crop).where(Crop.user_id == user_id, Crop.deleted_at.is_(None)))).all()
         if not user_crops:
             return {"commodities": []}
         
@@ -1298,7 +1324,7 @@ async def get_user_commodities(user_id: str, db: Session = Depends(get_db)):
 
 
 @router.post("/sync-to-db")
-async def sync_states_districts_to_db(db: Session = Depends(get_db)):
+async def sync_states_districts_to_db(db: AsyncSession = Depends(get_db)):
     """Scrape and save all states and districts from API to database"""
     if not MARKET_PRICE_API_KEY:
         raise HTTPException(status_code=503, detail="Market API not configured")
@@ -1355,30 +1381,30 @@ async def sync_states_districts_to_db(db: Session = Depends(get_db)):
         for _, row in clean_df.iterrows():
             state, district = row["State"], row["District"]
             
-            if not db.query(District).filter(
+            if not await db.scalar(select(District.id).where(
                 District.name == district, District.state == state
-            ).first():
+            )):
                 db.add(District(name=district, state=state))
                 saved_count += 1
         
-        db.commit()
+        await db.commit()
         
         return {
             "message": f"Scraped and saved {saved_count} new districts from API",
             "saved_count": saved_count,
             "total_records_processed": len(clean_df),
-            "total_states": db.query(District.state).distinct().count(),
-            "total_districts": db.query(District).count()
+            "total_states": await db.scalar(select(func.count(District.state.distinct()))),
+            "total_districts": await db.scalar(select(func.count()).select_from(District))
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error syncing: {str(e)}")
 
 @router.get("/states-districts-db")
-async def get_states_districts_from_db(db: Session = Depends(get_db)):
+async def get_states_districts_from_db(db: AsyncSession = Depends(get_read_db)):
     """Get all states with their districts from database for frontend dropdowns"""
     try:
-        districts = db.query(District).order_by(District.state, District.name).all()
+        districts = (await db.scalars(select(District).order_by(District.state, District.name))).all()
         
         if not districts:
             return {"states_districts": {}, "states": [], "total_states": 0, "total_districts": 0}
@@ -1403,9 +1429,9 @@ async def get_states_districts_from_db(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error fetching from database: {str(e)}")
 
 @router.delete("/clear-districts")
-async def clear_all_districts(db: Session = Depends(get_db)):
+async def clear_all_districts(db: AsyncSession = Depends(get_db)):
     """Delete all stored districts from database"""
-    deleted_count = db.query(District).count()
-    db.query(District).delete()
-    db.commit()
+    deleted_count = await db.scalar(select(func.count()).select_from(District))
+    await db.execute(delete(District))
+    await db.commit()
     return {"message": f"Deleted {deleted_count} districts", "deleted_count": deleted_count}
\ No newline at end of file
@@ -1,9 +1,15 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db
-from models import User, Crop, Message, CropCost, Conversation
-from routers.users import get_current_user
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_read_db, pool_stats
+from models import User, Crop, CropCost, UserStatsRollup, PlatformStatsRollup
+from routers.auth import get_current_user, get_admin_user
+from ai.services.llm_dispatcher import llm_dispatcher
+from ai.services.model_router import model_router
+from ai.services.prompt_budget import prompt_assembler
+from ai.services.purge_worker import purge_worker
+from auth_cache import principal_cache
+from passwords import password_hasher
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -14,12 +20,41 @@ class UserStats(BaseModel):
     cost_savings: float
     accuracy_rate: int
 
+async def tombstoned_crops(db: AsyncSession, *conditions):
+    """Count and summed costs of tombstoned crops matching `conditions`.
+
+    The rollup triggers only react to rows being inserted or deleted, so a
+    crop keeps being counted between its tombstone and the purge; readers
+    subtract this share. Pending tombstones are few and found through the
+    partial ix_crops_deleted_at index.
+    """
+    costs = select(func.coalesce(func.sum(CropCost.amount), 0)).where(CropCost.crop_id == Crop.id).correlate(Crop).scalar_subquery()
+    return (await db.execute(
+        select(func.count(Crop.id), func.coalesce(func.sum(costs), 0)).where(Crop.deleted_at.isnot(None), *conditions)
+    )).one()
+
 @router.get("/platform-stats", response_model=UserStats)
-async def get_platform_stats(db: Session = Depends(get_db)):
-    # Platform-wide stats for homepage (all users)
-    total_consultations = db.query(Message).filter(Message.role == 'assistant').count()
-    total_crops = db.query(Crop).count()
-    total_costs = db.query(func.sum(CropCost.amount)).scalar() or 0
+async def get_platform_stats(db: AsyncSession = Depends(get_read_db)):
+    # Platform-wide stats for homepage (all users), summed over the trigger-maintained counter shards
+    total_consultations, total_crops, total_costs = (await db.execute(select(
+        func.coalesce(func.sum(PlatformStatsRollup.ai_consultations), 0),
+        func.coalesce(func.sum(PlatformStatsRollup.crops), 0),
+        func.coalesce(func.sum(PlatformStatsRollup.cost_total), 0)
+    ))).one()
+
+    # Tombstoned accounts still awaiting purge: their own counter rows are their whole share
+    deleted_users = select(User.id).where(User.deleted_at.isnot(None))
+    user_consultations, user_crops, user_costs = (await db.execute(select(
+        func.coalesce(func.sum(UserStatsRollup.ai_consultations), 0),
+        func.coalesce(func.sum(UserStatsRollup.crops), 0),
+        func.coalesce(func.sum(UserStatsRollup.cost_total), 0)
+    ).where(UserStatsRollup.user_id.in_(deleted_users)))).one()
+    # Tombstoned crops of live accounts
+    crops, costs = await tombstoned_crops(db, Crop.user_id.notin_(deleted_users))
+
+    total_consultations -= user_consultations
+    total_crops -= user_crops + crops
+    total_costs -= user_costs + costs
     
     # Use demo data if no real data exists
     return UserStats(
@@ -32,19 +67,18 @@ async def get_platform_stats(db: Session = Depends(get_db)):
 @router.get("/user-stats", response_model=UserStats)
 async def get_user_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # User-specific stats for dashboard
-    ai_consultations = db.query(Message).join(Conversation).filter(
-        Conversation.user_id == current_user.id,
-        Message.role == 'assistant'
-    ).count()
-    
-    active_crops = db.query(Crop).filter(Crop.user_id == current_user.id).count()
-    
-    total_costs = db.query(func.sum(CropCost.amount)).join(Crop).filter(
-        Crop.user_id == current_user.id
-    ).scalar() or 0
+    # User-specific stats for dashboard, from the user's counter row (no row yet means no activity)
+    rollup = await db.get(UserStatsRollup, current_user.id)
+    ai_consultations = rollup.ai_consultations if rollup else 0
+    active_crops = rollup.crops if rollup else 0
+    total_costs = rollup.cost_total if rollup else 0
+
+    # Deleted crops stay in the counters until the purge worker removes them
+    crops, costs = await tombstoned_crops(db, Crop.user_id == current_user.id)
+    active_crops -= crops
+    total_costs -= costs
     
     cost_savings = total_costs * 0.15
     accuracy_rate = 95 if ai_consultations > 0 else 0
@@ -54,4 +88,39 @@ async def get_user_stats(
         active_crops=active_crops,
         cost_savings=cost_savings,
         accuracy_rate=accuracy_rate
-    )
\ No newline at end of file
+    )
+
+@router.get("/llm")
+async def get_llm_stats(admin_user = Depends(get_admin_user)):
+    """Per-model concurrency, queue depth, shed calls and queue-wait / service-time percentiles (admin only)"""
+    return llm_dispatcher.stats()
+
+@router.get("/llm/routing")
+async def get_model_routing_stats(admin_user = Depends(get_admin_user)):
+    """Candidate models per task, TTFT EWMA, latency percentiles and hedge outcomes (admin only)"""
+    return model_router.stats()
+
+@router.get("/prompts")
+async def get_prompt_stats(admin_user = Depends(get_admin_user)):
+    """Prompt tokens per template, clipped sections and section budgets (admin only)"""
+    return prompt_assembler.stats()
+
+@router.get("/db")
+async def get_db_pool_stats(admin_user = Depends(get_admin_user)):
+    """Connection checkout wait and hold-time percentiles for the async and sync pools (admin only)"""
+    return pool_stats()
+
+@router.get("/purge")
+async def get_purge_stats(admin_user = Depends(get_admin_user)):
+    """Crops and accounts purged, rows deleted and batches run by the purge worker (admin only)"""
+    return purge_worker.stats()
+
+@router.get("/auth-cache")
+async def get_auth_cache_stats(admin_user = Depends(get_admin_user)):
+    """Principal cache hits, Redis hits, misses and invalidations (admin only)"""
+    return principal_cache.stats()
+
+@router.get("/passwords")
+async def get_password_hashing_stats(admin_user = Depends(get_admin_user)):
+    """bcrypt pool size, pending calls, shed sign-ins, rehashes and wait / hash-time percentiles (admin only)"""
+    return password_hasher.stats()
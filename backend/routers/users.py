@@ -1,18 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from uuid import UUID
 from database import get_db
 from models import User
-from routers.auth import oauth2_scheme
-from jose import JWTError, jwt
-import os
+from routers.auth import get_current_user
+from auth_cache import principal_cache
+from ai.services.purge_worker import purge_worker
+from datetime import datetime
 
 router = APIRouter()
 
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
-ALGORITHM = "HS256"
-
 class UserResponse(BaseModel):
     id: str
     email: str
@@ -37,18 +35,15 @@ class ProfileUpdate(BaseModel):
     is_available_for_work: bool = None
     max_travel_distance_km: int = None
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
+async def load_current_user(db: AsyncSession, current_user: User) -> User:
+    """The caller's row in this session; 401 if it was deleted since another worker cached the principal"""
+    user = await db.get(User, current_user.id)
+    if user is None or user.deleted_at is not None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 @router.get("/me", response_model=UserResponse)
@@ -68,39 +63,46 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 async def update_profile(
     profile: ProfileUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    # current_user comes from the principal cache, detached from this session
+    user = await load_current_user(db, current_user)
     if profile.name is not None:
-        current_user.name = profile.name
+        user.name = profile.name
     if profile.state is not None:
-        current_user.state = profile.state
+        user.state = profile.state
     if profile.district is not None:
-        current_user.district = profile.district
+        user.district = profile.district
     if profile.location is not None:
-        current_user.location = profile.location
+        user.location = profile.location
     if profile.is_available_for_work is not None:
-        current_user.is_available_for_work = profile.is_available_for_work
+        user.is_available_for_work = profile.is_available_for_work
     if profile.max_travel_distance_km is not None:
-        current_user.max_travel_distance_km = profile.max_travel_distance_km
+        user.max_travel_distance_km = profile.max_travel_distance_km
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await principal_cache.invalidate(user.email)
     return UserResponse(
-        id=str(current_user.id),
-        email=current_user.email,
-        name=current_user.name or "",
-        state=current_user.state or "",
-        district=current_user.district or "",
-        location=current_user.location or "",
-        is_available_for_work=current_user.is_available_for_work or False,
-        max_travel_distance_km=current_user.max_travel_distance_km or 25
+        id=str(user.id),
+        email=user.email,
+        name=user.name or "",
+        state=user.state or "",
+        district=user.district or "",
+        location=user.location or "",
+        is_available_for_work=user.is_available_for_work or False,
+        max_travel_distance_km=user.max_travel_distance_km or 25
     )
 
 @router.delete("/account")
 async def delete_account(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    db.delete(current_user)
-    db.commit()
+    # Tombstone now (the token stops resolving and the email is free again); the purge worker removes the data
+    user = await load_current_user(db, current_user)
+    user.deleted_at = datetime.utcnow()
+    user.email = None
+    await db.commit()
+    await principal_cache.invalidate(current_user.email)
+    purge_worker.wake()
     return {"message": "Account deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+import pytest
+
+def seed_conversations(engine, user_id, conversations: int, messages_each: int, tied: int = 0):
+    """`conversations` conversations with `messages_each` messages each; the first `tied` share one timestamp"""
+    start = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO conversations (id, user_id, title, created_at, last_message_at)
+            SELECT gen_random_uuid(), :user_id, 'chat ' || g, t, t
+            FROM generate_series(1, :conversations) g,
+                 LATERAL (SELECT CASE WHEN g <= :tied THEN CAST(:start AS timestamp) ELSE CAST(:start AS timestamp) + g * interval '1 minute' END AS t) times
+        """), {"user_id": user_id, "conversations": conversations, "tied": tied, "start": start})
+        conn.execute(text("""
+            INSERT INTO messages (id, conversation_id, content, role, created_at)
+            SELECT gen_random_uuid(), c.id, 'message ' || g, CASE WHEN g % 2 = 0 THEN 'assistant' ELSE 'user' END,
+                   c.created_at + g * interval '1 second'
+            FROM conversations c, generate_series(1, :messages) g
+            WHERE c.user_id = :user_id
+        """), {"user_id": user_id, "messages": messages_each})
+
+def expected_order(engine, user_id) -> list:
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id FROM conversations WHERE user_id = :user_id ORDER BY last_message_at DESC, id DESC"), {"user_id": user_id})
+        return [str(row.id) for row in rows]
+
+def fetch(client, headers, **params):
+    response = client.get("/api/chat/conversations", headers=headers, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def statements_for_page(client, headers, count_statements, **params) -> int:
+    fetch(client, headers, limit=1)  # principal now cached, so only the page's own queries are counted
+    with count_statements() as statements:
+        fetch(client, headers, **params)
+    return len(statements)
+
+@pytest.mark.parametrize("limit", [1, 5, 50])
+def test_statement_count_does_not_grow_with_page_size(client, engine, user, count_statements, limit):
+    user_id, headers = user
+    seed_conversations(engine, user_id, conversations=60, messages_each=3)
+    assert statements_for_page(client, headers, count_statements, limit=limit) == 2
+
+def test_statement_count_does_not_grow_with_message_count(client, engine, user, count_statements):
+    user_id, headers = user
+    seed_conversations(engine, user_id, conversations=10, messages_each=200)
+    assert statements_for_page(client, headers, count_statements, limit=10) == 2
+    page = fetch(client, headers, limit=10)
+    assert all(conversation["message_count"] == 200 for conversation in page["conversations"])
+
+def test_empty_page_runs_a_single_statement(client, user, count_statements):
+    _, headers = user
+    assert statements_for_page(client, headers, count_statements, limit=20) == 1
+
+def test_cursor_pages_cover_every_conversation_once(client, engine, user):
+    user_id, headers = user
+    # Ties on last_message_at straddle page boundaries; the id tie-break must keep them stable
+    seed_conversations(engine, user_id, conversations=47, messages_each=2, tied=12)
+    seen, cursor = [], None
+    while True:
+        page = fetch(client, headers, limit=5, **({"cursor": cursor} if cursor else {}))
+        seen.extend(conversation["id"] for conversation in page["conversations"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen))
+    assert seen == expected_order(engine, user_id)
+
+def test_preview_holds_latest_messages_oldest_first(client, engine, user):
+    from routers.chat import CONVERSATION_PREVIEW_MESSAGES
+    user_id, headers = user
+    seed_conversations(engine, user_id, conversations=1, messages_each=CONVERSATION_PREVIEW_MESSAGES + 3)
+    conversation = fetch(client, headers)["conversations"][0]
+    contents = [message["content"] for message in conversation["messages"]]
+    total = CONVERSATION_PREVIEW_MESSAGES + 3
+    assert contents == [f"message {g}" for g in range(total - CONVERSATION_PREVIEW_MESSAGES + 1, total + 1)]
+
+def test_invalid_cursor_is_rejected(client, user):
+    _, headers = user
+    response = client.get("/api/chat/conversations", headers=headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_follow_up_moves_conversation_to_the_top(client, engine, user):
+    user_id, headers = user
+    seed_conversations(engine, user_id, conversations=3, messages_each=2)
+    oldest = expected_order(engine, user_id)[-1]
+    response = client.post("/api/chat/send", headers=headers, params={"conversation_id": oldest}, json={"content": "one more question"})
+    assert response.status_code == 200, response.text
+    assert fetch(client, headers)["conversations"][0]["id"] == oldest
@@ -0,0 +1,27 @@
+from sqlalchemy import text
+
+def test_crop_history_reads_only_the_newest_turns(client, engine, user):
+    from sqlalchemy import event
+    from database import SessionLocal
+    from ai.memory.crop_memory import PostgreSQLChatMessageHistory
+    _, headers = user
+    crop_id = client.post("/api/crops/", headers=headers, json={"name": "Long-memory rice"}).json()["id"]
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO crop_conversations (crop_id, message, response, created_at)
+            SELECT :crop_id, 'question ' || g, 'answer ' || g, now() - (500 - g) * interval '1 minute'
+            FROM generate_series(1, 500) g
+        """), {"crop_id": crop_id})
+
+    statements = []
+    record = lambda conn, cursor, statement, parameters, context, executemany: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with SessionLocal() as db:
+            messages = PostgreSQLChatMessageHistory(crop_id, db, max_turns=5).messages
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # The newest five exchanges, oldest first, read with a LIMIT rather than the whole history
+    assert [message.content for message in messages] == [f"{kind} {g}" for g in range(496, 501) for kind in ("question", "answer")]
+    assert any("LIMIT" in statement for statement in statements)
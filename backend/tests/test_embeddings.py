@@ -0,0 +1,86 @@
+import math
+import uuid
+import pytest
+from ai.services.embeddings import EMBEDDING_DIM, LocalHashEmbeddingProvider
+
+def cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+def test_local_embeddings_are_deterministic():
+    text = "Yellow leaves on tomato plants after heavy rain"
+    first = LocalHashEmbeddingProvider().embed(text)
+    assert first == LocalHashEmbeddingProvider().embed(text)
+    assert LocalHashEmbeddingProvider().embed_batch([text, "other"])[0] == first
+
+@pytest.mark.parametrize("text", ["", "wheat", "irrigation schedule for paddy in the dry season " * 20])
+def test_local_embeddings_are_unit_vectors_of_the_configured_dimension(text):
+    vector = LocalHashEmbeddingProvider().embed(text)
+    assert len(vector) == EMBEDDING_DIM
+    assert math.isclose(math.sqrt(sum(value * value for value in vector)), 1.0, rel_tol=1e-9)
+
+def test_shared_vocabulary_lands_closer():
+    provider = LocalHashEmbeddingProvider()
+    query = provider.embed("tomato leaf blight")
+    assert cosine(query, provider.embed("blight spots on tomato leaf")) > cosine(query, provider.embed("market price of onions"))
+
+def seed_messages(engine, user_id, contents):
+    """One conversation holding `contents`, embedded with the local provider"""
+    from database import SessionLocal
+    from models import Conversation, Message
+    provider = LocalHashEmbeddingProvider()
+    with SessionLocal() as db:
+        conversation = Conversation(id=uuid.uuid4(), user_id=user_id, title="search")
+        db.add(conversation)
+        db.add_all(
+            Message(id=uuid.uuid4(), conversation_id=conversation.id, content=content, role="user", embedding=embedding)
+            for content, embedding in zip(contents, provider.embed_batch(contents))
+        )
+        db.commit()
+
+@pytest.fixture
+def two_users_with_messages(client, engine, user):
+    user_id, headers = user
+    response = client.post("/api/auth/register", json={"email": f"test-{uuid.uuid4().hex}@example.com", "password": "secret", "name": "Other"})
+    other_id = uuid.UUID(response.json()["user_id"])
+    mine = ["tomato leaf blight after rain", "watering schedule for wheat", "price of onions at the mandi"]
+    # The other user's rows match the query better, so any leak across users would rank first
+    theirs = ["tomato leaf blight", "tomato leaf blight spreading fast", "tomato blight treatment"]
+    seed_messages(engine, user_id, mine)
+    seed_messages(engine, other_id, theirs)
+    return headers, set(mine)
+
+@pytest.mark.parametrize("path", ["exact", "ann"])
+def test_search_returns_only_the_callers_messages(client, two_users_with_messages, count_statements, monkeypatch, path):
+    import routers.chat
+    headers, mine = two_users_with_messages
+    # Users under SEARCH_EXACT_MAX_ROWS are ranked exactly; 0 sends everyone through the HNSW index
+    monkeypatch.setattr(routers.chat, "SEARCH_EXACT_MAX_ROWS", 10000 if path == "exact" else 0)
+    with count_statements() as statements:
+        response = client.post("/api/chat/search", headers=headers, params={"query": "tomato leaf blight", "limit": 10})
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert {result["content"] for result in results} == mine
+    assert results[0]["content"] == "tomato leaf blight after rain"
+    assert [result["similarity"] for result in results] == sorted((result["similarity"] for result in results), reverse=True)
+    exact_scan = any("enable_indexscan = off" in statement for statement in statements)
+    assert exact_scan == (path == "exact")
+
+def test_backfill_retries_a_failed_batch_from_its_cursor(monkeypatch):
+    from ai.services import embedding_pipeline as pipeline_module
+    from ai.services.embedding_pipeline import EmbeddingPipeline
+    from models import Message
+    pipeline = EmbeddingPipeline(LocalHashEmbeddingProvider(), batch_size=2, backfill_retry_seconds=0)
+    pending = [(Message, 1, "a"), (Message, 2, "b"), (Message, 3, "c")]
+    monkeypatch.setattr(pipeline_module, "EMBEDDED_MODELS", {"messages": Message})
+    monkeypatch.setattr(pipeline, "_pending_batch", lambda name, model: [item for item in pending if item[1] > (pipeline.backfill_cursor.get(name) or 0)][:2])
+    stored, failures = [], [RuntimeError("provider unavailable")]
+
+    def embed_and_store(items):
+        if failures:
+            raise failures.pop()
+        stored.extend(row_id for _, row_id, _ in items)
+    monkeypatch.setattr(pipeline, "embed_and_store", embed_and_store)
+
+    assert pipeline.backfill() == 3
+    assert stored == [1, 2, 3]
+    assert pipeline.metrics["backfill_errors"] == 1
@@ -0,0 +1,44 @@
+from sqlalchemy import text
+
+def test_crop_chat_history_pages_back_in_time(client, engine, user):
+    _, headers = user
+    crop_id = client.post("/api/crops/", headers=headers, json={"name": "Paged wheat"}).json()["id"]
+    with engine.begin() as conn:
+        # Pairs of equal timestamps exercise the id tie-break
+        conn.execute(text("""
+            INSERT INTO crop_conversations (crop_id, message, response, created_at)
+            SELECT :crop_id, 'question ' || g, 'answer ' || g, now() - (g / 2) * interval '1 minute'
+            FROM generate_series(1, 45) g
+        """), {"crop_id": crop_id})
+        expected = conn.scalars(text("SELECT id FROM crop_conversations WHERE crop_id = :crop_id ORDER BY created_at, id"), {"crop_id": crop_id}).all()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = client.get(f"/api/crop-data/chat-history/{crop_id}", headers=headers, params={"cursor": cursor} if cursor else {})
+        assert response.status_code == 200, response.text
+        page = response.json()
+        ids = [turn["id"] for turn in page["chat_history"]]
+        # Each page is chronological, and older pages go in front, as the chat panels prepend them
+        assert [turn["created_at"] for turn in page["chat_history"]] == sorted(turn["created_at"] for turn in page["chat_history"])
+        seen = ids + seen
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert pages == 3
+    assert seen == expected
+
+def test_rows_inserted_without_a_timestamp_still_page(client, engine, user):
+    _, headers = user
+    crop_id = client.post("/api/crops/", headers=headers, json={"name": "Raw SQL wheat"}).json()["id"]
+    with engine.begin() as conn:
+        # Raw SQL and COPY skip the ORM's Python-side default; the database fills the cursor column
+        conn.execute(text("""
+            INSERT INTO crop_costs (crop_id, expense_type, amount)
+            SELECT :crop_id, 'seed', g FROM generate_series(1, 25) g
+        """), {"crop_id": crop_id})
+    first = client.get(f"/api/crop-data/costs/{crop_id}", headers=headers)
+    assert first.status_code == 200, first.text
+    second = client.get(f"/api/crop-data/costs/{crop_id}", headers=headers, params={"cursor": first.json()["next_cursor"]})
+    assert second.status_code == 200, second.text
+    assert len(first.json()["costs"]) + len(second.json()["costs"]) == 25
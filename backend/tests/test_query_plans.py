@@ -0,0 +1,121 @@
+"""
+Query-plan regression tests for crop-scoped history and context queries.
+
+Seeds the history tables until they are large enough for the planner to prefer
+indexes, then EXPLAINs each hot query as the routers build it and requires a
+range read of its index from migrations/versions/0003, 0007 or 0008 (index,
+index-only or bitmap scan) with no sequential scan. Dropping one of those
+indexes, or changing a query so it can no longer use it, fails here.
+"""
+import json
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, text
+from pagination import PAGE_SIZE_DEFAULT, keyset, encode_cursor
+from models import User, Crop, Conversation, Message, CropConversation, ActivityLog, DiseaseDetection, CropCost, DiseaseChatHistory, WeatherAlert
+
+CROPS = 500
+ROWS_PER_CROP = 40
+SEED_EMAIL = "plans-0@example.com"
+
+@pytest.fixture(scope="module")
+def seeded(engine):
+    """(crop id, user id, detection id, conversation id) from a seeded data set, reused when already present"""
+    with engine.begin() as conn:
+        if not conn.scalar(select(User.id).where(User.email == SEED_EMAIL)):
+            seed(conn)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+        user_id = conn.scalar(select(User.id).where(User.email == SEED_EMAIL))
+        crop_id = conn.scalar(select(Crop.id).where(Crop.user_id == user_id).order_by(Crop.id).limit(1))
+        detection_id = conn.scalar(select(DiseaseDetection.id).where(DiseaseDetection.crop_id == crop_id).limit(1))
+        conversation_id = conn.scalar(select(Conversation.id).where(Conversation.user_id == user_id).limit(1))
+    return crop_id, user_id, detection_id, conversation_id
+
+def seed(conn):
+    users = [uuid.uuid4() for _ in range(CROPS // 10)]
+    conn.execute(User.__table__.insert(), [
+        {"id": user_id, "email": f"plans-{i}@example.com", "name": f"Plans {i}", "hashed_password": "x"}
+        for i, user_id in enumerate(users)
+    ])
+    conn.execute(text("""
+        INSERT INTO crops (name, user_id, created_at)
+        SELECT 'crop ' || g, u.ids[1 + g % array_length(u.ids, 1)], now() - g * interval '1 hour'
+        FROM generate_series(1, :crops) g,
+             (SELECT array_agg(id) AS ids FROM users WHERE email LIKE 'plans-%') u
+    """), {"crops": CROPS})
+    per_crop = {"rows": ROWS_PER_CROP}
+    history = {
+        "crop_conversations (crop_id, message, response, created_at)": "c.id, 'question ' || g, 'answer ' || g, now() - g * interval '1 minute'",
+        "activity_logs (crop_id, activity_type, description, performed_at)": "c.id, 'watering', 'log ' || g, now() - g * interval '1 hour'",
+        "disease_detections (crop_id, disease_name, confidence, detected_at)": "c.id, 'blight', random(), now() - g * interval '1 day'",
+        "crop_costs (crop_id, expense_type, amount, date)": "c.id, 'seed', random() * 1000, now() - g * interval '1 day'",
+        "weather_alerts (crop_id, alert_type, description, created_at)": "c.id, 'rain', 'alert ' || g, now() - g * interval '1 hour'",
+    }
+    for target, values in history.items():
+        conn.execute(text(f"INSERT INTO {target} SELECT {values} FROM crops c JOIN users u ON u.id = c.user_id, generate_series(1, :rows) g WHERE u.email LIKE 'plans-%'"), per_crop)
+    conn.execute(text("""
+        INSERT INTO disease_chat_history (detection_id, message, response, created_at)
+        SELECT d.id, 'question', 'answer', now() - g * interval '1 minute'
+        FROM disease_detections d, generate_series(1, 3) g
+    """))
+    # A send creates one conversation per exchange, so heavy users have many short ones
+    conn.execute(text("""
+        INSERT INTO conversations (id, user_id, title, created_at)
+        SELECT gen_random_uuid(), u.id, 'chat ' || g, now() - g * interval '1 minute'
+        FROM users u, generate_series(1, :rows * 10) g WHERE u.email LIKE 'plans-%'
+    """), per_crop)
+    conn.execute(text("""
+        INSERT INTO messages (id, conversation_id, content, role, created_at)
+        SELECT gen_random_uuid(), c.id, 'message ' || g, 'user', c.created_at + g * interval '1 second'
+        FROM conversations c JOIN users u ON u.id = c.user_id, generate_series(1, 2) g WHERE u.email LIKE 'plans-%'
+    """))
+
+def page(statement, timestamp_column, id_column, cursor=None):
+    """A keyset page as the history endpoints build it"""
+    return keyset(statement, timestamp_column, id_column, cursor, PAGE_SIZE_DEFAULT)
+
+# (label, statement builder taking (crop_id, user_id, detection_id, conversation_id), expected index or indexes)
+HOT_QUERIES = [
+    ("crops list", lambda crop, user, detection, conversation: select(Crop).where(Crop.user_id == user).order_by(Crop.created_at.desc()), "ix_crops_user_id_created_at"),
+    ("crop chat history", lambda crop, user, detection, conversation: page(select(CropConversation).where(CropConversation.crop_id == crop), CropConversation.created_at, CropConversation.id), "ix_crop_conversations_crop_id_created_at"),
+    ("activity logs", lambda crop, user, detection, conversation: page(select(ActivityLog).where(ActivityLog.crop_id == crop), ActivityLog.performed_at, ActivityLog.id), "ix_activity_logs_crop_id_performed_at"),
+    ("activity logs, page 2", lambda crop, user, detection, conversation: page(
+        select(ActivityLog).where(ActivityLog.crop_id == crop), ActivityLog.performed_at, ActivityLog.id,
+        encode_cursor(datetime.now() - timedelta(hours=20), 2 ** 31 - 1)
+    ), "ix_activity_logs_crop_id_performed_at"),
+    ("context activities", lambda crop, user, detection, conversation: select(ActivityLog).where(ActivityLog.crop_id == crop).order_by(ActivityLog.performed_at.desc()).limit(5), "ix_activity_logs_crop_id_performed_at"),
+    ("disease detections", lambda crop, user, detection, conversation: page(select(DiseaseDetection).where(DiseaseDetection.crop_id == crop), DiseaseDetection.detected_at, DiseaseDetection.id), "ix_disease_detections_crop_id_detected_at"),
+    ("crop costs", lambda crop, user, detection, conversation: page(select(CropCost).where(CropCost.crop_id == crop), CropCost.date, CropCost.id), "ix_crop_costs_crop_id_date"),
+    ("disease chat history", lambda crop, user, detection, conversation: page(select(DiseaseChatHistory).where(DiseaseChatHistory.detection_id == detection), DiseaseChatHistory.created_at, DiseaseChatHistory.id), "ix_disease_chat_history_detection_id_created_at"),
+    ("context weather", lambda crop, user, detection, conversation: select(WeatherAlert).where(WeatherAlert.crop_id == crop).order_by(WeatherAlert.created_at.desc()).limit(3), "ix_weather_alerts_crop_id_created_at"),
+    ("conversations list", lambda crop, user, detection, conversation: page(select(Conversation).where(Conversation.user_id == user), Conversation.last_message_at, Conversation.id), "ix_conversations_user_id_last_message_at"),
+    ("conversation messages", lambda crop, user, detection, conversation: select(Message).where(Message.conversation_id == conversation).order_by(Message.created_at),
+        # Two-message conversations are cheap to sort either way, so the older single-column index may win
+        ("ix_messages_conversation_id_created_at", "ix_messages_conversation_id")),
+    # Seeded history has no embeddings, so every row is pending and the primary key reads as cheaply as the partial index
+    ("embedding backfill", lambda crop, user, detection, conversation: select(Message).where(Message.embedding.is_(None)).order_by(Message.id).limit(64),
+        ("ix_messages_embedding_pending", "messages_pkey")),
+    ("embedding backfill, next batch", lambda crop, user, detection, conversation: select(CropConversation).where(CropConversation.embedding.is_(None), CropConversation.id > 1000).order_by(CropConversation.id).limit(64),
+        ("ix_crop_conversations_embedding_pending", "crop_conversations_pkey")),
+]
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+@pytest.mark.parametrize("label, build, index", HOT_QUERIES, ids=[label for label, _, _ in HOT_QUERIES])
+def test_hot_query_reads_its_composite_index(engine, seeded, label, build, index):
+    statement = build(*seeded)
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    plan = plan if isinstance(plan, list) else json.loads(plan)
+    nodes = list(plan_nodes(plan[0]["Plan"]))
+    indexes = index if isinstance(index, tuple) else (index,)
+    scans = {node["Node Type"] for node in nodes if node.get("Index Name") in indexes}
+    assert scans & {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}, f"{label} does not use {index}: {json.dumps(plan)}"
+    seq_scans = [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"]
+    assert not seq_scans, f"{label} scans {seq_scans} sequentially"
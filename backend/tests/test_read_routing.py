@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+import uuid
+import pytest
+from jose import jwt
+
+@pytest.fixture
+def noted_writes(client, monkeypatch):
+    """Subjects the read-your-writes middleware records, in order"""
+    import main
+    noted = []
+    monkeypatch.setattr(main.replica_router, "note_write", noted.append)
+    return noted
+
+def forged_token(email):
+    return jwt.encode({"sub": email, "exp": datetime.utcnow() + timedelta(minutes=5)}, "not-the-secret-key", algorithm="HS256")
+
+def test_successful_write_pins_the_verified_subject(client, user, noted_writes):
+    _, headers = user
+    email = client.get("/api/users/me", headers=headers).json()["email"]
+    response = client.put("/api/users/profile", headers=headers, json={"name": "Renamed"})
+    assert response.status_code == 200, response.text
+    assert noted_writes == [email]
+
+def test_failed_write_pins_nothing(client, user, noted_writes):
+    _, headers = user
+    response = client.put("/api/users/profile", headers=headers, json={"max_travel_distance_km": "far"})
+    assert response.status_code == 422
+    assert noted_writes == []
+
+def test_forged_token_pins_nothing(client, noted_writes):
+    email = f"test-{uuid.uuid4().hex}@example.com"
+    client.post("/api/auth/register", json={"email": email, "password": "secret", "name": "Forged"})
+    noted_writes.clear()
+    # The login succeeds, but the bearer token sent along is not signed by us
+    response = client.post(
+        "/api/auth/login", json={"email": email, "password": "secret"},
+        headers={"Authorization": f"Bearer {forged_token('victim@example.com')}"}
+    )
+    assert response.status_code == 200, response.text
+    response = client.put("/api/users/profile", headers={"Authorization": f"Bearer {forged_token(email)}"}, json={"name": "x"})
+    assert response.status_code == 401
+    assert noted_writes == [None]
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import text
+
+@pytest.fixture
+def purge_paused(client, monkeypatch):
+    """Keep the purge worker from removing tombstones while a test looks at them"""
+    from ai.services.purge_worker import purge_worker
+    monkeypatch.setattr(purge_worker, "purge_pending", lambda: 0)
+
+def seed_crops(engine, user_id, amounts):
+    """One crop per amount, each with a single cost row of that amount; returns the crop ids"""
+    with engine.begin() as conn:
+        crop_ids = []
+        for amount in amounts:
+            crop_id = conn.scalar(text("INSERT INTO crops (name, user_id) VALUES ('Stats test', :user_id) RETURNING id"), {"user_id": user_id})
+            conn.execute(text("INSERT INTO crop_costs (crop_id, expense_type, amount) VALUES (:crop_id, 'seed', :amount)"), {"crop_id": crop_id, "amount": amount})
+            crop_ids.append(crop_id)
+        return crop_ids
+
+def test_deleted_crop_leaves_user_stats_before_purge(client, engine, user, purge_paused):
+    user_id, headers = user
+    kept, deleted = seed_crops(engine, user_id, [100.0, 900.0])
+
+    response = client.delete(f"/api/crops/{deleted}", headers=headers)
+    assert response.status_code == 200, response.text
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT deleted_at IS NOT NULL FROM crops WHERE id = :id"), {"id": deleted})
+
+    stats = client.get("/api/stats/user-stats", headers=headers).json()
+    assert stats["active_crops"] == 1
+    assert stats["cost_savings"] == pytest.approx(100.0 * 0.15)
+
+def test_platform_stats_skip_tombstoned_crops_and_accounts(client, engine, user, purge_paused):
+    user_id, headers = user
+    crop_ids = seed_crops(engine, user_id, [10000.0] * 20)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE crops SET deleted_at = now() WHERE id = :id"), {"id": crop_ids[0]})
+    other = client.post("/api/auth/register", json={"email": f"stats-{user_id.hex}@example.com", "password": "secret", "name": "Gone"}).json()
+    seed_crops(engine, other["user_id"], [50000.0] * 5)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET deleted_at = now(), email = NULL WHERE id = :id"), {"id": other["user_id"]})
+
+    with engine.connect() as conn:
+        live_crops, live_costs = conn.execute(text("""
+            SELECT count(DISTINCT c.id), coalesce(sum(cc.amount), 0)
+            FROM crops c JOIN users u ON u.id = c.user_id LEFT JOIN crop_costs cc ON cc.crop_id = c.id
+            WHERE c.deleted_at IS NULL AND u.deleted_at IS NULL
+        """)).one()
+
+    stats = client.get("/api/stats/platform-stats").json()
+    assert stats["active_crops"] == max(live_crops, 12)
+    assert stats["cost_savings"] == pytest.approx(max(live_costs * 0.15, 15000))
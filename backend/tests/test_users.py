@@ -0,0 +1,31 @@
+import uuid
+import pytest
+from sqlalchemy import text
+
+@pytest.mark.parametrize("removal", [
+    "DELETE FROM users WHERE id = :id",
+    "UPDATE users SET deleted_at = now() WHERE id = :id",
+], ids=["purged", "tombstoned"])
+def test_stale_cached_principal_gets_401(client, engine, user, removal):
+    user_id, headers = user
+    # Warm the principal cache, then remove the row behind its back, as another worker would
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    with engine.begin() as conn:
+        conn.execute(text(removal), {"id": user_id})
+    assert client.put("/api/users/profile", headers=headers, json={"name": "Ghost"}).status_code == 401
+    assert client.delete("/api/users/account", headers=headers).status_code == 401
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT name FROM users WHERE id = :id"), {"id": user_id}) in (None, "Test")
+
+def test_reregistered_email_does_not_reuse_the_deleted_users_cache_entry(client, engine):
+    email = f"test-{uuid.uuid4().hex}@example.com"
+    old = client.post("/api/auth/register", json={"email": email, "password": "secret", "name": "Old"}).json()
+    old_headers = {"Authorization": f"Bearer {old['access_token']}"}
+    assert client.get("/api/users/me", headers=old_headers).json()["id"] == old["user_id"]
+    # Deleted on another worker: this worker's cache entry for the email is not invalidated
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET deleted_at = now(), email = NULL WHERE id = :id"), {"id": old["user_id"]})
+    new = client.post("/api/auth/register", json={"email": email, "password": "secret", "name": "New"}).json()
+    new_headers = {"Authorization": f"Bearer {new['access_token']}"}
+    assert client.get("/api/users/me", headers=new_headers).json()["id"] == new["user_id"]
+    assert client.get("/api/users/me", headers=old_headers).status_code == 401
@@ -4,6 +4,8 @@ import { motion } from 'framer-motion'
 
 const CostTracker = ({ cropId, cropName }) => {
   const [costs, setCosts] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [total, setTotal] = useState({ total_cost: 0, breakdown: {} })
   const [showForm, setShowForm] = useState(false)
   const [newCost, setNewCost] = useState({
@@ -22,21 +24,30 @@ const CostTracker = ({ cropId, cropName }) => {
     }
   }, [cropId])
 
-  const fetchCosts = async () => {
+  // Newest page first; passing the previous page's next_cursor appends the next older page
+  const fetchCosts = async (cursor = null) => {
     try {
       const token = localStorage.getItem('token')
-      const response = await fetch(`http://localhost:8000/api/costs/crop/${cropId}`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''
+      const response = await fetch(`http://localhost:8000/api/costs/crop/${cropId}${query}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       if (response.ok) {
         const data = await response.json()
-        setCosts(data)
+        setCosts(prev => cursor ? [...prev, ...data.costs] : data.costs)
+        setNextCursor(data.next_cursor)
       }
     } catch (error) {
       console.error('Error fetching costs:', error)
     }
   }
 
+  const loadMoreCosts = async () => {
+    setLoadingMore(true)
+    await fetchCosts(nextCursor)
+    setLoadingMore(false)
+  }
+
   const fetchTotal = async () => {
     try {
       const token = localStorage.getItem('token')
@@ -87,7 +98,8 @@ const CostTracker = ({ cropId, cropName }) => {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       if (response.ok) {
-        fetchCosts()
+        // Drop it in place so older pages already loaded stay on screen
+        setCosts(prev => prev.filter(cost => cost.id !== costId))
         fetchTotal()
       }
     } catch (error) {
@@ -267,7 +279,7 @@ const CostTracker = ({ cropId, cropName }) => {
                 key={cost.id}
                 initial={{ opacity: 0, x: -20 }}
                 animate={{ opacity: 1, x: 0 }}
-                transition={{ delay: 0.1 * index }}
+                transition={{ delay: Math.min(0.1 * index, 1) }}
                 className="glass-card p-4 rounded-xl border border-white/20 hover:bg-white/10 transition-all"
               >
                 <div className="flex items-center justify-between">
@@ -302,6 +314,15 @@ const CostTracker = ({ cropId, cropName }) => {
                 </div>
               </motion.div>
             ))}
+            {nextCursor && (
+              <button
+                onClick={loadMoreCosts}
+                disabled={loadingMore}
+                className="w-full px-4 py-3 border border-white/20 text-text-secondary rounded-lg hover:bg-white/10 transition-colors disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load older expenses'}
+              </button>
+            )}
           </div>
         )}
       </motion.div>
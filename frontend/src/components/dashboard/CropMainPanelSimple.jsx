@@ -30,6 +30,11 @@ const CropMainPanelSimple = ({ selectedCrop, onBackToSidebar, showBackButton })
   const [showTreatment, setShowTreatment] = useState(false)
   const [diseaseView, setDiseaseView] = useState('history') // 'history', 'upload', 'result'
   
+  // next_cursor of the last history page loaded; null once everything is on screen
+  const [chatCursor, setChatCursor] = useState(null)
+  const [diseaseCursor, setDiseaseCursor] = useState(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
+  
   // Load crop-specific data when crop changes
   useEffect(() => {
     if (selectedCrop) {
@@ -44,44 +49,69 @@ const CropMainPanelSimple = ({ selectedCrop, onBackToSidebar, showBackButton })
       // Clear existing data first
       setMessages([])
       setDiseaseHistory([])
+      setChatCursor(null)
+      setDiseaseCursor(null)
       
-      // Load chat history
-      const chatResponse = await api.getCropChatHistory(cropId)
-      if (chatResponse.ok) {
-        const chatData = await chatResponse.json()
-        const chatMessages = []
-        chatData.chat_history.forEach(conv => {
-          chatMessages.push({ id: `user-${conv.id}`, type: 'user', content: conv.message, timestamp: new Date(conv.created_at) })
-          chatMessages.push({ id: `bot-${conv.id}`, type: 'bot', content: conv.response, timestamp: new Date(conv.created_at) })
-        })
-        setMessages(chatMessages)
-      }
-
-      // Load disease history
-      const diseaseResponse = await api.getDiseaseHistory(cropId)
-      if (diseaseResponse.ok) {
-        const diseaseData = await diseaseResponse.json()
-        const formattedHistory = diseaseData.detections.map(detection => ({
-          id: detection.id,
-          detection_id: detection.id,
-          disease: detection.disease_name,
-          confidence: detection.confidence,
-          severity: detection.severity,
-          timestamp: new Date(detection.detected_at),
-          cause: detection.cause || 'detected via AI analysis',
-          precautions: detection.precautions || [],
-          treatment: detection.treatment || []
-        }))
-        setDiseaseHistory(formattedHistory)
-      }
+      await loadChatHistory(cropId)
+      await loadDiseaseHistory(cropId)
     } catch (error) {
       console.error('Error loading crop data:', error)
     }
   }
 
+  // Newest page first; each page is chronological, so older pages go in front
+  const loadChatHistory = async (cropId, cursor = null) => {
+    const chatResponse = await api.getCropChatHistory(cropId, cursor)
+    if (chatResponse.ok) {
+      const chatData = await chatResponse.json()
+      const chatMessages = []
+      chatData.chat_history.forEach(conv => {
+        chatMessages.push({ id: `user-${conv.id}`, type: 'user', content: conv.message, timestamp: new Date(conv.created_at) })
+        chatMessages.push({ id: `bot-${conv.id}`, type: 'bot', content: conv.response, timestamp: new Date(conv.created_at) })
+      })
+      setMessages(prev => cursor ? [...chatMessages, ...prev] : chatMessages)
+      setChatCursor(chatData.next_cursor)
+    }
+  }
+
+  // Newest first; older pages go at the end
+  const loadDiseaseHistory = async (cropId, cursor = null) => {
+    const diseaseResponse = await api.getDiseaseHistory(cropId, cursor)
+    if (diseaseResponse.ok) {
+      const diseaseData = await diseaseResponse.json()
+      const formattedHistory = diseaseData.detections.map(detection => ({
+        id: detection.id,
+        detection_id: detection.id,
+        disease: detection.disease_name,
+        confidence: detection.confidence,
+        severity: detection.severity,
+        image: detection.thumbnail_url,
+        timestamp: new Date(detection.detected_at),
+        cause: detection.cause || 'detected via AI analysis',
+        precautions: detection.precautions || [],
+        treatment: detection.treatment || []
+      }))
+      setDiseaseHistory(prev => cursor ? [...prev, ...formattedHistory] : formattedHistory)
+      setDiseaseCursor(diseaseData.next_cursor)
+    }
+  }
+
+  const loadMore = async (load, cursor) => {
+    setIsLoadingMore(true)
+    try {
+      await load(selectedCrop.id, cursor)
+    } catch (error) {
+      console.error('Error loading older history:', error)
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
   const clearAllData = () => {
     setMessages([])
     setDiseaseHistory([])
+    setChatCursor(null)
+    setDiseaseCursor(null)
     setCurrentPrediction(null)
     setDiseaseView('history')
     setShowPrecautions(false)
@@ -166,8 +196,7 @@ const CropMainPanelSimple = ({ selectedCrop, onBackToSidebar, showBackButton })
         
         try {
           // Call AI backend for disease analysis
-          const imageBase64 = e.target.result.split(',')[1] // Remove data:image/jpeg;base64, prefix
-          const response = await api.analyzeDisease(imageBase64, selectedCrop.id)
+          const response = await api.analyzeDisease(file, selectedCrop.id)
           
           if (response.ok) {
             const data = await response.json()
@@ -361,6 +390,18 @@ const CropMainPanelSimple = ({ selectedCrop, onBackToSidebar, showBackButton })
                       </div>
                     </div>
                   )}
+                  {/* Last child renders on top in the reversed column */}
+                  {chatCursor && (
+                    <div className="flex justify-center">
+                      <button
+                        onClick={() => loadMore(loadChatHistory, chatCursor)}
+                        disabled={isLoadingMore}
+                        className="px-4 py-2 text-sm text-text-secondary border border-white/10 rounded-lg hover:bg-white/10 transition-colors disabled:opacity-50"
+                      >
+                        {isLoadingMore ? 'Loading...' : 'Load earlier messages'}
+                      </button>
+                    </div>
+                  )}
                 </div>
 
                 {/* Input */}
@@ -390,6 +431,8 @@ const CropMainPanelSimple = ({ selectedCrop, onBackToSidebar, showBackButton })
                   diseaseHistory={diseaseHistory}
                   setDiseaseHistory={setDiseaseHistory}
                   loadCropData={loadCropData}
+                  onLoadMoreHistory={diseaseCursor ? () => loadMore(loadDiseaseHistory, diseaseCursor) : null}
+                  isLoadingMoreHistory={isLoadingMore}
                 />
             ) : activeFeature === 'weather' ? (
               <WeatherFeature selectedCrop={selectedCrop} />
@@ -3,7 +3,7 @@ import { Camera, Upload, ArrowLeft, Shield, Pill, Send, Bot, User, Trash2 } from
 import { api } from '../../utils/api'
 import MarkdownRenderer from '../ui/MarkdownRenderer'
 
-const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHistory, loadCropData }) => {
+const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHistory, loadCropData, onLoadMoreHistory, isLoadingMoreHistory }) => {
   const [currentPrediction, setCurrentPrediction] = useState(null)
   const [isAnalyzing, setIsAnalyzing] = useState(false)
   const [showPrecautions, setShowPrecautions] = useState(false)
@@ -14,6 +14,9 @@ const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHisto
   const [isLoadingChat, setIsLoadingChat] = useState(false)
   const [isLoadingPrecautions, setIsLoadingPrecautions] = useState(false)
   const [isLoadingTreatment, setIsLoadingTreatment] = useState(false)
+  // next_cursor of the oldest chat page loaded for the open detection
+  const [chatCursor, setChatCursor] = useState(null)
+  const [isLoadingEarlierChat, setIsLoadingEarlierChat] = useState(false)
 
 
 
@@ -44,14 +47,12 @@ const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHisto
         setDiseaseView('result')
         
         try {
-          const imageBase64 = e.target.result.split(',')[1] // Remove data:image/jpeg;base64, prefix
-          
           console.log('=== DISEASE ANALYSIS REQUEST ===')
           console.log('Crop ID:', selectedCrop.id)
-          console.log('Image data length:', imageBase64.length)
+          console.log('Image size:', file.size)
           console.log('Token present:', !!localStorage.getItem('token'))
           
-          const response = await api.analyzeDisease(imageBase64, selectedCrop.id)
+          const response = await api.analyzeDisease(file, selectedCrop.id)
           
           console.log('Response status:', response.status)
           console.log('Response ok:', response.ok)
@@ -83,6 +84,7 @@ const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHisto
           }
           
           setCurrentPrediction(prediction)
+          setChatCursor(null)
           await loadCropData(selectedCrop.id)
           setIsAnalyzing(false)
           
@@ -128,30 +130,37 @@ const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHisto
     setDiseaseView('result')
     setShowPrecautions(false)
     setShowTreatment(false)
+    setChatCursor(null)
     
     // Load chat history for this disease detection
-    const loadChatHistory = async () => {
-      try {
-        const chatHistoryResponse = await api.getDiseaseChatHistory(prediction.detection_id || prediction.id)
-        if (chatHistoryResponse.ok) {
-          const chatData = await chatHistoryResponse.json()
-          const messages = []
-          chatData.chat_history.forEach(chat => {
-            messages.push({ id: `user-${chat.id}`, type: 'user', content: chat.message, timestamp: new Date(chat.created_at) })
-            messages.push({ id: `bot-${chat.id}`, type: 'bot', content: chat.response, timestamp: new Date(chat.created_at) })
-          })
-          setChatMessages(messages)
-        } else {
-          // If no chat history, show welcome message
-          setChatMessages([{
-            id: Date.now(),
-            type: 'bot',
-            content: `Welcome back! I can help you with questions about ${prediction.disease}. What would you like to know?`,
-            timestamp: new Date()
-          }])
-        }
-      } catch (error) {
-        console.error('Error loading chat history:', error)
+    loadChatHistory(prediction)
+  }
+
+  // Newest page first; each page is chronological, so earlier pages go in front
+  const loadChatHistory = async (prediction, cursor = null) => {
+    try {
+      const chatHistoryResponse = await api.getDiseaseChatHistory(prediction.detection_id || prediction.id, cursor)
+      if (chatHistoryResponse.ok) {
+        const chatData = await chatHistoryResponse.json()
+        const messages = []
+        chatData.chat_history.forEach(chat => {
+          messages.push({ id: `user-${chat.id}`, type: 'user', content: chat.message, timestamp: new Date(chat.created_at) })
+          messages.push({ id: `bot-${chat.id}`, type: 'bot', content: chat.response, timestamp: new Date(chat.created_at) })
+        })
+        setChatMessages(prev => cursor ? [...messages, ...prev] : messages)
+        setChatCursor(chatData.next_cursor)
+      } else if (!cursor) {
+        // If no chat history, show welcome message
+        setChatMessages([{
+          id: Date.now(),
+          type: 'bot',
+          content: `Welcome back! I can help you with questions about ${prediction.disease}. What would you like to know?`,
+          timestamp: new Date()
+        }])
+      }
+    } catch (error) {
+      console.error('Error loading chat history:', error)
+      if (!cursor) {
         setChatMessages([{
           id: Date.now(),
           type: 'bot',
@@ -160,8 +169,12 @@ const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHisto
         }])
       }
     }
-    
-    loadChatHistory()
+  }
+
+  const loadEarlierChat = async () => {
+    setIsLoadingEarlierChat(true)
+    await loadChatHistory(currentPrediction, chatCursor)
+    setIsLoadingEarlierChat(false)
   }
 
   const handleSendMessage = async (e) => {
@@ -289,6 +302,15 @@ const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHisto
                   </div>
                 </div>
               ))}
+              {onLoadMoreHistory && (
+                <button
+                  onClick={onLoadMoreHistory}
+                  disabled={isLoadingMoreHistory}
+                  className="w-full px-4 py-3 border border-gray-200 text-gray-600 rounded-lg hover:bg-gray-50 transition-colors disabled:opacity-50"
+                >
+                  {isLoadingMoreHistory ? 'Loading...' : 'Load older analyses'}
+                </button>
+              )}
             </div>
           )}
         </div>
@@ -528,6 +550,17 @@ const DiseaseDetectionFeature = ({ selectedCrop, diseaseHistory, setDiseaseHisto
                     
                     {/* Messages */}
                     <div className="flex-1 overflow-y-auto p-4 space-y-4 scrollbar-hide">
+                      {chatCursor && (
+                        <div className="flex justify-center">
+                          <button
+                            onClick={loadEarlierChat}
+                            disabled={isLoadingEarlierChat}
+                            className="px-3 py-1 text-sm text-accent-olive border border-accent-meadow/30 rounded-lg hover:bg-accent-meadow/10 transition-colors disabled:opacity-50"
+                          >
+                            {isLoadingEarlierChat ? 'Loading...' : 'Load earlier messages'}
+                          </button>
+                        </div>
+                      )}
                       {chatMessages.map((message) => (
                         <div
                           key={message.id}
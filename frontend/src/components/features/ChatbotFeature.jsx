@@ -4,12 +4,14 @@ import MarkdownRenderer from '../ui/MarkdownRenderer'
 
 const ChatbotFeature = ({ crop }) => {
   const [messages, setMessages] = useState([])
+  const [conversationId, setConversationId] = useState(null)
   const [, forceUpdate] = useState({})
   const messagesEndRef = useRef(null)
   const forceRerender = useCallback(() => forceUpdate({}), [])
   
   // Reset messages when crop changes
   useEffect(() => {
+    setConversationId(null)
     setMessages([
       {
         id: 1,
@@ -52,7 +54,11 @@ const ChatbotFeature = ({ crop }) => {
       const token = localStorage.getItem('token')
       console.log('Sending chat request:', { content: messageContent, crop_id: crop.id })
       
-      const response = await fetch('http://localhost:8000/api/chat/send', {
+      // Follow-ups append to the conversation started by the first message
+      const url = conversationId
+        ? `http://localhost:8000/api/chat/send?conversation_id=${conversationId}`
+        : 'http://localhost:8000/api/chat/send'
+      const response = await fetch(url, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -69,6 +75,7 @@ const ChatbotFeature = ({ crop }) => {
       if (response.ok) {
         const data = await response.json()
         console.log('AI Response:', data)
+        setConversationId(data.conversation_id)
         const botResponse = {
           id: Date.now() + 1,
           type: 'bot',
@@ -8,6 +8,9 @@ const getAuthHeaders = () => {
   };
 };
 
+// Paged history endpoints take the previous page's next_cursor to return the next one
+const cursorQuery = (cursor) => cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+
 export const api = {
   // Auth endpoints
   login: async (email, password) => {
@@ -67,11 +70,16 @@ export const api = {
   },
 
   // Disease detection endpoints
-  analyzeDisease: async (imageBase64, cropId) => {
+  analyzeDisease: async (imageFile, cropId) => {
+    // Multipart upload; the browser sets the Content-Type boundary itself
+    const formData = new FormData();
+    formData.append('crop_id', cropId);
+    formData.append('image', imageFile);
+    const token = localStorage.getItem('token');
     const response = await fetch(`${API_BASE_URL}/disease/analyze`, {
       method: 'POST',
-      headers: getAuthHeaders(),
-      body: JSON.stringify({ image_base64: imageBase64, crop_id: cropId })
+      headers: token ? { 'Authorization': `Bearer ${token}` } : {},
+      body: formData
     });
     return response;
   },
@@ -85,22 +93,22 @@ export const api = {
     return response;
   },
 
-  getDiseaseHistory: async (cropId) => {
-    const response = await fetch(`${API_BASE_URL}/disease/history/${cropId}`, {
+  getDiseaseHistory: async (cropId, cursor = null) => {
+    const response = await fetch(`${API_BASE_URL}/disease/history/${cropId}${cursorQuery(cursor)}`, {
       headers: getAuthHeaders()
     });
     return response;
   },
 
-  getDiseaseChatHistory: async (detectionId) => {
-    const response = await fetch(`${API_BASE_URL}/disease/chat-history/${detectionId}`, {
+  getDiseaseChatHistory: async (detectionId, cursor = null) => {
+    const response = await fetch(`${API_BASE_URL}/disease/chat-history/${detectionId}${cursorQuery(cursor)}`, {
       headers: getAuthHeaders()
     });
     return response;
   },
 
-  getCropChatHistory: async (cropId) => {
-    const response = await fetch(`${API_BASE_URL}/crop-data/chat-history/${cropId}`, {
+  getCropChatHistory: async (cropId, cursor = null) => {
+    const response = await fetch(`${API_BASE_URL}/crop-data/chat-history/${cropId}${cursorQuery(cursor)}`, {
       headers: getAuthHeaders()
     });
     return response;